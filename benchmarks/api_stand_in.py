@@ -0,0 +1,452 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+from collections import Counter
+from dataclasses import dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+# Consts
+
+GENIUS_PREFIX = '/genius'
+"""Path prefix of Genius endpoints (public API under `<prefix>/api`, song pages under `<prefix>/`)."""
+
+MAX_ALBUM_IDS = 20
+MAX_TRACK_IDS = 100
+"""Maximum number of ids in one request of Spotify albums and audio features."""
+
+_BASE62 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+
+@dataclass
+class StandInConfig:
+    """
+    Behaviour of stand-in server.
+
+    Attributes:
+        latency_s: Mean latency added to every response in seconds.
+        jitter_s: Maximum random deviation of latency in seconds.
+        rate_limit_rate: Fraction of requests answered with 429 and Retry-After header.
+        retry_after_s: Value of Retry-After header in seconds.
+        token_ttl_s: Lifetime of issued Spotify tokens, requests with expired token get 401.
+        missing_rate: Fraction of albums not found in search, and of tracks without features or lyrics.
+        seed: Seed of generated data and injected errors - data of an id is the same in every request.
+    """
+
+    latency_s: float = 0.
+    jitter_s: float = 0.
+    rate_limit_rate: float = 0.
+    retry_after_s: int = 1
+    token_ttl_s: float = 3600.
+    missing_rate: float = 0.
+    seed: int = 0
+
+
+class StandInServer:
+    """
+    Local HTTP server standing in for Spotify Web API (token, /v1/search, /v1/albums, /v1/audio-features)
+    and Genius (album search, album tracks and song pages used by lyricsgenius). Responses are generated
+    from requested names and ids, and match data models of fetchers. Fetchers target the server through
+    env variables returned by env().
+
+    Examples:
+    ---------
+    >>> with StandInServer(StandInConfig(latency_s=0.05, rate_limit_rate=0.01)) as server:
+    ...     os.environ.update(server.env())
+    ...     SpotifySearchAlbumFetcher('id', 'secret', rym_processed_path, spotify_search_path).fetch()
+    >>> server.requests
+    Counter({('/v1/search', 200): 995, ('/v1/search', 429): 5, ('/api/token', 200): 1})
+    """
+
+    def __init__(self, config: Optional[StandInConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        """
+        Args:
+            config: Behaviour of server, defaults of StandInConfig if None.
+            host: Host to listen on.
+            port: Port to listen on, any free port if 0.
+        """
+
+        self.config = config or StandInConfig()
+        self.requests: Counter[tuple[str, int]] = Counter()
+        """Number of handled requests by path (ids in Genius paths replaced with '<id>') and status."""
+
+        self._tokens: dict[str, float] = {}
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stand_in = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def env(self) -> dict[str, str]:
+        """Returns: Env variables pointing Spotify and Genius fetchers to this server."""
+
+        return {
+            'SPOTIFY_ACCOUNTS_URL': self.url,
+            'SPOTIFY_API_URL': self.url,
+            'GENIUS_BASE_URL': f'{self.url}{GENIUS_PREFIX}',
+            'GENIUS_ACCESS_TOKEN': 'stand-in',
+        }
+
+    def start(self) -> 'StandInServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='StandInServer', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Handle requests in current thread until interrupted."""
+
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            self._httpd.server_close()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'StandInServer':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, method: str, path: str, query: dict[str, list[str]], headers) -> tuple[int, dict, object]:
+        """
+        Returns: Status, headers and body (JSON serializable or HTML string) of response to request.
+        """
+
+        time.sleep(self._latency())
+        if method == 'POST' and path == '/api/token':
+            return self._token(headers)
+        if method != 'GET':
+            return 405, {}, {'error': {'status': 405, 'message': 'Method not allowed'}}
+
+        if self._draw() < self.config.rate_limit_rate:
+            return 429, {'Retry-After': str(self.config.retry_after_s)}, {
+                'error': {'status': 429, 'message': 'API rate limit exceeded'}}
+
+        if path.startswith('/v1/'):
+            status, message = self._check_token(headers)
+            if status != 200:
+                return status, {}, {'error': {'status': status, 'message': message}}
+            if path == '/v1/search':
+                return 200, {}, self._search(query)
+            if path == '/v1/albums':
+                return self._albums(query)
+            if path == '/v1/audio-features':
+                return self._audio_features(query)
+
+        if path == f'{GENIUS_PREFIX}/api/search/multi':
+            return 200, {}, self._genius_search(query)
+        if match := re.fullmatch(fr'{GENIUS_PREFIX}/api/albums/(\d+)/tracks', path):
+            return 200, {}, self._genius_album_tracks(int(match.group(1)))
+        if match := re.fullmatch(fr'{GENIUS_PREFIX}/[\w-]+-(\d+)-lyrics', path):
+            return 200, {'Content-Type': 'text/html'}, self._genius_song_page(int(match.group(1)))
+
+        return 404, {}, {'error': {'status': 404, 'message': 'Service not found'}}
+
+    # Spotify
+
+    def _token(self, headers) -> tuple[int, dict, dict]:
+        if not headers.get('Authorization', '').startswith('Basic '):
+            return 400, {}, {'error': 'invalid_client'}
+
+        with self._lock:
+            token = f'{self._random.getrandbits(128):032x}'
+            self._tokens[token] = time.time() + self.config.token_ttl_s
+        return 200, {}, {'access_token': token, 'token_type': 'Bearer', 'expires_in': int(self.config.token_ttl_s)}
+
+    def _check_token(self, headers) -> tuple[int, str]:
+        token = headers.get('Authorization', '').removeprefix('Bearer ')
+        with self._lock:
+            expires_at = self._tokens.get(token)
+        if expires_at is None:
+            return 401, 'Invalid access token'
+        if time.time() > expires_at:
+            return 401, 'The access token expired'
+        return 200, ''
+
+    def _search(self, query: dict[str, list[str]]) -> dict:
+        album, _, artist = query.get('q', [''])[0].partition(' artist:')
+        rng = self._data_random('search', album, artist)
+        items = []
+        if rng.random() >= self.config.missing_rate:
+            # Best match first, followed by albums of other artists.
+            names = [(album, artist)] + [(f'{album} (Live)', f'{artist} Tribute Band')] * rng.randint(0, 2)
+            items = [self._search_item(name, artist_name) for name, artist_name in names]
+
+        return {'albums': {
+            'href': f'{self.url}/v1/search', 'items': items, 'limit': 10, 'next': None, 'offset': 0,
+            'total': len(items),
+        }}
+
+    def _search_item(self, album: str, artist: str) -> dict:
+        album_id = _spotify_id('album', album, artist)
+        return {
+            'album_type': 'album',
+            'artists': [_spotify_artist(artist)],
+            'href': f'{self.url}/v1/albums/{album_id}',
+            'id': album_id,
+            'images': [{'height': 640, 'url': f'{self.url}/images/{album_id}', 'width': 640}],
+            'name': album,
+            'release_date': '1990-01-01',
+            'release_date_precision': 'day',
+            'total_tracks': self._album_track_count(album_id),
+            'type': 'album',
+            'uri': f'spotify:album:{album_id}',
+        }
+
+    def _albums(self, query: dict[str, list[str]]) -> tuple[int, dict, dict]:
+        ids = query.get('ids', [''])[0].split(',')
+        if len(ids) > MAX_ALBUM_IDS:
+            return 400, {}, {'error': {'status': 400, 'message': 'Too many ids requested'}}
+
+        albums = []
+        for album_id in ids:
+            tracks = [self._album_track(album_id, number) for number in range(1, self._album_track_count(album_id) + 1)]
+            albums.append({
+                'album_type': 'album',
+                'artists': [_spotify_artist(f'Artist of {album_id}')],
+                'id': album_id,
+                'name': f'Album {album_id}',
+                'popularity': self._data_random('popularity', album_id).randint(0, 100),
+                'release_date': '1990-01-01',
+                'total_tracks': len(tracks),
+                'tracks': {
+                    'href': f'{self.url}/v1/albums/{album_id}/tracks', 'items': tracks, 'limit': 50, 'next': None,
+                    'offset': 0, 'previous': None, 'total': len(tracks),
+                },
+                'uri': f'spotify:album:{album_id}',
+            })
+        return 200, {}, {'albums': albums}
+
+    def _album_track_count(self, album_id: str) -> int:
+        """Returns: Number of tracks of album - few albums have less tracks than processing requires."""
+
+        rng = self._data_random('tracks', album_id)
+        return rng.randint(1, 3) if rng.random() < 0.05 else rng.randint(6, 20)
+
+    def _album_track(self, album_id: str, number: int) -> dict:
+        track_id = _spotify_id('track', album_id, str(number))
+        return {
+            'artists': [_spotify_artist(f'Artist of {album_id}')],
+            'disc_number': 1,
+            'duration_ms': self._data_random('duration', track_id).randint(60_000, 420_000),
+            'explicit': False,
+            'href': f'{self.url}/v1/tracks/{track_id}',
+            'id': track_id,
+            'is_local': False,
+            'name': f'Track {number}',
+            'track_number': number,
+            'type': 'track',
+            'uri': f'spotify:track:{track_id}',
+        }
+
+    def _audio_features(self, query: dict[str, list[str]]) -> tuple[int, dict, dict]:
+        ids = query.get('ids', [''])[0].split(',')
+        if len(ids) > MAX_TRACK_IDS:
+            return 400, {}, {'error': {'status': 400, 'message': 'Too many ids requested'}}
+
+        features = []
+        for track_id in ids:
+            rng = self._data_random('features', track_id)
+            if rng.random() < self.config.missing_rate:
+                features.append(None)
+                continue
+            features.append({
+                'id': track_id,
+                'danceability': rng.random(),
+                'energy': rng.random(),
+                'key': rng.randint(0, 11),
+                'loudness': -rng.uniform(0, 30),
+                'mode': rng.randint(0, 1),
+                'speechiness': rng.uniform(0, 0.5),
+                'acousticness': rng.random(),
+                'instrumentalness': rng.random(),
+                'liveness': rng.random(),
+                'valence': rng.random(),
+                'tempo': rng.uniform(60, 200),
+                'duration_ms': self._data_random('duration', track_id).randint(60_000, 420_000),
+                'time_signature': rng.choice([3, 4, 4, 4, 5]),
+            })
+        return 200, {}, {'audio_features': features}
+
+    # Genius
+
+    def _genius_search(self, query: dict[str, list[str]]) -> dict:
+        search_term = query.get('q', [''])[0]
+        rng = self._data_random('genius_search', search_term)
+        hits = []
+        if rng.random() >= self.config.missing_rate:
+            album_id = rng.randint(1, 10 ** 7)
+            hits.append({'type': 'album', 'result': self._genius_album(album_id, search_term)})
+        return {'meta': {'status': 200}, 'response': {'sections': [
+            {'type': 'top_hit', 'hits': hits[:1]},
+            {'type': 'album', 'hits': hits},
+        ]}}
+
+    def _genius_album(self, album_id: int, name: str) -> dict:
+        return {
+            '_type': 'album',
+            'id': album_id,
+            'api_path': f'/albums/{album_id}',
+            'artist': _genius_artist(album_id),
+            'cover_art_thumbnail_url': f'https://images.genius.com/{album_id}.300x300x1.jpg',
+            'cover_art_url': f'https://images.genius.com/{album_id}.1000x1000x1.jpg',
+            'full_title': name,
+            'name': name,
+            'name_with_artist': name,
+            'release_date_components': {'year': 1990, 'month': 1, 'day': 1},
+            'url': f'https://genius.com/albums/{album_id}',
+        }
+
+    def _genius_album_tracks(self, album_id: int) -> dict:
+        rng = self._data_random('genius_tracks', str(album_id))
+        tracks = []
+        for number in range(1, rng.randint(6, 16) + 1):
+            song_id = album_id * 100 + number
+            title = f'Track {number}'
+            path = f'Artist-{album_id}-track-{number}-{song_id}-lyrics'
+            lyrics_state = 'unreleased' if rng.random() < self.config.missing_rate else 'complete'
+            tracks.append({'number': number, 'song': {
+                '_type': 'song',
+                'id': song_id,
+                'annotation_count': 0,
+                'api_path': f'/songs/{song_id}',
+                'full_title': f'{title} by Artist {album_id}',
+                'header_image_thumbnail_url': '',
+                'header_image_url': '',
+                'instrumental': False,
+                'language': 'en',
+                'lyrics_owner_id': 0,
+                'lyrics_state': lyrics_state,
+                'path': f'/{path}',
+                'primary_artist': _genius_artist(album_id),
+                'pyongs_count': 0,
+                'song_art_image_thumbnail_url': '',
+                'song_art_image_url': '',
+                'stats': {'unreviewed_annotations': 0, 'hot': False},
+                'title': title,
+                'title_with_featured': title,
+                'url': f'https://genius.com/{path}',
+            }})
+        return {'meta': {'status': 200}, 'response': {'tracks': tracks, 'next_page': None}}
+
+    def _genius_song_page(self, song_id: int) -> str:
+        rng = self._data_random('lyrics', str(song_id))
+        lines = [' '.join(['la'] * rng.randint(3, 8)) for _ in range(4 * rng.randint(2, 5))]
+        verses = ['<br/>'.join(lines[i:i + 4]) for i in range(0, len(lines), 4)]
+        return f'<html><body><div class="Lyrics__Root">{"<br/><br/>".join(verses)}</div></body></html>'
+
+    # Randomness
+
+    def _latency(self) -> float:
+        return max(self.config.latency_s + (self._draw() * 2 - 1) * self.config.jitter_s, 0.)
+
+    def _draw(self) -> float:
+        """Returns: Random number of injected errors and latency (differs in every request)."""
+
+        with self._lock:
+            return self._random.random()
+
+    def _data_random(self, *key: str) -> random.Random:
+        """Returns: Random generator of data of given key (the same in every request)."""
+
+        return random.Random(':'.join([str(self.config.seed), *key]))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._respond('GET')
+
+    def do_POST(self):
+        # Body of token request is not used, but has to be read to keep connection usable.
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._respond('POST')
+
+    def _respond(self, method: str):
+        stand_in: StandInServer = self.server.stand_in
+        url = urlsplit(self.path)
+        status, headers, body = stand_in.handle(method, url.path, parse_qs(url.query), self.headers)
+
+        path = re.sub(r'\d+', '<id>', url.path) if url.path.startswith(GENIUS_PREFIX) else url.path
+        with stand_in._lock:
+            stand_in.requests[(path, status)] += 1
+
+        content = (body if isinstance(body, str) else json.dumps(body)).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', headers.pop('Content-Type', 'application/json'))
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        # Requests are counted in StandInServer.requests instead of logging each of them.
+        pass
+
+
+# Functions
+
+def _spotify_id(*key: str) -> str:
+    """Returns: 22-character base62 id, the same for the same key."""
+
+    number = int.from_bytes(hashlib.sha1(':'.join(key).encode()).digest(), 'big')
+    chars = []
+    for _ in range(22):
+        number, index = divmod(number, 62)
+        chars.append(_BASE62[index])
+    return ''.join(chars)
+
+
+def _spotify_artist(name: str) -> dict:
+    artist_id = _spotify_id('artist', name)
+    return {
+        'href': f'https://api.spotify.com/v1/artists/{artist_id}', 'id': artist_id, 'name': name, 'type': 'artist',
+        'uri': f'spotify:artist:{artist_id}',
+    }
+
+
+def _genius_artist(album_id: int) -> dict:
+    return {
+        'id': album_id, 'api_path': f'/artists/{album_id}', 'header_image_url': '', 'image_url': '',
+        'is_meme_verified': False, 'is_verified': False, 'name': f'Artist {album_id}',
+        'url': f'https://genius.com/artists/{album_id}',
+    }
+
+
+def main(args: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description='Run local stand-in of Spotify and Genius APIs.')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to listen on.')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on.')
+    for field in fields(StandInConfig):
+        parser.add_argument(f'--{field.name.replace("_", "-")}', type=type(field.default), default=field.default,
+                            help=f'See StandInConfig.{field.name} (default: %(default)s).')
+    args = vars(parser.parse_args(args))
+
+    server = StandInServer(StandInConfig(**{field.name: args[field.name] for field in fields(StandInConfig)}),
+                           args['host'], args['port'])
+    print('\n'.join(f'export {name}={value}' for name, value in server.env().items()))
+    server.serve_forever()
+
+
+# Run stand-in, e.g. `python -m benchmarks.api_stand_in --latency-s 0.05 --rate-limit-rate 0.01 --token-ttl-s 60`
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import os
+import shutil
+import time
+
+import requests
+
+from dataclasses import asdict
+from typing import Callable, Optional
+
+from benchmarks.api_stand_in import StandInConfig, StandInServer
+from benchmarks.synthetic_data import generate, parse_scale
+from shared_utils import metrics, tracing
+from shared_utils.paths import dataset_path, Years, PARQUET
+from shared_utils.utils import PROJECT_DIR
+
+# Consts
+
+YEARS = (1960, 2020)
+"""Release years of synthetic albums."""
+
+DEFAULT_MAX_RESUMES = 100
+"""Maximum number of times a fetcher is restarted after rate limiting or token expiry."""
+
+
+# Functions
+
+def fetch_with_resume(create_fetcher: Callable, max_resumes: int = DEFAULT_MAX_RESUMES, wait_s: float = 0.):
+    """
+    Run fetcher until it fetches everything. Fetchers stop with ConnectionError when they are rate limited
+    or their token expires, so a new fetcher (with new token) resumes from its output file, as it would be
+    done by hand. Resumes are counted as 'resumes' counter of running stage.
+
+    Args:
+        create_fetcher: Function creating fetcher.
+        max_resumes: Maximum number of resumes, error is raised after that.
+        wait_s: Time to wait before resuming in seconds (Retry-After of the server).
+    """
+
+    for resume in range(max_resumes + 1):
+        try:
+            create_fetcher().fetch()
+            return
+        except requests.ConnectionError:
+            if resume == max_resumes:
+                raise
+            metrics.count('resumes')
+            time.sleep(wait_s)
+
+
+def run_fetch_benchmark(
+        data_dir: str,
+        config: StandInConfig,
+        genius_albums: int,
+        years: Years = YEARS,
+        max_resumes: int = DEFAULT_MAX_RESUMES
+):
+    """
+    Fetch Spotify search results, track ids, audio features and Genius lyrics of albums from RYM data
+    in data directory (see synthetic_data.generate()) from local stand-in server, each fetcher measured
+    with metrics.stage(). Outputs are saved to `<data_dir>/fetched`, and removed first, so every run
+    fetches everything.
+
+    Args:
+        data_dir: Directory with raw RYM data.
+        config: Behaviour of stand-in server.
+        genius_albums: Number of albums to fetch lyrics of (Genius client waits 0.2 s after every request).
+        years: Range of release years of data.
+        max_resumes: Maximum number of resumes of each fetcher.
+    """
+
+    from data_processing.fetch.genius_api.genius_albym_lyrics_fetcher import GeniusDataFetcher
+    from data_processing.fetch.spotify_api.spotify_search_album_fetcher import SpotifySearchAlbumFetcher
+    from data_processing.fetch.spotify_api.spotify_track_features_fetcher import SpotifyTrackFeaturesFetcher
+    from data_processing.fetch.spotify_api.spotify_track_ids_fetcher import SpotifyTrackIDsFetcher
+    from data_processing.preprocessing.rym_data_processing import RymDataProcessor
+    from shared_utils import schemas
+
+    output_dir = f'{data_dir}/fetched'
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    rym_processed_path = dataset_path(f'{output_dir}/rym_charts', years, PARQUET)
+    search_path = f'{output_dir}/spotify_search_album_id.csv'
+    track_ids_path = f'{output_dir}/spotify_tracks_ids.csv'
+    track_features_path = f'{output_dir}/spotify_tracks_feature.csv'
+    genius_albums_path = f'{output_dir}/genius_albums.csv'
+
+    RymDataProcessor(f'{data_dir}/raw/rym/rym_charts.csv', rym_processed_path).process()
+
+    with StandInServer(config) as server:
+        os.environ.update(server.env())
+        client = ('stand-in-id', 'stand-in-secret')
+        wait_s = config.retry_after_s
+
+        with metrics.stage('SpotifySearchAlbumFetcher.fetch'):
+            fetch_with_resume(
+                lambda: SpotifySearchAlbumFetcher(*client, rym_processed_path, search_path, years), max_resumes, wait_s)
+        with metrics.stage('SpotifyTrackIDsFetcher.fetch'):
+            fetch_with_resume(lambda: SpotifyTrackIDsFetcher(*client, search_path, track_ids_path), max_resumes, wait_s)
+        with metrics.stage('SpotifyTrackFeaturesFetcher.fetch'):
+            fetch_with_resume(
+                lambda: SpotifyTrackFeaturesFetcher(*client, track_ids_path, track_features_path), max_resumes, wait_s)
+
+        df_search = schemas.read_csv(search_path, schemas.SPOTIFY_SEARCH_SCHEMA)
+        df_search = df_search[df_search['precision_match'] > 2].head(genius_albums)
+        schemas.to_csv(df_search, genius_albums_path, schemas.SPOTIFY_SEARCH_SCHEMA)
+        with metrics.stage('GeniusDataFetcher.fetch'):
+            GeniusDataFetcher(
+                genius_albums_path, f'{output_dir}/genius_stats.csv', f'{output_dir}/genius_lyrics').fetch()
+
+    print(f'Requests of stand-in server: {dict(sorted(server.requests.items()))}')
+
+
+def main(args: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark throughput of Spotify and Genius fetchers against local stand-in server. Results '
+                    'are saved as JSON-lines run report with latency histograms of endpoints.')
+    parser.add_argument('--albums', default='1k', help='Number of RYM albums, e.g. 1k or 10k.')
+    parser.add_argument('--genius-albums', type=int, default=20, help='Number of albums to fetch lyrics of.')
+    parser.add_argument('--work-dir', default=f'{PROJECT_DIR}/data/benchmarks',
+                        help='Directory of synthetic data and fetched outputs.')
+    parser.add_argument('--results-dir', default=f'{PROJECT_DIR}/data/benchmarks/results',
+                        help='Directory of run reports.')
+    parser.add_argument('--max-resumes', type=int, default=DEFAULT_MAX_RESUMES,
+                        help='Maximum number of resumes of each fetcher.')
+    parser.add_argument('--latency-s', type=float, default=0.02, help='Mean latency of responses.')
+    parser.add_argument('--jitter-s', type=float, default=0.01, help='Maximum deviation of latency.')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.,
+                        help='Fraction of requests answered with 429 (each stops fetcher, which is resumed).')
+    parser.add_argument('--retry-after-s', type=int, default=1, help='Retry-After of 429 responses.')
+    parser.add_argument('--token-ttl-s', type=float, default=3600., help='Lifetime of Spotify tokens.')
+    parser.add_argument('--missing-rate', type=float, default=0.02,
+                        help='Fraction of albums not found, and tracks without features or lyrics.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of synthetic data and stand-in server.')
+    args = parser.parse_args(args)
+
+    config = StandInConfig(args.latency_s, args.jitter_s, args.rate_limit_rate, args.retry_after_s,
+                           args.token_ttl_s, args.missing_rate, args.seed)
+    n_albums = parse_scale(args.albums)
+    data_dir = f'{args.work_dir}/{args.albums}'
+    generate(data_dir, n_albums, YEARS, args.seed)
+
+    report = metrics.start_run(args.results_dir, f'fetch_{args.albums}', n_albums=n_albums,
+                               genius_albums=args.genius_albums, **asdict(config))
+    try:
+        run_fetch_benchmark(data_dir, config, args.genius_albums, YEARS, args.max_resumes)
+    finally:
+        tracing.TRACER.dump(report)
+        print(f'Results saved to {report.path}.')
+
+
+# Run benchmark, e.g. `python -m benchmarks.fetch_benchmarks --albums 1k --rate-limit-rate 0.005 --token-ttl-s 30`
+if __name__ == '__main__':
+    main()
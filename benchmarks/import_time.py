@@ -0,0 +1,140 @@
+import argparse
+import subprocess
+import sys
+
+from dataclasses import dataclass
+
+from shared_utils.utils import PROJECT_DIR
+
+HEAVY_MODULES = [
+    'rymscraper', 'selenium', 'lyricsgenius', 'pydantic', 'pyprind',
+    'torch', 'xgboost', 'sklearn', 'lazypredict', 'matplotlib', 'seaborn',
+]
+"""Optional dependencies of fetchers and models, which data processing entry points must not import."""
+
+ENTRY_POINTS = {
+    'data_processing.run_pipeline': HEAVY_MODULES + ['pandas', 'numpy', 'pyarrow'],
+    'data_processing.feature_pipeline': HEAVY_MODULES,
+    'data_processing.postprocessing.finalize_data_processing': HEAVY_MODULES,
+    'data_processing.postprocessing.feature_matrix': HEAVY_MODULES,
+    'shared_utils.storage': HEAVY_MODULES,
+    'src.models.saved_model': HEAVY_MODULES,
+    'src.models.prediction_service': HEAVY_MODULES,
+}
+"""Entry points and top-level packages forbidden in their imports."""
+
+
+@dataclass
+class ImportProfile:
+    """
+    Import times of a module, parsed from `python -X importtime` output.
+
+    Attributes:
+        module: Imported module.
+        total_ms: Cumulative import time of the module (with its imports).
+        modules: Cumulative import time of each imported module.
+    """
+
+    module: str
+    total_ms: float
+    modules: dict[str, float]
+
+    def top(self, n: int) -> list[tuple[str, float]]:
+        """Returns: n imported modules with the longest cumulative import time (other than the module)."""
+
+        modules = [(name, ms) for name, ms in self.modules.items() if name != self.module]
+        return sorted(modules, key=lambda item: item[1], reverse=True)[:n]
+
+    def imported(self, packages: list[str]) -> list[str]:
+        """Returns: Given top-level packages which were imported."""
+
+        imported = {name.split('.')[0] for name in self.modules}
+        return [package for package in packages if package in imported]
+
+
+def parse_importtime(output: str) -> dict[str, float]:
+    """
+    Parse `python -X importtime` output. Imports of interpreter startup (up to `site` module) are skipped.
+
+    Examples:
+    ---------
+    >>> parse_importtime(
+    ...     'import time: self [us] | cumulative | imported package\\n'
+    ...     'import time:       100 |        100 |   encodings.aliases\\n'
+    ...     'import time:       200 |        300 | site\\n'
+    ...     'import time:       120 |        120 |   json.decoder\\n'
+    ...     'import time:       150 |        270 | json'
+    ... )
+    {'json.decoder': 0.12, 'json': 0.27}
+
+    Returns:
+        Cumulative import time in milliseconds of each imported module.
+    """
+
+    modules: dict[str, float] = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative) / 1000
+        # Nested imports are logged before their importer, so a top level `site` closes startup imports.
+        if name == ' site':
+            modules = {}
+    return modules
+
+
+def profile_import(module: str, repeat: int = 3) -> ImportProfile:
+    """
+    Import module in fresh interpreters and keep the fastest run, to reduce noise of disk cache and scheduling.
+
+    Args:
+        module: Module to import.
+        repeat: Number of runs.
+
+    Returns:
+        Import profile of the fastest run.
+    """
+
+    profiles = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                cwd=PROJECT_DIR, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f'Importing {module} failed:\n{result.stderr}')
+
+        modules = parse_importtime(result.stderr)
+        profiles.append(ImportProfile(module, modules.get(module, 0.), modules))
+    return min(profiles, key=lambda profile: profile.total_ms)
+
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(description='Measure import time of pipeline entry points.')
+    parser.add_argument('modules', nargs='*', default=list(ENTRY_POINTS),
+                        help='Modules to import, entry points if empty.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs of each import.')
+    parser.add_argument('--top', type=int, default=5, help='Number of the slowest imported modules to print.')
+    parser.add_argument('--max-ms', type=float, default=None, help='Fail if any import takes longer.')
+    args = parser.parse_args(args)
+
+    errors = []
+    for module in args.modules:
+        profile = profile_import(module, args.repeat)
+        print(f'{module}: {profile.total_ms:.1f} ms')
+        for name, ms in profile.top(args.top):
+            print(f'    {ms:8.1f} ms  {name}')
+
+        forbidden = profile.imported(ENTRY_POINTS.get(module, []))
+        if forbidden:
+            errors.append(f'{module} imports {", ".join(forbidden)}.')
+        if args.max_ms is not None and profile.total_ms > args.max_ms:
+            errors.append(f'{module} import takes {profile.total_ms:.1f} ms (limit {args.max_ms} ms).')
+
+    for error in errors:
+        print(f'ERROR: {error}', file=sys.stderr)
+    return 1 if errors else 0
+
+
+# Run e.g. `python -m benchmarks.import_time` (exits with 1 if an entry point imports heavy dependencies)
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import argparse
+import importlib.util
+import os
+import time
+import numpy as np
+
+from typing import Optional
+
+from benchmarks.run_benchmarks import run_benchmark, YEARS
+from benchmarks.serving_benchmarks import train_model
+from benchmarks.synthetic_data import generate, parse_scale
+from shared_utils import metrics
+from shared_utils.tracing import LatencyHistogram
+from shared_utils.utils import PROJECT_DIR
+
+# Consts
+
+DEFAULT_BATCH_SIZES = [1, 8, 64, 256, 1024]
+"""Batch sizes of predictions."""
+
+MIN_CALLS = 20
+MIN_ROWS = 20_000
+"""Each batch size is predicted at least MIN_CALLS times and at least MIN_ROWS samples in total."""
+
+
+# Functions
+
+def measure(model, features: np.ndarray, batch_size: int) -> dict:
+    """
+    Returns: Latency percentiles of predictions of batches of features and throughput in samples per second.
+    """
+
+    batch = np.ascontiguousarray(np.resize(features, (batch_size, features.shape[1])), dtype=np.float32)
+    model.predict_proba(batch)  # warm-up
+
+    histogram = LatencyHistogram()
+    calls = max(MIN_CALLS, MIN_ROWS // batch_size)
+    start = time.perf_counter()
+    for _ in range(calls):
+        call_start = time.perf_counter()
+        model.predict_proba(batch)
+        histogram.record(time.perf_counter() - call_start)
+    wall_s = time.perf_counter() - start
+
+    return {
+        'p50_ms': round(histogram.percentile(50) * 1000, 4),
+        'p99_ms': round(histogram.percentile(99) * 1000, 4),
+        'rows_per_s': round(calls * batch_size / wall_s, 1),
+    }
+
+
+def main(args: Optional[list[str]] = None):
+    from src.models.cpu_inference import EAGER, ENGINES, ONNX, TORCHSCRIPT, check_parity, export, load_cpu_model
+
+    engines = [engine for engine in ENGINES if engine != ONNX or importlib.util.find_spec('onnxruntime')]
+    parser = argparse.ArgumentParser(
+        description='Benchmark CPU inference of FeedForwardNN trained on synthetic data - latency and throughput '
+                    'of eager, TorchScript and ONNX Runtime engines (float and int8) across batch sizes and threads.')
+    parser.add_argument('--albums', default='10k', help='Number of synthetic albums, e.g. 10k.')
+    parser.add_argument('--engines', nargs='+', default=engines, choices=ENGINES, help='Engines to benchmark.')
+    parser.add_argument('--no-quantize', action='store_true', help='Skip int8 quantized models.')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=DEFAULT_BATCH_SIZES, help='Batch sizes.')
+    parser.add_argument('--threads', type=int, nargs='+', default=sorted({1, os.cpu_count() or 1}),
+                        help='Numbers of threads of one prediction.')
+    parser.add_argument('--work-dir', default=f'{PROJECT_DIR}/data/benchmarks', help='Directory of synthetic data.')
+    parser.add_argument('--results-dir', default=f'{PROJECT_DIR}/data/benchmarks/results',
+                        help='Directory of run reports.')
+    args = parser.parse_args(args)
+
+    from data_processing.postprocessing.feature_matrix import load_feature_matrix
+    from data_processing.postprocessing.finalize_data_processing import FEATURE_STORE, FLATTEN
+    from shared_utils.paths import PARQUET
+    from src.models.saved_model import FEED_FORWARD, load_model
+
+    data_dir = f'{args.work_dir}/{args.albums}'
+    final_dir = f'{data_dir}/{PARQUET}/final'
+    if not os.path.exists(f'{final_dir}/{FEATURE_STORE}'):
+        generate(data_dir, parse_scale(args.albums), YEARS)
+        run_benchmark(data_dir, YEARS)
+    model_dir = f'{data_dir}/models/{FEED_FORWARD}'
+    train_model(final_dir, model_dir, FEED_FORWARD)
+
+    features = np.asarray(load_feature_matrix(f'{final_dir}/{FLATTEN}').features, dtype=np.float32)
+    reference = load_model(model_dir)
+    report = metrics.start_run(args.results_dir, f'inference_{args.albums}', batch_sizes=args.batch_sizes,
+                               threads=args.threads)
+
+    print(f'{"engine":<12} {"int8":<5} {"threads":>7} {"batch":>6} {"p50 [ms]":>9} {"p99 [ms]":>9} {"rows/s":>11}')
+    for engine in args.engines:
+        for quantized in [False] if args.no_quantize else [False, True]:
+            if engine in [TORCHSCRIPT, ONNX]:
+                export(model_dir, engine, quantized)
+            for threads in args.threads:
+                model = load_cpu_model(model_dir, engine, quantized, threads)
+                parity = check_parity(reference, model, features, quantized) if engine != EAGER or quantized else {}
+                if parity and not parity['passed']:
+                    print(f'{engine} (int8: {quantized}) is out of tolerance: {parity}')
+                for batch_size in args.batch_sizes:
+                    result = measure(model, features, batch_size)
+                    report.write({'engine': engine, 'quantized': quantized, 'threads': threads,
+                                  'batch_size': batch_size, **result, **parity})
+                    print(f'{engine:<12} {str(quantized):<5} {threads:>7} {batch_size:>6} {result["p50_ms"]:>9.3f} '
+                          f'{result["p99_ms"]:>9.3f} {result["rows_per_s"]:>11.0f}')
+    print(f'Results saved to {report.path}.')
+
+
+# Run benchmark, e.g. `python -m benchmarks.inference_benchmarks --batch-sizes 1 64 1024 --threads 1 2 4`
+if __name__ == '__main__':
+    main()
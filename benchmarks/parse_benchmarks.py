@@ -0,0 +1,106 @@
+import argparse
+import json
+import timeit
+
+import requests
+
+from typing import Callable, Optional
+
+import shared_utils.columns as c
+
+from benchmarks.api_stand_in import StandInServer, MAX_ALBUM_IDS, MAX_TRACK_IDS
+from data_processing.fetch.spotify_api import response_parsers
+from data_processing.fetch.spotify_api.data_models.spotify_album_tracks_model import AlbumInfoModel
+from data_processing.fetch.spotify_api.data_models.spotify_search_album_model import SearchModel
+from data_processing.fetch.spotify_api.data_models.spotify_track_features_model import TrackFeatureModel
+
+# Consts
+
+DEFAULT_NUMBER = 200
+"""Number of parses of a response in one measurement."""
+
+
+# Functions
+
+def fetch_responses() -> dict[str, bytes]:
+    """Returns: Bodies of search, albums (20 albums) and audio features (100 tracks) responses of stand-in server."""
+
+    with StandInServer() as server:
+        token = requests.post(f'{server.url}/api/token', headers={'Authorization': 'Basic c3RhbmQtaW4='}).json()
+        headers = {'Authorization': f'Bearer {token["access_token"]}'}
+
+        def get(path: str, params: dict) -> bytes:
+            return requests.get(f'{server.url}{path}', params=params, headers=headers).content
+
+        search = get('/v1/search', {'q': 'Album 1 artist:Artist 1', 'type': c.ALBUM, 'limit': 10})
+        album_ids = [
+            response_parsers.parse_search(json.loads(get('/v1/search', {'q': f'Album {i} artist:Artist'})))[0].id
+            for i in range(MAX_ALBUM_IDS)
+        ]
+        albums = get('/v1/albums', {'ids': ','.join(album_ids)})
+        track_ids = response_parsers.parse_album_tracks(json.loads(albums))[c.SONG_ID]
+        while len(track_ids) < MAX_TRACK_IDS:
+            track_ids += track_ids
+        features = get('/v1/audio-features', {'ids': ','.join(track_ids[:MAX_TRACK_IDS])})
+
+    return {'search': search, 'albums': albums, 'audio-features': features}
+
+
+def model_parsers() -> dict[str, Callable[[bytes], object]]:
+    """Returns: Previous parsing of each response - json module and pydantic models, with rows built from models."""
+
+    def albums(content: bytes) -> list[dict]:
+        return [
+            {c.ALBUM_ID: album.id, c.SONG_ID: track.id, c.SONG_NAME: track.name, c.SONG_NUMBER: track.track_number,
+             c.SONG_ARTISTS_NUMBER: len(track.artists)}
+            for album in AlbumInfoModel(**json.loads(content)).albums for track in album.tracks.items
+        ]
+
+    def features(content: bytes) -> list[dict]:
+        return [
+            {c.SONG_ID: track.id, **track.dict(exclude={'id'})}
+            for track in TrackFeatureModel(**json.loads(content)).audio_features if track
+        ]
+
+    return {
+        'search': lambda content: SearchModel(**json.loads(content)).albums.items,
+        'albums': albums,
+        'audio-features': features,
+    }
+
+
+def fast_parsers() -> dict[str, Callable[[bytes], object]]:
+    """Returns: Parsing of each response with response_parsers, as done by fetchers."""
+
+    return {
+        'search': lambda content: response_parsers.parse_search(response_parsers.loads(content)),
+        'albums': lambda content: response_parsers.parse_album_tracks(response_parsers.loads(content)),
+        'audio-features': lambda content: response_parsers.parse_audio_features(response_parsers.loads(content)),
+    }
+
+
+def measure(parse: Callable[[bytes], object], content: bytes, number: int = DEFAULT_NUMBER) -> float:
+    """Returns: Best time of parsing content in microseconds, out of 5 measurements of number parses."""
+
+    return min(timeit.repeat(lambda: parse(content), number=number, repeat=5)) / number * 1e6
+
+
+def main(args: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        description='Compare cost of parsing Spotify responses with pydantic models and with response_parsers.')
+    parser.add_argument('--number', type=int, default=DEFAULT_NUMBER, help='Number of parses in one measurement.')
+    args = parser.parse_args(args)
+
+    responses = fetch_responses()
+    models, fast = model_parsers(), fast_parsers()
+    print(f'JSON decoder: {"orjson" if response_parsers.orjson is not None else "json"}')
+    print(f'{"response":<16} {"size [kB]":>10} {"models [us]":>12} {"fast [us]":>10} {"speedup":>8}')
+    for name, content in responses.items():
+        model_us = measure(models[name], content, args.number)
+        fast_us = measure(fast[name], content, args.number)
+        print(f'{name:<16} {len(content) / 1024:>10.1f} {model_us:>12.1f} {fast_us:>10.1f} {model_us / fast_us:>7.1f}x')
+
+
+# Compare parse cost, e.g. `python -m benchmarks.parse_benchmarks`
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+import argparse
+import shutil
+import subprocess
+import sys
+
+from typing import Optional
+
+from benchmarks.synthetic_data import generate, parse_scale, synthetic_paths
+from shared_utils import metrics
+from shared_utils.paths import album_tensor_path, dataset_path, Years, DEFAULT_FORMAT, PARQUET, CSV
+from shared_utils.utils import PROJECT_DIR
+
+# Consts
+
+SCALES = ['10k', '100k', '1m']
+"""Default scales (numbers of albums) of benchmark."""
+
+DEFAULT_MAX_SLOWDOWN = 1.2
+"""Maximum ratio of current to baseline wall time of a stage before it is reported as regression."""
+
+MIN_COMPARED_WALL_S = 0.1
+"""Stages shorter than this in baseline are not checked for regressions, their wall time is mostly noise."""
+
+YEARS = (1960, 2020)
+"""Release years of synthetic albums."""
+
+LOOKUPS = 10_000
+MULTI_GET_SIZE = 256
+"""Number of albums looked up one by one in feature store, and number of albums of each multi-get."""
+
+
+# Functions
+
+def run_benchmark(data_dir: str, years: Years = YEARS, fmt: str = DEFAULT_FORMAT, chunk_size: Optional[int] = None):
+    """
+    Run processing stages of data pipeline on raw data in data directory, each stage measured
+    with metrics.stage() (see synthetic_data.generate() for layout of raw files). Finalization
+    is split into loading inputs, grouping features by album and saving each variant.
+
+    Args:
+        data_dir: Directory with raw data, outputs are saved to `<data_dir>/<fmt>` (removed first, so every
+            stage writes to a fresh tree).
+        years: Range of release years of data.
+        fmt: Format of processed outputs.
+        chunk_size: Chunk size of SpotifyDataProcessor, whole files are read if None.
+    """
+
+    from data_processing.feature.rym_feature_selection import RymFeatureSelection
+    from data_processing.feature.spotify_feature_selection import SpotifyFeatureSelection
+    from data_processing.postprocessing.feature_matrix import load_feature_matrix
+    from data_processing.postprocessing.feature_store import FeatureStore
+    from data_processing.postprocessing.finalize_data_processing import FinalizeDataProcessor, FEATURE_STORE, FLATTEN
+    from data_processing.preprocessing.rym_data_processing import RymDataProcessor
+    from data_processing.preprocessing.spotify_data_processing import SpotifyDataProcessor
+    from shared_utils.storage import load_release_years
+
+    raw = synthetic_paths(data_dir, years)
+    output_dir = f'{data_dir}/{fmt}'
+    rym_processed_path = dataset_path(f'{output_dir}/processed/rym/rym_charts', years, fmt)
+    spotify_processed_search_path = dataset_path(f'{output_dir}/processed/spotify/spotify_search_album_id', years, fmt)
+    spotify_processed_features_path = dataset_path(f'{output_dir}/processed/spotify/spotify_tracks_feature', years, fmt)
+    spotify_feature_path = dataset_path(f'{output_dir}/feature/spotify', years, fmt)
+    rym_feature_path = dataset_path(f'{output_dir}/feature/rym', years, fmt)
+    final_dir = f'{output_dir}/final'
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    with metrics.stage('RymDataProcessor.process'):
+        RymDataProcessor(raw.rym, rym_processed_path).process()
+
+    with metrics.stage('SpotifyDataProcessor.process_and_save'):
+        SpotifyDataProcessor(
+            raw.spotify_search,
+            raw.spotify_track_ids,
+            raw.spotify_track_features,
+            spotify_processed_search_path,
+            spotify_processed_features_path,
+            chunk_size=chunk_size,
+            release_years=load_release_years(rym_processed_path, raw.spotify_search, years)
+        ).process_and_save()
+
+    with metrics.stage('SpotifyFeatureSelection.run_and_save'):
+        SpotifyFeatureSelection(
+            spotify_processed_features_path,
+            spotify_feature_path,
+            years=years,
+            release_years=load_release_years(rym_processed_path, spotify_processed_search_path, years)
+        ).run_and_save()
+
+    with metrics.stage('RymFeatureSelection.run_and_save'):
+        RymFeatureSelection(rym_processed_path, spotify_processed_search_path, rym_feature_path, years).run_and_save()
+
+    with metrics.stage('FinalizeDataProcessor.load'):
+        processor = FinalizeDataProcessor(rym_feature_path, spotify_feature_path, final_dir, years=years,
+                                          spotify_tensor_path=album_tensor_path(spotify_feature_path))
+    with metrics.stage('FinalizeDataProcessor.group_features'):
+        processor.group_features()
+    for finalize in [processor.finalize_to_flatten, processor.finalize_to_aggregated, processor.finalize_to_single,
+                     processor.save_feature_store]:
+        with metrics.stage(f'FinalizeDataProcessor.{finalize.__name__}'):
+            finalize()
+
+    # Rows per second of lookup stages are albums looked up per second.
+    album_ids = load_feature_matrix(f'{final_dir}/{FLATTEN}').album_ids.tolist()
+    with FeatureStore(f'{final_dir}/{FEATURE_STORE}') as store:
+        with metrics.stage('FeatureStore.get'):
+            for album_id in album_ids[:LOOKUPS]:
+                store.get(album_id)
+            metrics.add_rows(rows_in=min(LOOKUPS, len(album_ids)))
+        with metrics.stage(f'FeatureStore.multi_get_{MULTI_GET_SIZE}'):
+            for start in range(0, len(album_ids), MULTI_GET_SIZE):
+                store.multi_get(album_ids[start:start + MULTI_GET_SIZE])
+            metrics.add_rows(rows_in=len(album_ids))
+
+
+def find_regressions(baseline: list[dict], current: list[dict], max_slowdown: float) -> list[dict]:
+    """
+    Returns: Stages of both reports (see metrics.compare_reports()) whose wall time grew more than
+        max_slowdown times, stages shorter than MIN_COMPARED_WALL_S in baseline are skipped.
+    """
+
+    return [
+        row for row in metrics.compare_reports(baseline, current)
+        if row['speedup'] is not None and row['baseline_wall_s'] >= MIN_COMPARED_WALL_S
+        and row['speedup'] < 1 / max_slowdown
+    ]
+
+
+def git_revision() -> Optional[str]:
+    """Returns: Current git commit of repository, None if it is unknown."""
+
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR, capture_output=True,
+                                text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def main(args: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark data processing stages on synthetic data of given scales. Each scale is saved as '
+                    'JSON-lines run report, which may be compared with a baseline report.')
+    parser.add_argument('--scales', nargs='+', default=SCALES[:1],
+                        help=f'Numbers of albums, e.g. {" ".join(SCALES)}.')
+    parser.add_argument('--work-dir', default=f'{PROJECT_DIR}/data/benchmarks',
+                        help='Directory of synthetic data (generated once for each scale) and outputs of stages.')
+    parser.add_argument('--results-dir', default=f'{PROJECT_DIR}/data/benchmarks/results',
+                        help='Directory of run reports.')
+    parser.add_argument('--format', choices=[PARQUET, CSV], default=DEFAULT_FORMAT, help='Format of processed outputs.')
+    parser.add_argument('--chunk-size', type=int, default=None, help='Chunk size of SpotifyDataProcessor.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of synthetic data.')
+    parser.add_argument('--baseline', nargs='+', default=[],
+                        help='Baseline run reports, compared with reports of the same scale.')
+    parser.add_argument('--max-slowdown', type=float, default=DEFAULT_MAX_SLOWDOWN,
+                        help='Exit with error if a stage is this many times slower than in baseline.')
+    args = parser.parse_args(args)
+
+    baselines = {}
+    for path in args.baseline:
+        records = metrics.load_report(path)
+        if records:
+            baselines[records[0]['params'].get('scale')] = records
+
+    regressions = []
+    revision = git_revision()
+    for scale in args.scales:
+        n_albums = parse_scale(scale)
+        data_dir = f'{args.work_dir}/{scale}'
+        print(f'Generating {n_albums} albums to {data_dir}.')
+        generate(data_dir, n_albums, YEARS, args.seed)
+
+        report = metrics.start_run(args.results_dir, f'benchmark_{scale}', scale=scale, n_albums=n_albums,
+                                   format=args.format, chunk_size=args.chunk_size, seed=args.seed, revision=revision)
+        run_benchmark(data_dir, YEARS, args.format, args.chunk_size)
+        print(f'Results of {scale} saved to {report.path}.')
+
+        if scale in baselines:
+            current = metrics.load_report(report.path)
+            for row in metrics.compare_reports(baselines[scale], current):
+                print(f'{row["stage"]:<50} {row["baseline_wall_s"]!s:>10} -> {row["current_wall_s"]!s:>10} s '
+                      f'(speedup {row["speedup"]})')
+            regressions += find_regressions(baselines[scale], current, args.max_slowdown)
+
+    if regressions:
+        print(f'Stages slower than {args.max_slowdown}x baseline: {", ".join(row["stage"] for row in regressions)}.')
+        sys.exit(1)
+
+
+# Run benchmarks, e.g. `python -m benchmarks.run_benchmarks --scales 10k 100k --baseline results/10k.jsonl`
+if __name__ == '__main__':
+    main()
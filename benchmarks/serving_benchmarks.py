@@ -0,0 +1,184 @@
+import argparse
+import os
+import threading
+import time
+import numpy as np
+import requests
+
+from typing import Optional
+
+from benchmarks.run_benchmarks import run_benchmark, YEARS
+from benchmarks.synthetic_data import generate, parse_scale
+from shared_utils import metrics
+from shared_utils.tracing import LatencyHistogram
+from shared_utils.utils import PROJECT_DIR
+
+# Consts
+
+DEFAULT_CONCURRENCY = [1, 8, 32]
+"""Numbers of concurrent clients."""
+
+DEFAULT_REQUESTS = 2000
+"""Number of requests sent by all clients of one configuration."""
+
+UNBATCHED = (1, 0.)
+"""Batch size and latency budget of service predicting every request separately."""
+
+
+# Functions
+
+def train_model(final_dir: str, model_dir: str, model_type: str, seed: int = 0):
+    """
+    Train small model on final dataset of synthetic data and save it (only to have a model of real
+    input size to serve, its accuracy does not matter).
+
+    Args:
+        final_dir: Directory of final datasets (with feature store).
+        model_dir: Output directory of the model.
+        model_type: XGBOOST (agg_flatten variant) or FEED_FORWARD (flatten variant).
+        seed: Seed of training.
+    """
+
+    from data_processing.postprocessing.feature_matrix import load_feature_matrix
+    from data_processing.postprocessing.finalize_data_processing import AGG_FLATTEN, FLATTEN
+    from src.models.saved_model import XGBOOST, save_feed_forward, save_xgboost
+
+    variant = AGG_FLATTEN if model_type == XGBOOST else FLATTEN
+    dataset = load_feature_matrix(f'{final_dir}/{variant}', mmap_mode=None)
+    num_classes = int(dataset.labels.max()) + 1
+
+    if model_type == XGBOOST:
+        import xgboost as xgb
+
+        params = {'objective': 'multi:softmax', 'num_class': num_classes, 'max_depth': 5, 'seed': seed}
+        booster = xgb.train(params, xgb.DMatrix(dataset.features, label=dataset.labels), 50)
+        save_xgboost(model_dir, booster, variant, dataset.feature_names, num_classes)
+        return
+
+    import torch
+    from src.models.feed_forward import FeedForwardNN
+
+    torch.manual_seed(seed)
+    model = FeedForwardNN(len(dataset.feature_names), [256, 128, 64, 32], num_classes)
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
+    features, labels = torch.from_numpy(dataset.features), torch.from_numpy(dataset.labels.astype(np.int64))
+    for _ in range(5):
+        loss = torch.nn.functional.cross_entropy(model(features), labels)
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+    save_feed_forward(model_dir, model, variant, dataset.feature_names, num_classes)
+
+
+def run_load(service, album_ids: list[str], concurrency: int, n_requests: int, url: Optional[str] = None) -> dict:
+    """
+    Send requests of single albums from concurrent clients, each client sending its next request after
+    response to the previous one.
+
+    Args:
+        service: Started PredictionService.
+        album_ids: Albums to request, in round-robin order.
+        concurrency: Number of clients.
+        n_requests: Number of requests of all clients.
+        url: URL of PredictionServer of the service, requests are sent to Python API if None.
+
+    Returns:
+        Client-side latency percentiles and throughput, with stats of the service.
+    """
+
+    histogram = LatencyHistogram()
+    lock = threading.Lock()
+    counter = iter(range(n_requests))
+
+    def client():
+        session = requests.Session()
+        local = LatencyHistogram()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            album_id = album_ids[i % len(album_ids)]
+            start = time.perf_counter()
+            if url is None:
+                service.predict_albums([album_id])
+            else:
+                session.post(f'{url}/predict', json={'album_ids': [album_id]}).raise_for_status()
+            local.record(time.perf_counter() - start)
+        with lock:
+            histogram.merge(local)
+
+    start = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    wall_s = time.perf_counter() - start
+
+    return {
+        'wall_s': round(wall_s, 4),
+        'requests_per_s': round(n_requests / wall_s, 2),
+        'p50_ms': round(histogram.percentile(50) * 1000, 3),
+        'p99_ms': round(histogram.percentile(99) * 1000, 3),
+        'mean_batch_rows': service.stats.to_record()['mean_batch_rows'],
+    }
+
+
+def main(args: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark latency and throughput of prediction service on synthetic data, with and without '
+                    'micro-batching of concurrent requests.')
+    parser.add_argument('--albums', default='10k', help='Number of synthetic albums, e.g. 10k.')
+    parser.add_argument('--model-type', default='xgboost', choices=['xgboost', 'feed_forward'],
+                        help='Type of served model.')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=DEFAULT_CONCURRENCY,
+                        help='Numbers of concurrent clients.')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help='Number of requests per configuration.')
+    parser.add_argument('--max-batch-size', type=int, default=256, help='Maximum batch size of batching service.')
+    parser.add_argument('--max-wait-ms', type=float, default=0., help='Latency budget of batching service.')
+    parser.add_argument('--http', action='store_true', help='Send requests over HTTP instead of Python API.')
+    parser.add_argument('--work-dir', default=f'{PROJECT_DIR}/data/benchmarks', help='Directory of synthetic data.')
+    parser.add_argument('--results-dir', default=f'{PROJECT_DIR}/data/benchmarks/results',
+                        help='Directory of run reports.')
+    args = parser.parse_args(args)
+
+    from data_processing.postprocessing.feature_store import FeatureStore
+    from data_processing.postprocessing.finalize_data_processing import FEATURE_STORE
+    from shared_utils.paths import PARQUET
+    from src.models.prediction_service import PredictionServer, PredictionService
+    from src.models.saved_model import load_model
+
+    data_dir = f'{args.work_dir}/{args.albums}'
+    final_dir = f'{data_dir}/{PARQUET}/final'
+    if not os.path.exists(f'{final_dir}/{FEATURE_STORE}'):
+        generate(data_dir, parse_scale(args.albums), YEARS)
+        run_benchmark(data_dir, YEARS)
+    model_dir = f'{data_dir}/models/{args.model_type}'
+    train_model(final_dir, model_dir, args.model_type)
+
+    model = load_model(model_dir)
+    report = metrics.start_run(args.results_dir, f'serving_{args.albums}', model_type=args.model_type,
+                               http=args.http, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    with FeatureStore(f'{final_dir}/{FEATURE_STORE}') as feature_store:
+        album_ids = np.load(f'{final_dir}/{model.info.variant}/album_ids.npy').tolist()
+        print(f'{"batching":<10} {"clients":>7} {"req/s":>9} {"p50 [ms]":>9} {"p99 [ms]":>9} {"batch rows":>10}')
+        for batching, (max_batch_size, max_wait_s) in [
+            ('off', UNBATCHED), ('on', (args.max_batch_size, args.max_wait_ms / 1000))
+        ]:
+            for concurrency in args.concurrency:
+                with PredictionService(model, feature_store, max_batch_size, max_wait_s) as service:
+                    if args.http:
+                        with PredictionServer(service) as server:
+                            result = run_load(service, album_ids, concurrency, args.requests, server.url)
+                    else:
+                        result = run_load(service, album_ids, concurrency, args.requests)
+                report.write({'batching': batching, 'clients': concurrency, **result})
+                print(f'{batching:<10} {concurrency:>7} {result["requests_per_s"]:>9.0f} {result["p50_ms"]:>9.2f} '
+                      f'{result["p99_ms"]:>9.2f} {result["mean_batch_rows"]:>10}')
+    print(f'Results saved to {report.path}.')
+
+
+# Run benchmark, e.g. `python -m benchmarks.serving_benchmarks --albums 10k --concurrency 1 8 32 --http`
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import shared_utils.columns as c
+
+from shared_utils import schemas
+from shared_utils.paths import Years
+from shared_utils.utils import PROJECT_DIR
+
+# Consts
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+          'November', 'December']
+
+GENRE_MAP_PATH = f'{PROJECT_DIR}/data/all_genre_map.json'
+"""Genres of synthetic albums are drawn from genres known to GenreMapper."""
+
+PARAMS_FILE = 'synthetic.json'
+"""File with parameters of generated data, saved next to it."""
+
+MAX_LYRICS_ALBUMS = 1000
+"""Default number of albums with Genius lyrics - one JSON file is written for each of them."""
+
+_ID_LENGTH = 22
+"""Length of Spotify identifiers."""
+
+
+@dataclass
+class SyntheticPaths:
+    """
+    Paths of generated raw files, named the same way as in run_pipeline.
+
+    Attributes:
+        rym: RYM charts (c.RYM_COLS).
+        spotify_search: Spotify search results (c.SPOTIFY_SEARCH_COLS).
+        spotify_track_ids: Spotify track ids of found albums (c.SPOTIFY_TRACKS_IDS_COLS).
+        spotify_track_features: Spotify audio features of tracks (c.SONG_ID and c.SPOTIFY_RAW_FEATURES).
+        genius_stats: Number of fetched lyrics of albums (GENIUS_STATS_SCHEMA).
+        genius_lyrics_dir: Directory of AlbumLyricsModel JSON files.
+    """
+
+    rym: str
+    spotify_search: str
+    spotify_track_ids: str
+    spotify_track_features: str
+    genius_stats: str
+    genius_lyrics_dir: str
+
+
+# Functions
+
+def synthetic_paths(output_dir: str, years: Years) -> SyntheticPaths:
+    """Returns: Paths of raw files generated to output directory for given range of years."""
+
+    start_year, end_year = years
+    return SyntheticPaths(
+        rym=f'{output_dir}/raw/rym/rym_charts.csv',
+        spotify_search=f'{output_dir}/raw/spotify/spotify_search_album_id_{start_year}_{end_year}.csv',
+        spotify_track_ids=f'{output_dir}/raw/spotify/spotify_tracks_ids_{start_year}_{end_year}.csv',
+        spotify_track_features=f'{output_dir}/raw/spotify/spotify_tracks_feature_{start_year}_{end_year}.csv',
+        genius_stats=f'{output_dir}/raw/genius/genius_stats_{start_year}_{end_year}.csv',
+        genius_lyrics_dir=f'{output_dir}/raw/genius/lyrics_{start_year}_{end_year}',
+    )
+
+
+def generate(
+        output_dir: str,
+        n_albums: int,
+        years: Years = (1960, 2020),
+        seed: int = 0,
+        lyrics_albums: int = MAX_LYRICS_ALBUMS
+) -> SyntheticPaths:
+    """
+    Generate raw RYM, Spotify and Genius files with the same columns and dtypes as fetched files
+    (real data cannot be shared). Data contains what processing stages clean up: duplicated and rarely
+    rated albums, albums not found in Spotify or with too few tracks, missing, duplicated and out of
+    bounds track features. Files are generated once for given parameters and reused afterwards.
+
+    Examples:
+    ---------
+    >>> paths = generate(f'{PROJECT_DIR}/data/benchmarks/10k', 10_000)
+    >>> RymDataProcessor(paths.rym, rym_processed_path).process()
+
+    Args:
+        output_dir: Output directory of raw files (see synthetic_paths()).
+        n_albums: Number of distinct RYM albums.
+        years: Range of release years of albums.
+        seed: Seed of random generator.
+        lyrics_albums: Maximum number of albums with Genius lyrics.
+
+    Returns:
+        Paths of generated files.
+    """
+
+    paths = synthetic_paths(output_dir, years)
+    params = {'n_albums': n_albums, 'years': list(years), 'seed': seed, 'lyrics_albums': lyrics_albums}
+    params_path = os.path.join(output_dir, PARAMS_FILE)
+    if os.path.exists(params_path):
+        with open(params_path, 'r') as json_file:
+            if json.load(json_file) == params:
+                return paths
+
+    for path in [paths.rym, paths.spotify_search, paths.genius_stats]:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.makedirs(paths.genius_lyrics_dir, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    df_rym = generate_rym(rng, n_albums, years)
+    schemas.to_csv(df_rym, paths.rym, schemas.RYM_RAW_SCHEMA)
+
+    df_search = generate_spotify_search(rng, df_rym.drop_duplicates(subset=[c.ARTIST, c.ALBUM]))
+    schemas.to_csv(df_search, paths.spotify_search, schemas.SPOTIFY_SEARCH_SCHEMA)
+
+    df_tracks = generate_spotify_tracks(rng, df_search)
+    schemas.to_csv(df_tracks, paths.spotify_track_ids, schemas.SPOTIFY_TRACKS_IDS_SCHEMA)
+
+    df_features = generate_spotify_features(rng, df_tracks)
+    schemas.to_csv(df_features, paths.spotify_track_features, schemas.SPOTIFY_RAW_FEATURES_SCHEMA)
+
+    generate_genius(rng, df_search, df_tracks, paths, lyrics_albums)
+
+    with open(params_path, 'w') as json_file:
+        json.dump(params, json_file)
+    return paths
+
+
+def generate_rym(rng: np.random.Generator, n_albums: int, years: Years) -> pd.DataFrame:
+    """
+    Returns: RYM charts (c.RYM_COLS) of n_albums albums, with ~1% of albums repeated (with other rating)
+        and ~5% of albums with fewer ratings than RymDataProcessor.MINIMUM_RATE_NUMBER.
+    """
+
+    with open(GENRE_MAP_PATH, 'r', encoding='utf-8') as json_file:
+        genres = np.array([genre.title() for genre in json.load(json_file)])
+
+    index = np.arange(n_albums)
+    release_years = rng.integers(years[0], years[1] + 1, n_albums)
+    months = np.array(MONTHS)[rng.integers(0, 12, n_albums)]
+    days = rng.integers(1, 29, n_albums)
+
+    # RYM shows full date, month and year, or just year of release.
+    precision = rng.choice(3, n_albums, p=[0.5, 0.3, 0.2])
+    year_str = pd.Series(release_years).astype(str)
+    month_year = pd.Series(months) + ' ' + year_str
+    dates = np.where(precision == 0, pd.Series(days).astype(str) + ' ' + month_year,
+                     np.where(precision == 1, month_year, year_str))
+
+    n_genres = rng.integers(1, 4, n_albums)
+    genre_names = [pd.Series(genres[rng.integers(0, len(genres), n_albums)]) for _ in range(3)]
+    album_genres = genre_names[0]
+    for i in [1, 2]:
+        album_genres = album_genres.where(n_genres <= i, album_genres + ', ' + genre_names[i])
+
+    ratings_number = np.where(rng.random(n_albums) < 0.05, rng.integers(1, 50, n_albums),
+                              rng.lognormal(6.5, 1.2, n_albums).astype(int) + 50)
+
+    df = pd.DataFrame({
+        c.ARTIST: 'Artist ' + pd.Series(index // 3).astype(str),
+        c.ALBUM: 'Album ' + pd.Series(index).astype(str),
+        c.DATE: dates,
+        c.RATING: rng.normal(3.3, 0.35, n_albums).clip(0.5, 5).round(2),
+        c.RATING_NUMBER: pd.Series(ratings_number).map('{:,}'.format),
+        c.GENRES: album_genres,
+    })
+
+    repeated = df.sample(frac=0.01, random_state=int(rng.integers(1 << 31)))
+    repeated[c.RATING] = (repeated[c.RATING] + 0.01).clip(0.5, 5)
+    return pd.concat([df, repeated], ignore_index=True)[c.RYM_COLS]
+
+
+def generate_spotify_search(rng: np.random.Generator, df_rym: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns: Spotify search results (c.SPOTIFY_SEARCH_COLS) of RYM albums. Albums with precision match 0
+        were not found, so they have no Spotify id.
+    """
+
+    n = len(df_rym)
+    precision_match = rng.choice(5, n, p=[0.05, 0.03, 0.04, 0.08, 0.8]).astype(float)
+    found = precision_match > 0
+
+    return pd.DataFrame({
+        c.ALBUM: df_rym[c.ALBUM].to_numpy(),
+        c.ARTIST: df_rym[c.ARTIST].to_numpy(),
+        c.ALBUM_ID: pd.Series(_spotify_ids('a', n)).where(found),
+        c.SPOTIFY_ALBUM: pd.Series(df_rym[c.ALBUM].to_numpy()).where(found),
+        c.SPOTIFY_ARTIST: pd.Series(df_rym[c.ARTIST].to_numpy()).where(found),
+        c.PREC_MATCH: precision_match,
+    })[c.SPOTIFY_SEARCH_COLS]
+
+
+def generate_spotify_tracks(rng: np.random.Generator, df_search: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns: Track ids (c.SPOTIFY_TRACKS_IDS_COLS) of albums found with precision match above 1 (the same
+        albums as SpotifyTrackIDsFetcher fetches), ~5% of albums have fewer tracks than required minimum.
+    """
+
+    album_ids = df_search.loc[df_search[c.PREC_MATCH] > 1, c.ALBUM_ID].to_numpy()
+    n_tracks = np.where(rng.random(len(album_ids)) < 0.05, rng.integers(1, 4, len(album_ids)),
+                        rng.integers(6, 21, len(album_ids)))
+
+    total = int(n_tracks.sum())
+    offsets = np.repeat(np.cumsum(n_tracks) - n_tracks, n_tracks)
+    song_numbers = np.arange(total) - offsets + 1
+
+    return pd.DataFrame({
+        c.ALBUM_ID: np.repeat(album_ids, n_tracks),
+        c.SONG_ID: _spotify_ids('t', total),
+        c.SONG_NAME: 'Track ' + pd.Series(song_numbers).astype(str),
+        c.SONG_NUMBER: song_numbers,
+        c.SONG_ARTISTS_NUMBER: rng.choice([1, 2, 3], total, p=[0.85, 0.1, 0.05]),
+    })[c.SPOTIFY_TRACKS_IDS_COLS]
+
+
+def generate_spotify_features(rng: np.random.Generator, df_tracks: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns: Audio features (c.SONG_ID and c.SPOTIFY_RAW_FEATURES) of tracks. Features of ~2% of tracks are
+        missing, ~2% of tracks have values out of bounds of feature rules and ~1% of rows are duplicated.
+    """
+
+    df_tracks = df_tracks[rng.random(len(df_tracks)) >= 0.02]
+    n = len(df_tracks)
+
+    df = pd.DataFrame({
+        c.SONG_ID: df_tracks[c.SONG_ID].to_numpy(),
+        c.DANCEABILITY: rng.beta(5, 4, n),
+        c.ENERGY: rng.beta(4, 3, n),
+        c.KEY: rng.integers(0, 12, n),
+        c.LOUDNESS: -rng.gamma(4, 2.5, n),
+        c.MODE: rng.integers(0, 2, n),
+        c.SPEECHINESS: rng.beta(1, 15, n),
+        c.ACOUSTICNESS: rng.beta(1, 2, n),
+        c.INSTRUMENTALNESS: rng.beta(0.5, 3, n),
+        c.LIVENESS: rng.beta(2, 8, n),
+        c.VALENCE: rng.beta(3, 3, n),
+        c.TEMPO: rng.normal(120, 25, n).clip(50, 215),
+        c.DURATION_MS: rng.normal(240000, 60000, n).clip(30000, 590000).astype(int),
+        c.TIME_SIGNATURE: rng.choice([3, 4, 5], n, p=[0.1, 0.85, 0.05]),
+    })
+
+    outliers = rng.random(n) < 0.02
+    df.loc[outliers, c.TEMPO] = rng.uniform(0, 40, int(outliers.sum()))
+    df.loc[outliers, c.DURATION_MS] = rng.integers(1000, 15000, int(outliers.sum()))
+
+    duplicated = df.sample(frac=0.01, random_state=int(rng.integers(1 << 31)))
+    return pd.concat([df, duplicated], ignore_index=True)
+
+
+def generate_genius(
+        rng: np.random.Generator,
+        df_search: pd.DataFrame,
+        df_tracks: pd.DataFrame,
+        paths: SyntheticPaths,
+        lyrics_albums: int = MAX_LYRICS_ALBUMS
+):
+    """
+    Write Genius stats and lyrics (in AlbumLyricsModel format) of up to lyrics_albums albums found
+    with precision match above 2 (the same albums as GeniusDataFetcher fetches).
+    """
+
+    df_albums = df_search[df_search[c.PREC_MATCH] > 2].head(lyrics_albums)
+    df_albums_tracks = df_tracks[df_tracks[c.ALBUM_ID].isin(df_albums[c.ALBUM_ID])]
+    tracks_by_album = dict(list(df_albums_tracks.groupby(c.ALBUM_ID)))
+
+    stats = []
+    for genius_id, album in enumerate(df_albums.itertuples(index=False)):
+        album_tracks = tracks_by_album.get(getattr(album, c.ALBUM_ID))
+        tracks = [] if album_tracks is None else [
+            {
+                'song_id': str(genius_id * 100 + track[c.SONG_NUMBER]),
+                'song_name': f'{track[c.SONG_NAME]} by {getattr(album, c.SPOTIFY_ARTIST)}',
+                'song_number': str(track[c.SONG_NUMBER]),
+                'lyrics': ' '.join(['la'] * int(rng.integers(50, 400))),
+                'lyrics_state': 'complete',
+                'language': 'en',
+            }
+            for _, track in album_tracks.iterrows() if rng.random() < 0.9
+        ]
+        stats.append({
+            c.ALBUM_ID: getattr(album, c.ALBUM_ID),
+            c.SPOTIFY_ALBUM: getattr(album, c.SPOTIFY_ALBUM),
+            c.SPOTIFY_ARTIST: getattr(album, c.SPOTIFY_ARTIST),
+            'number_of_fetched_lyrics': len(tracks),
+        })
+        if tracks:
+            lyrics = {
+                'spotify_id': getattr(album, c.ALBUM_ID),
+                'genius_id': str(genius_id),
+                'artist_name': getattr(album, c.SPOTIFY_ARTIST),
+                'album_name': getattr(album, c.SPOTIFY_ALBUM),
+                'tracks': tracks,
+            }
+            with open(f'{paths.genius_lyrics_dir}/{getattr(album, c.ALBUM_ID)}.json', 'w', encoding='utf-8') as file:
+                json.dump(lyrics, file)
+
+    df_stats = pd.DataFrame(stats, columns=list(schemas.GENIUS_STATS_SCHEMA))
+    schemas.to_csv(df_stats, paths.genius_stats, schemas.GENIUS_STATS_SCHEMA)
+
+
+def _spotify_ids(prefix: str, n: int) -> np.ndarray:
+    """Returns: n unique identifiers of Spotify length, starting with prefix."""
+
+    return (prefix + pd.Series(np.arange(n)).astype(str).str.zfill(_ID_LENGTH - len(prefix))).to_numpy()
+
+
+def parse_scale(scale: str) -> int:
+    """
+    Examples:
+    ---------
+    >>> parse_scale('10k'), parse_scale('1m'), parse_scale('2500')
+    (10000, 1000000, 2500)
+
+    Returns: Number of albums of scale given with optional 'k' or 'm' suffix.
+    """
+
+    multipliers = {'k': 1_000, 'm': 1_000_000}
+    scale = scale.lower()
+    if scale[-1] in multipliers:
+        return int(float(scale[:-1]) * multipliers[scale[-1]])
+    return int(scale)
+
+
+def main(args: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description='Generate synthetic raw RYM, Spotify and Genius data.')
+    parser.add_argument('scale', help='Number of albums, e.g. 10k, 100k or 1m.')
+    parser.add_argument('--output-dir', default=None, help='Output directory, data/benchmarks/<scale> by default.')
+    parser.add_argument('--start-year', type=int, default=1960, help='First release year of albums.')
+    parser.add_argument('--end-year', type=int, default=2020, help='Last release year of albums.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of random generator.')
+    args = parser.parse_args(args)
+
+    output_dir = args.output_dir or f'{PROJECT_DIR}/data/benchmarks/{args.scale}'
+    paths = generate(output_dir, parse_scale(args.scale), (args.start_year, args.end_year), args.seed)
+    print(json.dumps(asdict(paths), indent=2))
+
+
+# Generate data, e.g. `python -m benchmarks.synthetic_data 100k`
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass
+from typing import Optional
+
+from shared_utils import columns as c
+
+REPEAT = 'repeat'
+MEAN = 'mean'
+ZERO = 'zero'
+FILL_TYPES = [REPEAT, MEAN, ZERO]
+"""Ways of filling albums with fewer tracks than the tensor length."""
+
+
+@dataclass
+class AlbumTensor:
+    """
+    Dense representation of album tracks features.
+
+    Attributes:
+        album_ids: Album ids of shape (albums,).
+        features: Float32 features of shape (albums, max_len, features).
+        mask: Boolean mask of shape (albums, max_len) - True for real tracks, False for filled ones.
+        feature_names: Names of features in last dimension of `features`.
+    """
+
+    album_ids: np.ndarray
+    features: np.ndarray
+    mask: np.ndarray
+    feature_names: list[str]
+
+    def flatten(self) -> np.ndarray:
+        """Returns: Features of each album flattened track by track, of shape (albums, max_len * features)."""
+
+        return self.features.reshape(len(self.features), -1)
+
+    def flatten_feature_names(self) -> list[str]:
+        """Returns: Names of flattened features (e.g. 'tempo0', ..., 'tempo15')."""
+
+        max_len = self.features.shape[1]
+        return [f'{name}{i}' for i in range(max_len) for name in self.feature_names]
+
+    def save(self, path: str):
+        """
+        Save tensor as directory of .npy files, which can be memory-mapped on load.
+
+        Args:
+            path: Output directory.
+        """
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'album_ids.npy'), self.album_ids.astype(str))
+        np.save(os.path.join(path, 'features.npy'), self.features)
+        np.save(os.path.join(path, 'mask.npy'), self.mask)
+        with open(os.path.join(path, 'feature_names.json'), 'w') as json_file:
+            json.dump(self.feature_names, json_file)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = 'r') -> 'AlbumTensor':
+        """
+        Load tensor saved with save().
+
+        Args:
+            path: Directory with saved tensor.
+            mmap_mode: Memory-map mode of features and mask arrays (see np.load), None to load into memory.
+
+        Returns:
+            Loaded tensor.
+        """
+
+        with open(os.path.join(path, 'feature_names.json'), 'r') as json_file:
+            feature_names = json.load(json_file)
+
+        return cls(
+            album_ids=np.load(os.path.join(path, 'album_ids.npy')),
+            features=np.load(os.path.join(path, 'features.npy'), mmap_mode=mmap_mode),
+            mask=np.load(os.path.join(path, 'mask.npy'), mmap_mode=mmap_mode),
+            feature_names=feature_names,
+        )
+
+
+def album_offsets(codes: np.ndarray) -> np.ndarray:
+    """
+    Get offsets of consecutive groups in sorted array of group codes.
+
+    Examples:
+    ---------
+    >>> album_offsets(np.array([0, 0, 1, 2, 2, 2]))
+    array([0, 2, 3, 6])
+
+    Args:
+        codes: Sorted group codes (e.g. factorized album ids).
+
+    Returns:
+        Array of shape (groups + 1,) with start of each group and total length at the end.
+    """
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=np.int64)
+    return np.append(starts, len(codes)).astype(np.int64)
+
+
+def pad_sequences(
+        values: np.ndarray,
+        offsets: np.ndarray,
+        max_len: int,
+        fill_type: str = REPEAT
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pad or cut variable-length groups of rows to dense tensor with index arithmetic only.
+
+    Args:
+        values: Rows of all groups of shape (rows, features), ordered group by group.
+        offsets: Offsets of groups in values, of shape (groups + 1,) - see album_offsets().
+        max_len: Length of each group in output.
+        fill_type: REPEAT to fill missing rows with group rows repeated from its start,
+            MEAN to fill them with the mean of group rows, ZERO to fill them with zeros.
+
+    Returns:
+        Tuple of padded tensor of shape (groups, max_len, features), mask of real rows of shape
+        (groups, max_len) and indices of gathered rows in values of shape (groups, max_len).
+    """
+
+    assert fill_type in FILL_TYPES, f'Invalid fill type {fill_type}, expected one of: {FILL_TYPES}.'
+
+    starts = offsets[:-1]
+    counts = np.diff(offsets)
+    lengths = np.minimum(counts, max_len)
+    positions = np.arange(max_len)
+    mask = positions[None, :] < lengths[:, None]
+
+    if fill_type == REPEAT:
+        # Missing rows are taken from the start of the group: row i is the (i mod length)-th row.
+        gather = starts[:, None] + positions[None, :] % np.maximum(lengths, 1)[:, None]
+        tensor = values[gather]
+    elif fill_type == ZERO:
+        gather = starts[:, None] + np.minimum(positions[None, :], np.maximum(lengths - 1, 0)[:, None])
+        tensor = np.where(mask[:, :, None], values[gather], 0)
+    else:
+        gather = starts[:, None] + np.minimum(positions[None, :], np.maximum(lengths - 1, 0)[:, None])
+        means = np.add.reduceat(values, starts, axis=0) / np.maximum(counts, 1)[:, None] if len(starts) else values[:0]
+        tensor = np.where(mask[:, :, None], values[gather], means[:, None, :].astype(values.dtype))
+
+    return tensor.astype(np.float32, copy=False), mask, gather
+
+
+def sort_album_tracks(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Order tracks by c.ALBUM_ID and c.SONG_NUMBER.
+
+    Args:
+        df: Dataframe with one row per track.
+
+    Returns:
+        Tuple of row order, offsets of albums in ordered rows and sorted unique album ids.
+    """
+
+    codes, album_ids = pd.factorize(df[c.ALBUM_ID], sort=True)
+    order = np.lexsort((df[c.SONG_NUMBER].to_numpy(), codes))
+    return order, album_offsets(codes[order]), np.asarray(album_ids, dtype=object)
+
+
+def build_album_tensor(
+        df: pd.DataFrame,
+        feature_cols: list[str],
+        max_len: int,
+        fill_type: str = REPEAT
+) -> tuple[AlbumTensor, np.ndarray]:
+    """
+    Build dense tensor of album tracks from long dataframe with one row per track.
+    Tracks of each album are ordered by c.SONG_NUMBER and albums by c.ALBUM_ID;
+    albums with more than max_len tracks are cut to first max_len tracks.
+
+    Args:
+        df: Dataframe with c.ALBUM_ID, c.SONG_NUMBER and feature columns.
+        feature_cols: Feature columns to put in the tensor.
+        max_len: Number of tracks of each album in the tensor.
+        fill_type: Way of filling albums with fewer tracks (see pad_sequences()).
+
+    Returns:
+        Tuple of the album tensor and song numbers of shape (albums, max_len), where filled tracks
+        are numbered with their position in the album (counting from 1).
+    """
+
+    order, offsets, album_ids = sort_album_tracks(df)
+    song_numbers = df[c.SONG_NUMBER].to_numpy()
+    values = df[feature_cols].to_numpy(dtype=np.float32)[order]
+    features, mask, gather = pad_sequences(values, offsets, max_len, fill_type)
+
+    positions = np.broadcast_to(np.arange(1, max_len + 1), mask.shape)
+    album_song_numbers = np.where(mask, song_numbers[order][gather], positions)
+
+    tensor = AlbumTensor(
+        album_ids=album_ids,
+        features=features,
+        mask=mask,
+        feature_names=list(feature_cols),
+    )
+    return tensor, album_song_numbers
@@ -0,0 +1,175 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from data_processing.feature.album_tensor import AlbumTensor, pad_sequences, sort_album_tracks, ZERO
+
+
+@dataclass
+class RaggedTrackFeatures:
+    """
+    Variable-length tracks features of albums stored without padding: features of all tracks
+    in one contiguous array and offsets of each album in it. Tracks of album `i` are
+    `values[offsets[i]:offsets[i + 1]]`.
+
+    Attributes:
+        album_ids: Album ids of shape (albums,).
+        values: Float32 features of all tracks of shape (tracks, features), ordered album by album.
+        offsets: Offsets of albums in values of shape (albums + 1,).
+        feature_names: Names of features in values columns.
+    """
+
+    album_ids: np.ndarray
+    values: np.ndarray
+    offsets: np.ndarray
+    feature_names: list[str]
+
+    def __len__(self) -> int:
+        return len(self.album_ids)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Returns: Number of tracks of each album."""
+
+        return np.diff(self.offsets)
+
+    def album(self, i: int) -> np.ndarray:
+        """Returns: Features of tracks of i-th album of shape (tracks, features)."""
+
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, feature_cols: list[str]) -> 'RaggedTrackFeatures':
+        """
+        Build ragged features from dataframe with one row per track.
+
+        Args:
+            df: Dataframe with c.ALBUM_ID, c.SONG_NUMBER and feature columns.
+            feature_cols: Feature columns to store.
+
+        Returns:
+            Ragged features with albums ordered by id and tracks by song number.
+        """
+
+        order, offsets, album_ids = sort_album_tracks(df)
+        values = np.ascontiguousarray(df[feature_cols].to_numpy(dtype=np.float32)[order])
+        return cls(album_ids=album_ids, values=values, offsets=offsets, feature_names=list(feature_cols))
+
+    def packed_batch(self, indices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get features of given albums packed one after another, without padding.
+
+        Args:
+            indices: Indices of albums in the batch.
+
+        Returns:
+            Tuple of packed features of shape (batch tracks, features) and number of tracks of each album.
+        """
+
+        lengths = self.lengths[indices]
+        starts = self.offsets[:-1][indices]
+        # Row i of the batch is the (i - batch offset)-th track of its album.
+        batch_offsets = np.concatenate([[0], np.cumsum(lengths)])
+        rows = np.repeat(starts - batch_offsets[:-1], lengths) + np.arange(batch_offsets[-1])
+        return self.values[rows], lengths
+
+    def padded_batch(
+            self,
+            indices: np.ndarray,
+            max_len: Optional[int] = None,
+            fill_type: str = ZERO
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get features of given albums padded to the same number of tracks.
+
+        Args:
+            indices: Indices of albums in the batch.
+            max_len: Number of tracks in output, the longest album in the batch if None.
+            fill_type: Way of filling shorter albums (see pad_sequences()).
+
+        Returns:
+            Tuple of padded features of shape (batch, max_len, features) and mask of real tracks.
+        """
+
+        values, lengths = self.packed_batch(indices)
+        max_len = int(lengths.max(initial=0)) if max_len is None else max_len
+        features, mask, _ = pad_sequences(values, np.concatenate([[0], np.cumsum(lengths)]), max_len, fill_type)
+        return features, mask
+
+    def iter_batches(
+            self,
+            batch_size: int,
+            padded: bool = True,
+            shuffle: bool = False,
+            seed: Optional[int] = None,
+            **pad_kwargs
+    ) -> Iterator[tuple[np.ndarray, tuple[np.ndarray, np.ndarray]]]:
+        """
+        Iterate over albums in batches.
+
+        Args:
+            batch_size: Number of albums in batch.
+            padded: If true, padded batches are returned (see padded_batch()), otherwise packed ones.
+            shuffle: Whether to shuffle albums.
+            seed: Seed of shuffling.
+            **pad_kwargs: Arguments of padded_batch().
+
+        Returns:
+            Iterator of album indices and batch.
+        """
+
+        indices = np.random.default_rng(seed).permutation(len(self)) if shuffle else np.arange(len(self))
+        for start in range(0, len(indices), batch_size):
+            batch_indices = indices[start:start + batch_size]
+            if padded:
+                yield batch_indices, self.padded_batch(batch_indices, **pad_kwargs)
+            else:
+                yield batch_indices, self.packed_batch(batch_indices)
+
+    def to_tensor(self, max_len: int, fill_type: str = ZERO) -> AlbumTensor:
+        """Returns: Dense album tensor of all albums padded or cut to max_len tracks."""
+
+        features, mask, _ = pad_sequences(self.values, self.offsets, max_len, fill_type)
+        return AlbumTensor(album_ids=self.album_ids, features=features, mask=mask, feature_names=self.feature_names)
+
+    def save(self, path: str):
+        """
+        Save features as directory of .npy files, which can be memory-mapped on load.
+
+        Args:
+            path: Output directory.
+        """
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'album_ids.npy'), self.album_ids.astype(str))
+        np.save(os.path.join(path, 'values.npy'), self.values)
+        np.save(os.path.join(path, 'offsets.npy'), self.offsets)
+        with open(os.path.join(path, 'feature_names.json'), 'w') as json_file:
+            json.dump(self.feature_names, json_file)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = 'r') -> 'RaggedTrackFeatures':
+        """
+        Load features saved with save().
+
+        Args:
+            path: Directory with saved features.
+            mmap_mode: Memory-map mode of values array (see np.load), None to load into memory.
+
+        Returns:
+            Loaded features.
+        """
+
+        with open(os.path.join(path, 'feature_names.json'), 'r') as json_file:
+            feature_names = json.load(json_file)
+
+        return cls(
+            album_ids=np.load(os.path.join(path, 'album_ids.npy')),
+            values=np.load(os.path.join(path, 'values.npy'), mmap_mode=mmap_mode),
+            offsets=np.load(os.path.join(path, 'offsets.npy')),
+            feature_names=feature_names,
+        )
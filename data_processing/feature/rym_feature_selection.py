@@ -1,7 +1,13 @@
+import numpy as np
 import pandas as pd
 
+from typing import Optional
+
 from shared_utils import columns as c
-from shared_utils.utils import PROJECT_DIR
+from shared_utils import metrics, schemas, storage
+from shared_utils.storage import dataset_path
+from shared_utils.streaming_stats import compute_stats, equal_frequency_bins
+from shared_utils.utils import PROJECT_DIR, RATING_BINS, RATING_DECIMALS
 
 
 class RymFeatureSelection:
@@ -14,29 +20,74 @@ class RymFeatureSelection:
             self,
             rym_processed_path: str,
             spotify_search_processed_path: str,
-            rym_rating_output_path: str,
+            rym_rating_output_path: Optional[str] = None,
+            years: Optional[storage.Years] = None,
+            rating_bins: Optional[list[float]] = None,
     ):
         """
         Args:
-            rym_processed_path: Input file for RYM features.
-            spotify_search_processed_path: Input file to match album_ids
-            rym_rating_output_path: Output path.
+            rym_processed_path: Input file or dataset for RYM features.
+            spotify_search_processed_path: Input file or dataset to match album_ids
+            rym_rating_output_path: Output path (CSV file or year-partitioned dataset). If None, features
+                are only selected in memory with run().
+            years: Range of release years to read from partitioned inputs, all if None.
+            rating_bins: Sorted edges of rating classes (see fit_rating_bins()), RATING_BINS if None.
         """
 
         self.output_path = rym_rating_output_path
+        self.rating_bins = RATING_BINS if rating_bins is None else rating_bins
         self._df_features = pd.merge(
-            pd.read_csv(rym_processed_path),
-            pd.read_csv(spotify_search_processed_path),
+            storage.read_frame(rym_processed_path, schemas.RYM_PROCESSED_SCHEMA, years=years),
+            storage.read_frame(spotify_search_processed_path, schemas.SPOTIFY_ALBUM_PROCESSED_SCHEMA, years=years),
             on=[c.ARTIST, c.ALBUM],
             how='inner'
         )
+        self.release_years = storage.release_years(self._df_features)
+
+    @staticmethod
+    def fit_rating_bins(
+            rym_processed_path: str,
+            years: Optional[storage.Years] = None,
+            n_classes: int = len(RATING_BINS) + 1
+    ) -> list[float]:
+        """
+        Compute edges of rating classes with equal number of albums in one pass over
+        partitions (or chunks) of processed rym data.
+
+        Args:
+            rym_processed_path: Input file or dataset for RYM features.
+            years: Range of release years to read from partitioned input, all if None.
+            n_classes: Number of rating classes.
+
+        Returns:
+            Sorted list of n_classes - 1 edges.
+        """
+
+        frames = storage.iter_frames(rym_processed_path, schemas.RYM_PROCESSED_SCHEMA, columns=[c.RATING], years=years)
+        stats = compute_stats((_round_ratings(df) for df in frames), [c.RATING])
+        return equal_frequency_bins(stats.sketches[c.RATING], n_classes, decimals=RATING_DECIMALS)
+
+    def run(self) -> pd.DataFrame:
+        """Returns: Selected and transformed features (cast to schema), without saving them."""
 
-    def run_and_save(self):
         df = self._df_features.copy()
         df = self._select_features(df)
         df = self._transform_features(df)
+        metrics.add_rows(rows_in=len(self._df_features), rows_out=len(df))
+
+        return schemas.apply_schema(df, schemas.RYM_FEATURE_SCHEMA, schemas.GENRE_DTYPE)
+
+    def run_and_save(self):
+        self.save(self.run())
 
-        self._save(df)
+    def save(self, df: pd.DataFrame, output_path: Optional[str] = None):
+        """Save output of run() to given output path (output path of this selection if None)."""
+
+        output_path = self.output_path if output_path is None else output_path
+        assert output_path is not None, 'Output path is not set.'
+
+        storage.write_frame(df, output_path, schemas.RYM_FEATURE_SCHEMA, self.release_years,
+                            default_dtype=schemas.GENRE_DTYPE)
 
     @staticmethod
     def _select_features(df: pd.DataFrame) -> pd.DataFrame:
@@ -65,42 +116,36 @@ class RymFeatureSelection:
 
     @staticmethod
     def _transform_genres(df):
-        genres = df[c.GENRES].str.get_dummies(sep=',')
+        genres = df[c.GENRES].str.get_dummies(sep=',').astype(schemas.GENRE_DTYPE)
         df[genres.columns] = genres
 
         df.drop(c.GENRES, inplace=True, axis=1)
 
-    @staticmethod
-    def _transform_target(df):
-        # Based on notebook 01_analysis_rym.
-        range0 = 2.77
-        range1 = 3.17
-        range2 = 3.35
-        range3 = 3.52
-        range4 = 3.73
+    def _transform_target(self, df):
+        # Rating equal to an edge belongs to the upper class.
+        df[c.RATING] = np.searchsorted(self.rating_bins, _round_ratings(df)[c.RATING].to_numpy(), side='right')
 
-        df.loc[df[c.RATING].between(0., range0), c.RATING_CLASS] = 0
-        df.loc[df[c.RATING].between(range0, range1), c.RATING_CLASS] = 1
-        df.loc[df[c.RATING].between(range1, range2), c.RATING_CLASS] = 2
-        df.loc[df[c.RATING].between(range2, range3), c.RATING_CLASS] = 3
-        df.loc[df[c.RATING].between(range3, range4), c.RATING_CLASS] = 4
-        df.loc[df[c.RATING].between(range4, 5.0), c.RATING_CLASS] = 5
-        df[c.RATING] = df[c.RATING_CLASS]
 
-        df.drop(c.RATING_CLASS, inplace=True, axis=1)
+def _round_ratings(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns: Dataframe with ratings as float64 rounded to RATING_DECIMALS, so ratings equal to edges of rating
+        classes are compared as equal (also ratings saved as float32 before).
+    """
 
-    def _save(self, df: pd.DataFrame):
-        df.to_csv(self.output_path, index=False)
+    df[c.RATING] = df[c.RATING].to_numpy(dtype=np.float64).round(RATING_DECIMALS)
+    return df
 
 
 if __name__ == "__main__":
     START_YEAR = 1965
     END_YEAR = 2022
+    YEARS = (START_YEAR, END_YEAR)
 
     feature_selector = RymFeatureSelection(
-        rym_processed_path=f'{PROJECT_DIR}/data/processed/rym/rym_charts_{START_YEAR}_{END_YEAR}.csv',
-        spotify_search_processed_path=f'{PROJECT_DIR}/data/processed/spotify/spotify_search_album_id_{START_YEAR}_{END_YEAR}.csv',
-        rym_rating_output_path=f'{PROJECT_DIR}/data/feature/rym_{START_YEAR}_{END_YEAR}.csv'
+        rym_processed_path=dataset_path(f'{PROJECT_DIR}/data/processed/rym/rym_charts', YEARS),
+        spotify_search_processed_path=dataset_path(f'{PROJECT_DIR}/data/processed/spotify/spotify_search_album_id', YEARS),
+        rym_rating_output_path=dataset_path(f'{PROJECT_DIR}/data/feature/rym', YEARS),
+        years=YEARS
     )
 
     feature_selector.run_and_save()
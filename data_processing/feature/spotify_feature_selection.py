@@ -1,10 +1,17 @@
 import numpy as np
 import pandas as pd
-from tqdm import tqdm
 
+from typing import Optional
+
+from data_processing.feature.album_tensor import AlbumTensor, build_album_tensor, REPEAT
+from data_processing.feature.ragged_track_features import RaggedTrackFeatures
 from shared_utils import columns as c
-from shared_utils.utils import PROJECT_DIR, MAX_KEY, MIN_LOUDNESS, MAX_SPEECHINESS, MIN_TEMPO, MAX_TEMPO, \
-    MIN_DURATION_MS, MAX_DURATION_MS
+from shared_utils import metrics, schemas, storage
+from shared_utils.feature_transformer import SpotifyFeatureTransformer, Bounds, SPOTIFY_FEATURE_BOUNDS
+from shared_utils.paths import album_tensor_path, ragged_features_path, transformer_path
+from shared_utils.storage import dataset_path, load_release_years
+from shared_utils.streaming_stats import compute_stats, quantile_bounds
+from shared_utils.utils import PROJECT_DIR
 
 
 class SpotifyFeatureSelection:
@@ -16,175 +23,162 @@ class SpotifyFeatureSelection:
     def __init__(
             self,
             spotify_features_processed_path: str,
-            spotify_output_path: str,
+            spotify_output_path: Optional[str] = None,
+            years: Optional[storage.Years] = None,
+            release_years: Optional[pd.Series] = None,
+            max_len: int = 16,
+            fill_type: str = REPEAT,
+            bounds: Optional[Bounds] = None,
     ):
         """
         Args:
-            spotify_features_processed_path: Input file for Spotify features.
-            spotify_output_path: Output path.
+            spotify_features_processed_path: Input file or dataset for Spotify features.
+            spotify_output_path: Output path (CSV file or year-partitioned dataset). Album tensor, ragged
+                (not padded) features and fitted feature transformer are saved next to it. If None,
+                features are only selected in memory with run().
+            years: Range of release years to read from partitioned input, all if None.
+            release_years: Release years indexed by album id, used to partition output.
+            max_len: Number of tracks of each album in output.
+            fill_type: Way of filling albums with fewer tracks - 'repeat' or 'mean'.
+            bounds: Raw bounds of features scaled to [0, 1] (see fit_bounds()), SPOTIFY_FEATURE_BOUNDS if None.
         """
 
         self.output_path = spotify_output_path
-        self._df_features = pd.read_csv(spotify_features_processed_path)
-
-    def run_and_save(self):
-        df = self._df_features.copy()
-        df = self._select_features(df)
-        df = self._transform_features(df)
-        df = self._set_to_max_length(df, 16)
-
-        self._save(df)
+        self.tensor_path = album_tensor_path(spotify_output_path) if spotify_output_path is not None else None
+        self.ragged_path = ragged_features_path(spotify_output_path) if spotify_output_path is not None else None
+        self.transformer_path = transformer_path(spotify_output_path) if spotify_output_path is not None else None
+        self.transformer: Optional[SpotifyFeatureTransformer] = None
+        self._max_len = max_len
+        self._fill_type = fill_type
+        self._bounds = bounds
+        self._release_years = release_years
+        self._df_features = storage.read_frame(
+            spotify_features_processed_path, schemas.SPOTIFY_TRACKS_PROCESSED_SCHEMA, years=years)
 
     @staticmethod
-    def _select_features(df: pd.DataFrame) -> pd.DataFrame:
-        """Returns: Dataframe with features, ALBUM_ID columns."""
-
-        return df[[c.ALBUM_ID, c.SONG_NUMBER] + c.SPOTIFY_CORE_FEATURES]
-
-    def _transform_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Transform every feature if is in the selected columns."""
-
-        if c.DANCEABILITY in df.columns:
-            self._transform_danceability(df)
-
-        if c.ENERGY in df.columns:
-            self._transform_energy(df)
-
-        if c.KEY in df.columns:
-            self._transform_key(df)
-
-        if c.LOUDNESS in df.columns:
-            self._transform_loudness(df)
-
-        if c.MODE in df.columns:
-            self._transform_mode(df)
-
-        if c.SPEECHINESS in df.columns:
-            self._transform_speechiness(df)
-
-        if c.ACOUSTICNESS in df.columns:
-            self._transform_acousticness(df)
-
-        if c.INSTRUMENTALNESS in df.columns:
-            self._transform_instrumentalness(df)
-
-        if c.LIVENESS in df.columns:
-            self._transform_liveness(df)
-
-        if c.VALENCE in df.columns:
-            self._transform_valence(df)
-
-        if c.TEMPO in df.columns:
-            self._transform_tempo(df)
-
-        if c.DURATION_MS in df.columns:
-            self._transform_duration_ms(df)
+    def fit_bounds(
+            spotify_features_processed_path: str,
+            years: Optional[storage.Years] = None,
+            lower_q: float = 0.001,
+            upper_q: float = 0.999
+    ) -> Bounds:
+        """
+        Compute bounds of scaled features from their quantiles in one pass over partitions
+        (or chunks) of processed Spotify features.
 
-        if c.TIME_SIGNATURE in df.columns:
-            self._transform_time_signature(df)
+        Args:
+            spotify_features_processed_path: Input file or dataset for Spotify features.
+            years: Range of release years to read from partitioned input, all if None.
+            lower_q: Quantile of lower bounds.
+            upper_q: Quantile of upper bounds.
 
-        df[c.SPOTIFY_CORE_FEATURES] = df[c.SPOTIFY_CORE_FEATURES].round(4)
+        Returns:
+            Bounds of features from SPOTIFY_FEATURE_BOUNDS.
+        """
 
-        return df
+        columns = list(SPOTIFY_FEATURE_BOUNDS)
+        frames = storage.iter_frames(
+            spotify_features_processed_path, schemas.SPOTIFY_TRACKS_PROCESSED_SCHEMA, columns=columns, years=years)
+        return quantile_bounds(compute_stats(frames, columns), columns, lower_q, upper_q)
 
-    @staticmethod
-    def _transform_danceability(df):
-        """Danceability for now doesn't need to be transformed."""
-        pass
+    def run(self) -> tuple[pd.DataFrame, AlbumTensor, RaggedTrackFeatures]:
+        """
+        Select, transform and pad features in memory, without saving them.
 
-    @staticmethod
-    def _transform_energy(df):
-        """Energy for now doesn't need to be transformed."""
-        pass
+        Returns:
+            Tuple of padded features (one row per track, cast to schema), the same features
+            as album tensor, and transformed features without padding.
+        """
 
-    @staticmethod
-    def _transform_key(df):
-        df[c.KEY] /= MAX_KEY
+        df = self._df_features.copy()
+        df = self._select_features(df)
+        df = self._transform_features(df)
+        ragged = RaggedTrackFeatures.from_frame(df, c.SPOTIFY_CORE_FEATURES)
+        tensor, df = self._set_to_max_length(df, self._max_len, self._fill_type)
+        metrics.add_rows(rows_in=len(self._df_features), rows_out=len(df))
 
-    @staticmethod
-    def _transform_loudness(df):
-        min_lin_loudness = 10 ** (MIN_LOUDNESS / 20)
-        df[c.LOUDNESS] = 10 ** (df[c.LOUDNESS] / 20)
-        df[c.LOUDNESS] = (df[c.LOUDNESS] - min_lin_loudness) / (1 - min_lin_loudness)
+        return schemas.apply_schema(df, schemas.SPOTIFY_FEATURE_SCHEMA), tensor, ragged
 
-    @staticmethod
-    def _transform_mode(df):
-        """Mode for now doesn't need to be transformed."""
-        pass
+    def run_and_save(self):
+        self.save(*self.run())
 
-    @staticmethod
-    def _transform_speechiness(df):
-        df[c.SPEECHINESS] /= MAX_SPEECHINESS
+    def save(
+            self,
+            df: pd.DataFrame,
+            tensor: AlbumTensor,
+            ragged: RaggedTrackFeatures,
+            output_path: Optional[str] = None
+    ):
+        """
+        Save outputs of run() and fitted transformer.
 
-    @staticmethod
-    def _transform_acousticness(df):
-        """Acousticness for now doesn't need to be transformed."""
-        pass
+        Args:
+            df: Padded features.
+            tensor: Album tensor.
+            ragged: Features without padding.
+            output_path: Output path (tensor, ragged features and transformer are saved next to it),
+                output path of this selection if None.
+        """
 
-    @staticmethod
-    def _transform_instrumentalness(df):
-        """Instrumentalness for now doesn't need to be transformed."""
-        pass
+        output_path = self.output_path if output_path is None else output_path
+        assert output_path is not None, 'Output path is not set.'
 
-    @staticmethod
-    def _transform_liveness(df):
-        """Liveness for now doesn't need to be transformed."""
-        pass
+        storage.write_frame(df, output_path, schemas.SPOTIFY_FEATURE_SCHEMA, self._release_years)
+        tensor.save(album_tensor_path(output_path))
+        ragged.save(ragged_features_path(output_path))
+        self.transformer.save(transformer_path(output_path))
 
     @staticmethod
-    def _transform_valence(df):
-        """Valence for now doesn't need to be transformed."""
-        pass
+    def _select_features(df: pd.DataFrame) -> pd.DataFrame:
+        """Returns: Dataframe with features, ALBUM_ID columns."""
 
-    @staticmethod
-    def _transform_tempo(df):
-        df[c.TEMPO] = (df[c.TEMPO] - MIN_TEMPO) / (MAX_TEMPO - MIN_TEMPO)
+        return df[[c.ALBUM_ID, c.SONG_NUMBER] + c.SPOTIFY_CORE_FEATURES]
 
-    @staticmethod
-    def _transform_duration_ms(df):
-        df[c.DURATION_MS] = (df[c.DURATION_MS] - MIN_DURATION_MS) / (MAX_DURATION_MS - MIN_DURATION_MS)
+    def _transform_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Transform selected features with the transformer saved next to the output."""
 
-    @staticmethod
-    def _transform_time_signature(df):
-        df[c.TIME_SIGNATURE] = np.where(df[c.TIME_SIGNATURE] == 4, 1., 0.)
+        feature_cols = [col for col in c.SPOTIFY_CORE_FEATURES if col in df.columns]
+        self.transformer = SpotifyFeatureTransformer.from_bounds(feature_cols, self._bounds)
+        return self.transformer.transform_frame(df)
 
     @staticmethod
-    def _set_to_max_length(df: pd.DataFrame, max_len: int, fill_type: str = 'repeat'):
-        track_counts = df[c.ALBUM_ID].value_counts()
-        track_counts = track_counts[track_counts != 16]
-
-        albums = df.groupby(c.ALBUM_ID).apply(np.array)
-
-        filled_rows = []
-        for album_id, count in track_counts.items():
-            missing_records_count = max_len - count
-            features = albums[album_id][:, 1:]
+    def _set_to_max_length(
+            df: pd.DataFrame,
+            max_len: int,
+            fill_type: str = REPEAT
+    ) -> tuple[AlbumTensor, pd.DataFrame]:
+        """
+        Pad or cut tracks of each album to max_len tracks.
 
-            if fill_type == 'mean':
-                features = features.mean(axis=0)
-                album_data = [(album_id, count + i + 1, *features[1:]) for i in range(missing_records_count)]
-                filled_rows.extend(album_data)
-            elif fill_type == 'repeat':
-                features = features[features[:, 0].argsort()][:, 1:]
-                album_data = [(album_id, count + i + 1, *features[i % count]) for i in range(missing_records_count)]
-                filled_rows.extend(album_data)
+        Returns:
+            Tuple of album tensor and the same data in long format (one row per track, ordered by album),
+            where filled tracks are numbered after the album's real ones.
+        """
 
-        filled_df = pd.DataFrame(filled_rows, columns=df.columns)
-        df = pd.concat([df, filled_df], ignore_index=True)
+        feature_cols = df.columns.drop([c.ALBUM_ID, c.SONG_NUMBER]).tolist()
+        tensor, song_numbers = build_album_tensor(df, feature_cols, max_len, fill_type)
 
-        return df
+        df_long = pd.DataFrame(tensor.features.reshape(-1, len(feature_cols)), columns=feature_cols)
+        df_long.insert(0, c.ALBUM_ID, np.repeat(tensor.album_ids, max_len))
+        df_long.insert(1, c.SONG_NUMBER, song_numbers.ravel())
 
-    def _save(self, df: pd.DataFrame):
-        df.sort_values(by=[c.ALBUM_ID, c.SONG_NUMBER]).to_csv(self.output_path, index=False)
+        return tensor, df_long
 
 
 if __name__ == "__main__":
     START_YEAR = 1965
     END_YEAR = 2022
+    YEARS = (START_YEAR, END_YEAR)
 
     feature_selector = SpotifyFeatureSelection(
-        spotify_features_processed_path=f'{PROJECT_DIR}/data/processed/spotify/spotify_tracks_feature_{START_YEAR}_{END_YEAR}.csv',
-        spotify_output_path=f'{PROJECT_DIR}/data/feature/spotify_{START_YEAR}_{END_YEAR}.csv'
+        spotify_features_processed_path=dataset_path(f'{PROJECT_DIR}/data/processed/spotify/spotify_tracks_feature', YEARS),
+        spotify_output_path=dataset_path(f'{PROJECT_DIR}/data/feature/spotify', YEARS),
+        years=YEARS,
+        release_years=load_release_years(
+            dataset_path(f'{PROJECT_DIR}/data/processed/rym/rym_charts', YEARS),
+            dataset_path(f'{PROJECT_DIR}/data/processed/spotify/spotify_search_album_id', YEARS),
+            YEARS
+        )
     )
 
     feature_selector.run_and_save()
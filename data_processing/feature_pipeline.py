@@ -0,0 +1,292 @@
+import os
+import pandas as pd
+
+from typing import Optional
+
+from data_processing.feature.album_tensor import AlbumTensor, REPEAT
+from data_processing.feature.ragged_track_features import RaggedTrackFeatures
+from data_processing.feature.rym_feature_selection import RymFeatureSelection
+from data_processing.feature.spotify_feature_selection import SpotifyFeatureSelection
+from data_processing.postprocessing.aggregation import AGG_STATS, aggregate_segments
+from data_processing.postprocessing.feature_matrix import FeatureMatrix, load_feature_matrix
+from data_processing.postprocessing.finalize_data_processing import GroupedFeatures, AGG_FLATTEN, group_features, \
+    build_variant
+from shared_utils import schemas, storage, utils
+from shared_utils.build_cache import BuildCache
+from shared_utils.feature_transformer import Bounds, SpotifyFeatureTransformer
+from shared_utils.paths import album_tensor_path, ragged_features_path
+from shared_utils.storage import dataset_path
+from shared_utils.utils import PROJECT_DIR
+
+SPOTIFY = 'spotify'
+RYM = 'rym'
+INTERMEDIATES = [SPOTIFY, RYM]
+"""Named intermediate outputs of the pipeline, which can be saved with FeaturePipeline.cache()."""
+
+_SPOTIFY_CODE = [SpotifyFeatureSelection, AlbumTensor, RaggedTrackFeatures, SpotifyFeatureTransformer, schemas, utils]
+_RYM_CODE = [RymFeatureSelection, schemas, utils]
+_FINALIZE_CODE = [build_variant, aggregate_segments, FeatureMatrix]
+"""Code of each step, hashed into build cache keys of its outputs."""
+
+
+class FeaturePipeline:
+    """
+    Lazy pipeline of Spotify and RYM feature selection and finalization of final dataset.
+    Nothing is read until a dataset (or an intermediate) is requested, then each step runs once
+    in memory and passes its output to the next one - intermediate outputs are saved only if asked
+    with cache().
+
+    With build cache, outputs of each step are stored under the key of its inputs, code and parameters,
+    so only steps whose inputs changed are run again, and an unchanged final dataset is just loaded.
+
+    Examples:
+    ---------
+    >>> pipeline = FeaturePipeline(rym_processed_path, spotify_search_path, spotify_features_path, YEARS)
+    >>> pipeline.cache(RYM, dataset_path(f'{PROJECT_DIR}/data/feature/rym', YEARS))
+    >>> dataset = pipeline.build(AGG_FLATTEN)
+
+    >>> pipeline = FeaturePipeline(..., build_cache=BuildCache(f'{PROJECT_DIR}/data/cache'))
+    >>> dataset = pipeline.build(AGG_FLATTEN)  # loaded from cache if nothing changed
+    """
+
+    def __init__(
+            self,
+            rym_processed_path: str,
+            spotify_search_processed_path: str,
+            spotify_features_processed_path: str,
+            years: Optional[storage.Years] = None,
+            max_len: int = 16,
+            fill_type: str = REPEAT,
+            bounds: Optional[Bounds] = None,
+            rating_bins: Optional[list[float]] = None,
+            build_cache: Optional[BuildCache] = None
+    ):
+        """
+        Args:
+            rym_processed_path: Input file or dataset with processed RYM data.
+            spotify_search_processed_path: Input file or dataset with processed Spotify search results.
+            spotify_features_processed_path: Input file or dataset with processed Spotify tracks features.
+            years: Range of release years to read from partitioned inputs, all if None.
+            max_len: Number of tracks of each album (see SpotifyFeatureSelection).
+            fill_type: Way of filling albums with fewer tracks (see SpotifyFeatureSelection).
+            bounds: Raw bounds of scaled Spotify features (see SpotifyFeatureSelection).
+            rating_bins: Edges of rating classes (see RymFeatureSelection).
+            build_cache: Cache of steps outputs, steps are always run if None.
+        """
+
+        self._rym_processed_path = rym_processed_path
+        self._spotify_search_processed_path = spotify_search_processed_path
+        self._spotify_features_processed_path = spotify_features_processed_path
+        self._years = years
+        self._max_len = max_len
+        self._fill_type = fill_type
+        self._bounds = bounds
+        self._rating_bins = rating_bins
+        self._build_cache = build_cache
+
+        self._keys: dict[str, str] = {}
+        self._cache_paths: dict[str, str] = {}
+        self._rym_selector: Optional[RymFeatureSelection] = None
+        self._spotify: Optional[tuple[pd.DataFrame, AlbumTensor, RaggedTrackFeatures]] = None
+        self._rym: Optional[pd.DataFrame] = None
+        self._grouped: Optional[GroupedFeatures] = None
+
+    def cache(self, name: str, path: str) -> 'FeaturePipeline':
+        """
+        Save intermediate output to given path when it is computed, the same way as its stage does
+        with run_and_save() (e.g. to inspect it or to reuse it in other scripts). Intermediates loaded
+        from build cache are not computed, so they are not saved again - use cache_entry() to locate them.
+
+        Args:
+            name: Name of intermediate, one of INTERMEDIATES.
+            path: Output path of intermediate (CSV file or year-partitioned dataset).
+
+        Returns:
+            This pipeline.
+        """
+
+        assert name in INTERMEDIATES, f'Unknown intermediate {name}, expected one of: {INTERMEDIATES}.'
+        assert self._grouped is None, 'Intermediates are already computed.'
+
+        self._cache_paths[name] = path
+        return self
+
+    def spotify_features(self) -> tuple[pd.DataFrame, AlbumTensor, RaggedTrackFeatures]:
+        """
+        Returns: Selected Spotify features (see SpotifyFeatureSelection.run()), computed once.
+        """
+
+        if self._spotify is not None:
+            return self._spotify
+
+        entry = self.cache_entry(SPOTIFY)
+        if entry is not None:
+            path = os.path.join(entry, SPOTIFY)
+            self._spotify = (
+                storage.read_frame(path, schemas.SPOTIFY_FEATURE_SCHEMA),
+                AlbumTensor.load(album_tensor_path(path)),
+                RaggedTrackFeatures.load(ragged_features_path(path)),
+            )
+            return self._spotify
+
+        output_path = self._cache_paths.get(SPOTIFY)
+        selector = SpotifyFeatureSelection(
+            self._spotify_features_processed_path,
+            output_path,
+            years=self._years,
+            # Release years are needed only to partition saved output.
+            release_years=self._get_rym_selector().release_years if output_path is not None else None,
+            max_len=self._max_len,
+            fill_type=self._fill_type,
+            bounds=self._bounds,
+        )
+        self._spotify = selector.run()
+        if output_path is not None:
+            selector.save(*self._spotify)
+        if self._build_cache is not None:
+            with self._build_cache.build(SPOTIFY, self._key(SPOTIFY)) as entry:
+                selector.save(*self._spotify, output_path=os.path.join(entry, SPOTIFY))
+        return self._spotify
+
+    def rym_features(self) -> pd.DataFrame:
+        """
+        Returns: Selected RYM features (see RymFeatureSelection.run()), computed once.
+        """
+
+        if self._rym is not None:
+            return self._rym
+
+        entry = self.cache_entry(RYM)
+        if entry is not None:
+            self._rym = storage.read_frame(os.path.join(entry, RYM), schemas.RYM_FEATURE_SCHEMA, schemas.GENRE_DTYPE)
+            return self._rym
+
+        selector = self._get_rym_selector()
+        self._rym = selector.run()
+        if selector.output_path is not None:
+            selector.save(self._rym)
+        if self._build_cache is not None:
+            with self._build_cache.build(RYM, self._key(RYM)) as entry:
+                selector.save(self._rym, os.path.join(entry, RYM))
+        return self._rym
+
+    def group_features(self) -> GroupedFeatures:
+        """
+        Returns: Features grouped by album (see group_features()), shared by all built variants.
+        """
+
+        if self._grouped is None:
+            df_spotify, tensor, _ = self.spotify_features()
+            self._grouped = group_features(self.rym_features(), df_spotify, tensor)
+
+            # Grouped features hold copies of all needed data, so selected frames can be freed.
+            self._spotify, self._rym, self._rym_selector = None, None, None
+        return self._grouped
+
+    def build(self, variant: str, stats: list[str] = AGG_STATS) -> FeatureMatrix:
+        """
+        Build variant of final dataset in memory (or load it from build cache).
+
+        Args:
+            variant: Variant of final dataset (see finalize_data_processing.VARIANTS).
+            stats: Statistics of agg_flatten variant (see aggregate_segments()).
+
+        Returns:
+            Final dataset.
+        """
+
+        if self._build_cache is None:
+            return build_variant(self.group_features(), variant, stats)
+        return load_feature_matrix(self.build_path(variant, stats))
+
+    def build_path(self, variant: str, stats: list[str] = AGG_STATS) -> str:
+        """
+        Build variant of final dataset into build cache (unless it is cached already), so it can be
+        memory-mapped from there instead of held in memory.
+
+        Args:
+            variant: Variant of final dataset (see finalize_data_processing.VARIANTS).
+            stats: Statistics of agg_flatten variant (see aggregate_segments()).
+
+        Returns:
+            Directory of final dataset saved as .npy files (see load_feature_matrix()).
+        """
+
+        assert self._build_cache is not None, 'Final dataset is saved only to build cache.'
+
+        key = self._key(variant, stats)
+        entry = self._build_cache.get(variant, key)
+        if entry is not None:
+            return entry
+
+        dataset = build_variant(self.group_features(), variant, stats)
+        with self._build_cache.build(variant, key) as entry:
+            dataset.save(entry)
+        return self._build_cache.entry_path(variant, key)
+
+    def cache_entry(self, name: str) -> Optional[str]:
+        """
+        Returns: Build cache entry of intermediate (one of INTERMEDIATES) for current inputs, None if it
+            is not cached yet or pipeline has no build cache.
+        """
+
+        return self._build_cache.get(name, self._key(name)) if self._build_cache is not None else None
+
+    def _key(self, name: str, stats: list[str] = AGG_STATS) -> str:
+        """Returns: Build cache key of intermediate or final dataset variant (computed once per pipeline)."""
+
+        cache_name = name if name in INTERMEDIATES else f'{name}_{"_".join(stats)}'
+        if cache_name in self._keys:
+            return self._keys[cache_name]
+
+        if name == SPOTIFY:
+            key = self._build_cache.key(
+                [self._spotify_features_processed_path],
+                params={'max_len': self._max_len, 'fill_type': self._fill_type, 'bounds': self._bounds},
+                code=_SPOTIFY_CODE,
+                years=self._years,
+            )
+        elif name == RYM:
+            key = self._build_cache.key(
+                [self._rym_processed_path, self._spotify_search_processed_path],
+                params={'rating_bins': self._rating_bins},
+                code=_RYM_CODE,
+                years=self._years,
+            )
+        else:
+            key = self._build_cache.key(
+                params={'variant': name, 'stats': stats},
+                code=_FINALIZE_CODE,
+                dependencies=[self._key(SPOTIFY), self._key(RYM)],
+            )
+
+        self._keys[cache_name] = key
+        return key
+
+    def _get_rym_selector(self) -> RymFeatureSelection:
+        if self._rym_selector is None:
+            self._rym_selector = RymFeatureSelection(
+                self._rym_processed_path,
+                self._spotify_search_processed_path,
+                self._cache_paths.get(RYM),
+                years=self._years,
+                rating_bins=self._rating_bins,
+            )
+        return self._rym_selector
+
+
+if __name__ == "__main__":
+    START_YEAR = 1965
+    END_YEAR = 2022
+    YEARS = (START_YEAR, END_YEAR)
+
+    pipeline = FeaturePipeline(
+        rym_processed_path=dataset_path(f'{PROJECT_DIR}/data/processed/rym/rym_charts', YEARS),
+        spotify_search_processed_path=dataset_path(
+            f'{PROJECT_DIR}/data/processed/spotify/spotify_search_album_id', YEARS),
+        spotify_features_processed_path=dataset_path(
+            f'{PROJECT_DIR}/data/processed/spotify/spotify_tracks_feature', YEARS),
+        years=YEARS
+    )
+
+    pipeline.build(AGG_FLATTEN).save(f'{PROJECT_DIR}/data/final/{AGG_FLATTEN}')
@@ -12,6 +12,7 @@ from lyricsgenius import Genius
 from lyricsgenius.types import Album, Track
 
 from data_processing.fetch.genius_api.data_models.genius_album_lyrics_model import TrackModel, AlbumLyricsModel
+from shared_utils import metrics, schemas, storage, tracing
 from shared_utils.utils import create_logger
 
 
@@ -28,28 +29,48 @@ class GeniusDataFetcher:
     Class for fetching lyrics data from Genius API.
 
     Args:
-        spotify_search_album_data_path (str): Path to input CSV file with Spotify album data.
+        spotify_search_album_data_path (str): Path to input CSV file or dataset with Spotify album data.
         genius_stats_filepath (str): Path to output CSV file with statistics on fetched data.
         genius_lyrics_dir (str): Path to output directory for JSON files with fetched lyrics data.
+        years (Optional[Tuple[int, int]]): Range of release years to read from partitioned album data, all if None.
     """
 
     spotify_album_id_col = 'album_id'
     genius_stats_cols = [spotify_album_id_col, 'spotify_album', 'spotify_artist', 'number_of_fetched_lyrics']
     """Column names in output stats file."""
 
+    SEARCH_ENDPOINT = 'genius/search_album'
+    """Name of album search (with requests of its tracks) in metrics and traces."""
+
     def __init__(
             self,
             spotify_search_album_data_path: str,
             genius_stats_filepath: str,
             genius_lyrics_dir: str,
+            years: Optional[storage.Years] = None,
     ):
         self._logger = create_logger('GeniusLyricFetcher')
-        self._genius_api = Genius()
+        self._genius_api = self._create_genius_api()
         self._genius_stats_filepath = genius_stats_filepath
         self._genius_lyrics_dir = genius_lyrics_dir
         self._spotify_search_album_data_path = spotify_search_album_data_path
+        self._years = years
         self._prepare_input()
 
+    @staticmethod
+    def _create_genius_api() -> Genius:
+        """
+        Returns: Genius client. If GENIUS_BASE_URL env is set, requests are sent there instead of genius.com
+            (e.g. to local stand-in server, see benchmarks/api_stand_in.py).
+        """
+
+        genius_api = Genius()
+        if base_url := os.getenv('GENIUS_BASE_URL'):
+            base_url = base_url.rstrip('/')
+            genius_api.API_ROOT = genius_api.PUBLIC_API_ROOT = f'{base_url}/api/'
+            genius_api.WEB_ROOT = f'{base_url}/'
+        return genius_api
+
     def _prepare_input(self):
         """
         Prepares input data for fetching.
@@ -72,7 +93,8 @@ class GeniusDataFetcher:
             pd.DataFrame: DataFrame with Spotify album data.
         """
 
-        df_spotify_ids = pd.read_csv(self._spotify_search_album_data_path)
+        df_spotify_ids = storage.read_frame(
+            self._spotify_search_album_data_path, schemas.SPOTIFY_ALBUM_PROCESSED_SCHEMA, years=self._years)
         df_spotify_ids = df_spotify_ids[df_spotify_ids.notna()]
         df_spotify_ids = df_spotify_ids[df_spotify_ids['precision_match'] > 2]
         df_spotify_ids = df_spotify_ids.drop_duplicates(subset=[self.spotify_album_id_col])
@@ -84,7 +106,7 @@ class GeniusDataFetcher:
 
     def _prepare_tracks_id_to_fetch(self, df: pd.DataFrame) -> pd.DataFrame:
         if os.path.exists(self._genius_stats_filepath):
-            df_genius_stats = pd.read_csv(self._genius_stats_filepath)
+            df_genius_stats = schemas.read_csv(self._genius_stats_filepath, schemas.GENIUS_STATS_SCHEMA)
             assert (df_genius_stats.columns.values == self.genius_stats_cols).all(), 'Invalid data structure in output.'
 
             ids_already_fetched = df[self.spotify_album_id_col].isin(df_genius_stats[self.spotify_album_id_col])
@@ -97,14 +119,15 @@ class GeniusDataFetcher:
         # Parallel(n_jobs=10)(delayed(self._try_handle_album)(row) for _, row in self._df_albums.iterrows())
 
         for i, row in self._df_albums.iterrows():
+            metrics.add_rows(rows_in=1)
             self._try_handle_album(row)
 
     # @background
     @retry(stop=stop_after_attempt(5))
     def _try_handle_album(self, record: pd.Series):
         try:
-            self._genius_api = Genius()
-            self._handle_album(record)
+            self._genius_api = self._create_genius_api()
+            self._handle_album(record, self._try_handle_album.retry.statistics['attempt_number'])
         except Exception as e:
             # Retry 5 times and then continue.
             if (reattempt := self._try_handle_album.retry.statistics['attempt_number']) > 5:
@@ -113,10 +136,10 @@ class GeniusDataFetcher:
                 self._logger.error(f'Error occurred: {e}')
                 time.sleep(10)
                 self._logger.info(f'Trying to fetch lyrics again {reattempt}/5...')
-                self._genius_api = Genius()
+                self._genius_api = self._create_genius_api()
                 raise e
 
-    def _handle_album(self, record: pd.Series):
+    def _handle_album(self, record: pd.Series, attempt: int = 1):
         spotify_id = record[self.spotify_album_id_col]
 
         album_name = record['spotify_album']
@@ -135,19 +158,35 @@ class GeniusDataFetcher:
         }
 
         genius_album: Optional[Album]
-        if genius_album := self._genius_api.search_album(album_name, artist_name):
-            genius_model_tracks = self._prepare_track_list(genius_album)
+        if genius_album := self._search_album(album_name, artist_name, attempt):
+            with tracing.span(self.SEARCH_ENDPOINT, tracing.PARSE, attempt):
+                genius_model_tracks = self._prepare_track_list(genius_album)
+                album_model = AlbumLyricsModel(
+                    spotify_id=spotify_id,
+                    genius_id=genius_album.id,
+                    artist_name=artist_name,
+                    album_name=album_name,
+                    tracks=genius_model_tracks
+                )
             stats['number_of_fetched_lyrics'] = len(genius_model_tracks)
-            album_model = AlbumLyricsModel(
-                spotify_id=spotify_id,
-                genius_id=genius_album.id,
-                artist_name=artist_name,
-                album_name=album_name,
-                tracks=genius_model_tracks
-            )
             self._save_album(album_model, spotify_id)
         self._save_stats(stats)
 
+    def _search_album(self, album_name: str, artist_name: str, attempt: int = 1) -> Optional[Album]:
+        """Search album with its tracks in Genius API, trace the search and count it in metrics of running stage."""
+
+        with tracing.span(self.SEARCH_ENDPOINT, attempt=attempt) as span:
+            try:
+                genius_album = self._genius_api.search_album(album_name, artist_name)
+            except Exception as e:
+                # lyricsgenius raises HTTPError with status code as its first argument.
+                span.status = e.args[0] if e.args and isinstance(e.args[0], int) else None
+                metrics.record_request(self.SEARCH_ENDPOINT, span.status, attempt)
+                raise
+            span.status = 200
+        metrics.record_request(self.SEARCH_ENDPOINT, span.status, attempt)
+        return genius_album
+
     def _prepare_track_list(self, genius_album: Album) -> List[TrackModel]:
         track: Track
         genius_tracks: List[TrackModel] = []
@@ -171,13 +210,15 @@ class GeniusDataFetcher:
 
     def _save_album(self, album_model: AlbumLyricsModel, filename: str):
         if len(album_model.tracks) != 0:
+            metrics.add_rows(rows_out=1)
             album_lyrics_file = open(f'{self._genius_lyrics_dir}/{filename}.json', 'w', encoding='utf-8')
             json.dump(album_model.dict(), album_lyrics_file, default=str)
             album_lyrics_file.close()
 
     def _save_stats(self, stats: Dict):
         is_file_new = not os.path.exists(self._genius_stats_filepath)
-        pd.DataFrame([stats]).to_csv(self._genius_stats_filepath, mode='a', index=False, header=is_file_new)
+        schemas.to_csv(pd.DataFrame([stats]), self._genius_stats_filepath, schemas.GENIUS_STATS_SCHEMA,
+                       mode='a', header=is_file_new)
 
     @staticmethod
     def clean_lyrics(text: str):
@@ -4,6 +4,7 @@ import pandas as pd
 from typing import Optional
 from rymscraper.rymscraper import RymNetwork, RymUrl
 
+from shared_utils import metrics
 from shared_utils.columns import RYM_COLS
 from shared_utils.utils import create_logger
 
@@ -69,6 +70,7 @@ class RymFetcher:
             rym_url.language = self._language
 
         data = pd.DataFrame(self._get_chart_data(rym_url))[self.COLS]
+        metrics.add_rows(rows_out=len(data))
 
         is_file_new = RYM_COLS if not os.path.exists(self._filepath) else False
         data.to_csv(self._filepath, mode='a', header=is_file_new, index=False)
@@ -89,6 +91,7 @@ class RymFetcher:
             chart_data = self._network.get_chart_infos(url=rym_url, max_page=self.MAX_PAGE)
         except Exception as e:
             self._logger.info(f'Error while getting chart data: {e}. Retrying...')
+            metrics.count('chart_retries')
             self._network = RymNetwork()
             chart_data = self._network.get_chart_infos(url=rym_url, max_page=self.MAX_PAGE)
         return chart_data
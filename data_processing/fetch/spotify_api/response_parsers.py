@@ -0,0 +1,161 @@
+import json
+
+from dataclasses import dataclass
+from typing import Any
+
+import shared_utils.columns as c
+
+try:
+    import orjson
+except ImportError:
+    # Standard json is used instead (about 2-3x slower on Spotify responses).
+    orjson = None
+
+# Consts
+
+FEATURE_COLUMNS = [c.SONG_ID, *c.SPOTIFY_RAW_FEATURES]
+"""Columns parsed from audio features responses, in order of SPOTIFY_RAW_FEATURES_SCHEMA."""
+
+INT_FEATURES = {c.KEY, c.MODE, c.DURATION_MS, c.TIME_SIGNATURE}
+"""Features which have to be integers, other features may be any number."""
+
+TRACK_COLUMNS = [c.ALBUM_ID, c.SONG_ID, c.SONG_NAME, c.SONG_NUMBER, c.SONG_ARTISTS_NUMBER]
+"""Columns parsed from albums responses (c.SPOTIFY_TRACKS_IDS_COLS)."""
+
+_FEATURE_TYPES = {
+    col: {str} if col == c.SONG_ID else {int} if col in INT_FEATURES else {int, float} for col in FEATURE_COLUMNS
+}
+_TRACK_TYPES = {col: {int} if col in [c.SONG_NUMBER, c.SONG_ARTISTS_NUMBER] else {str} for col in TRACK_COLUMNS}
+"""Allowed types of values of each column (exact types - bool is a subclass of int, but not a valid value)."""
+
+
+class MalformedResponseError(ValueError):
+    """Response body is not valid JSON, or misses or has invalid type of a field which is read."""
+
+
+@dataclass(frozen=True, slots=True)
+class SearchItem:
+    """
+    Album found by Spotify search, with fields used for matching it to RYM album.
+
+    Attributes:
+        id: Spotify album id.
+        name: Album name.
+        artists: Names of album artists.
+    """
+
+    id: str
+    name: str
+    artists: tuple[str, ...]
+
+    def get_artists_name(self) -> list[str]:
+        return list(self.artists)
+
+
+# Functions
+
+def loads(content: bytes) -> Any:
+    """
+    Decode JSON response body with orjson (standard json if orjson is not installed).
+
+    Raises:
+        MalformedResponseError: If body is not valid JSON.
+    """
+
+    try:
+        return orjson.loads(content) if orjson is not None else json.loads(content)
+    except ValueError as e:
+        raise MalformedResponseError(f'Invalid JSON: {e}') from e
+
+
+def parse_search(data: Any) -> list[SearchItem]:
+    """
+    Parse albums of search response ('albums.items'), skipping fields which are not used
+    (images, hrefs, release dates - see SearchModel for the whole response).
+
+    Raises:
+        MalformedResponseError: If items or their id, name and artist names are missing or are not strings.
+    """
+
+    try:
+        items = [
+            SearchItem(item['id'], item['name'], tuple(artist['name'] for artist in item['artists']))
+            for item in data['albums']['items']
+        ]
+    except (KeyError, TypeError) as e:
+        raise MalformedResponseError(f'Invalid search response: missing or invalid field ({e})') from e
+
+    for item in items:
+        if not (type(item.id) is str and type(item.name) is str and all(type(name) is str for name in item.artists)):
+            raise MalformedResponseError(f'Invalid search response: non-string id or name in {item}')
+    return items
+
+
+def parse_album_tracks(data: Any) -> dict[str, list]:
+    """
+    Parse tracks of albums response ('albums[].tracks.items') into columns of TRACK_COLUMNS
+    (see AlbumInfoModel for the whole response).
+
+    Raises:
+        MalformedResponseError: If album id, track id, name, number or artists are missing or have invalid type.
+    """
+
+    rows = []
+    try:
+        for album in data['albums']:
+            album_id = album['id']
+            for track in album['tracks']['items']:
+                rows.append((album_id, track['id'], track['name'], track['track_number'], len(track['artists'])))
+    except (KeyError, TypeError) as e:
+        raise MalformedResponseError(f'Invalid albums response: missing or invalid field ({e})') from e
+
+    return _to_checked_columns(rows, _TRACK_TYPES, 'albums')
+
+
+def parse_audio_features(data: Any) -> tuple[dict[str, list], list[int]]:
+    """
+    Parse audio features response ('audio_features') into columns of FEATURE_COLUMNS, without
+    building a model for every track (see TrackFeatureModel for the whole response).
+
+    Examples:
+    ---------
+    >>> columns, missing = parse_audio_features(loads(resp.content))
+    >>> df = pd.DataFrame(columns)
+
+    Returns:
+        Columns of tracks with features, and positions of requested tracks without features (null in response).
+
+    Raises:
+        MalformedResponseError: If a feature is missing or is not a number (integer for INT_FEATURES).
+    """
+
+    rows = []
+    missing = []
+    try:
+        for i, features in enumerate(data['audio_features']):
+            if features is None:
+                missing.append(i)
+                continue
+            rows.append((features['id'], *[features[col] for col in c.SPOTIFY_RAW_FEATURES]))
+    except (KeyError, TypeError) as e:
+        raise MalformedResponseError(f'Invalid audio features response: missing or invalid field ({e})') from e
+
+    return _to_checked_columns(rows, _FEATURE_TYPES, 'audio features'), missing
+
+
+def _to_checked_columns(rows: list[tuple], types: dict[str, set[type]], response: str) -> dict[str, list]:
+    """
+    Returns: Rows transposed into lists of values of each column (columns are keys of types).
+
+    Raises:
+        MalformedResponseError: If a column has value of type not allowed in types.
+    """
+
+    if not rows:
+        return {col: [] for col in types}
+
+    columns = dict(zip(types, map(list, zip(*rows))))
+    for col, allowed in types.items():
+        if invalid := set(map(type, columns[col])) - allowed:
+            raise MalformedResponseError(f'Invalid {response} response: {col} of type {invalid.pop().__name__}')
+    return columns
@@ -1,19 +1,32 @@
 import base64
+import os
 import time
 import requests as requests
 from abc import ABC, abstractmethod
+from typing import Any, Callable, TypeVar
 
+from data_processing.fetch.spotify_api.response_parsers import loads
+from shared_utils import metrics, tracing
 from shared_utils.utils import create_logger
 
+Parsed = TypeVar('Parsed')
+
+SPOTIFY_ACCOUNTS_URL = 'https://accounts.spotify.com'
+SPOTIFY_API_URL = 'https://api.spotify.com'
+"""Default base URLs of Spotify, overridden by SPOTIFY_ACCOUNTS_URL and SPOTIFY_API_URL envs (e.g. to target
+local stand-in server, see benchmarks/api_stand_in.py)."""
+
 
 class SpotifyFetcher(ABC):
     """
     Abstract representation of class for fetching data from spotify service.
-    Provides token and logger.
+    Provides token, logger and base URL of API.
     """
 
     def __init__(self, client_id: str, client_secret: str):
         self._logger = create_logger('SpotifyFetcher')
+        self._accounts_url = os.getenv('SPOTIFY_ACCOUNTS_URL', SPOTIFY_ACCOUNTS_URL).rstrip('/')
+        self._api_url = os.getenv('SPOTIFY_API_URL', SPOTIFY_API_URL).rstrip('/')
         self._set_spotify_token(client_id, client_secret)
 
     def _set_spotify_token(self, client_id: str, client_secret: str):
@@ -25,14 +38,67 @@ class SpotifyFetcher(ABC):
         """
 
         client_b64 = base64.urlsafe_b64encode(f'{client_id}:{client_secret}'.encode()).decode()
-        r = requests.post('https://accounts.spotify.com/api/token',
-                          data={'grant_type': 'client_credentials'},
-                          headers={'Authorization': f'Basic {client_b64}'})
+        with tracing.span('spotify/token') as span:
+            try:
+                r = requests.post(f'{self._accounts_url}/api/token',
+                                  data={'grant_type': 'client_credentials'},
+                                  headers={'Authorization': f'Basic {client_b64}'})
+            except requests.RequestException:
+                metrics.record_request('spotify/token', None)
+                raise
+            span.status, span.bytes = r.status_code, len(r.content)
+        metrics.record_request('spotify/token', r.status_code)
 
         if r.status_code != 200:
             raise requests.RequestException(f'Status code not success: {r.json()}')
         self._token = r.json()['access_token']
 
+    def _get(self, endpoint: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send get request to Spotify API, trace it and count it in metrics of running stage.
+
+        Args:
+            endpoint: Name of endpoint in metrics, e.g. 'spotify/search'.
+            url: URL of request.
+            kwargs: Other arguments of requests.get().
+
+        Returns:
+            Spotify API response.
+        """
+
+        with tracing.span(endpoint) as span:
+            try:
+                resp = requests.get(url, **kwargs)
+            except requests.RequestException:
+                metrics.record_request(endpoint, None)
+                raise
+            span.status, span.bytes = resp.status_code, len(resp.content)
+        metrics.record_request(endpoint, resp.status_code)
+        return resp
+
+    @staticmethod
+    def _parse(endpoint: str, resp: requests.Response, parser: Callable[[Any], Parsed]) -> Parsed:
+        """
+        Decode JSON body of response and parse fields which are used (see response_parsers), tracing both
+        phases separately.
+
+        Args:
+            endpoint: Name of endpoint in traces, e.g. 'spotify/search'.
+            resp: Successful Spotify API response.
+            parser: Parser of decoded response, e.g. response_parsers.parse_search.
+
+        Returns:
+            Parsed response.
+
+        Raises:
+            MalformedResponseError: If response is not valid JSON or misses fields which are read.
+        """
+
+        with tracing.span(endpoint, tracing.DECODE):
+            data = loads(resp.content)
+        with tracing.span(endpoint, tracing.PARSE):
+            return parser(data)
+
     @abstractmethod
     def fetch(self):
         """Fetch data from spotify to output file."""
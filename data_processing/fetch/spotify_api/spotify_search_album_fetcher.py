@@ -1,6 +1,5 @@
 import os
 import time
-import requests
 import pandas as pd
 import shared_utils.columns as c
 
@@ -9,7 +8,8 @@ from typing import Tuple, Optional
 from requests import Response
 
 from data_processing.fetch.spotify_api.spotify_data_collection import SpotifyFetcher
-from data_processing.fetch.spotify_api.data_models.spotify_search_album_model import SearchModel, Item
+from data_processing.fetch.spotify_api.response_parsers import parse_search, SearchItem
+from shared_utils import metrics, schemas, storage
 from shared_utils.utils import clear_album_name, clear_artist_name
 from shared_utils.columns import SPOTIFY_SEARCH_COLS
 
@@ -37,8 +37,11 @@ class SpotifySearchAlbumFetcher(SpotifyFetcher):
         rym_input_filepath: Filepath for RateYourMusic input data.
         spotify_output_filepath: Filepath for Spotify output data.
         _df_spotify: Output dataframe with Spotify data.
+        ENDPOINT: Name of endpoint in metrics and traces.
     """
 
+    ENDPOINT = 'spotify/search'
+
     @dataclass
     class SpotifyRecord:
         spotify_id: Optional[str] = None
@@ -46,17 +49,26 @@ class SpotifySearchAlbumFetcher(SpotifyFetcher):
         spotify_artist: Optional[str] = None
         precision_match: int = 0
 
-    def __init__(self, client_id: str, client_secret: str, rym_input_filepath: str, spotify_output_filepath: str):
+    def __init__(
+            self,
+            client_id: str,
+            client_secret: str,
+            rym_input_filepath: str,
+            spotify_output_filepath: str,
+            years: Optional[storage.Years] = None
+    ):
         """
         Args:
             client_id: Spotify API client ID.
             client_secret: Spotify API client secret.
-            rym_input_filepath: Path to file with RateYourMusic data.
+            rym_input_filepath: Path to file or dataset with processed RateYourMusic data.
             spotify_output_filepath: Path to output file for Spotify data.
+            years: Range of release years to read from partitioned RateYourMusic data, all if None.
         """
         super().__init__(client_id, client_secret)
 
         self.rym_input_filepath = rym_input_filepath
+        self._years = years
         self.spotify_output_filepath = spotify_output_filepath
         self._prepare_output_file()
 
@@ -64,14 +76,15 @@ class SpotifySearchAlbumFetcher(SpotifyFetcher):
         """Prepare output file to search data."""
         if not os.path.exists(self.spotify_output_filepath):
             self._create_output_df()
-        self._df_spotify = pd.read_csv(self.spotify_output_filepath)
+        self._df_spotify = schemas.read_csv(self.spotify_output_filepath, schemas.SPOTIFY_SEARCH_SCHEMA)
 
         assert (self._df_spotify.columns.values == SPOTIFY_SEARCH_COLS).all(), 'Invalid data structure.'
         self._logger.info(f'Output file loaded. Spotify filled data:\n{self._df_spotify.notna().sum()}.')
 
     def _create_output_df(self):
         """Create output file based on artist name and album data from rym."""
-        df_rym = pd.read_csv(self.rym_input_filepath)
+        df_rym = storage.read_frame(
+            self.rym_input_filepath, schemas.RYM_PROCESSED_SCHEMA, columns=[c.ALBUM, c.ARTIST], years=self._years)
         self._df_spotify = df_rym[[c.ALBUM, c.ARTIST]].copy()
         self._df_spotify[c.ALBUM_ID] = None
         self._df_spotify[c.SPOTIFY_ALBUM] = None
@@ -83,7 +96,7 @@ class SpotifySearchAlbumFetcher(SpotifyFetcher):
 
     def _save_df(self):
         """Save self._df_spotify in self.spotify_output_filepath CSV file."""
-        self._df_spotify[SPOTIFY_SEARCH_COLS].to_csv(self.spotify_output_filepath, index=False)
+        schemas.to_csv(self._df_spotify[SPOTIFY_SEARCH_COLS], self.spotify_output_filepath, schemas.SPOTIFY_SEARCH_SCHEMA)
         self._logger.info(f'Saved data to {self.spotify_output_filepath}.')
 
     def fetch(self):
@@ -104,6 +117,7 @@ class SpotifySearchAlbumFetcher(SpotifyFetcher):
                 self._save_df()
 
             record = self._get_album_data(i, row)
+            metrics.add_rows(rows_in=1, rows_out=record.spotify_id is not None)
             self._df_spotify.loc[i, c.ALBUM_ID] = record.spotify_id
             self._df_spotify.loc[i, c.SPOTIFY_ALBUM] = record.spotify_album
             self._df_spotify.loc[i, c.SPOTIFY_ARTIST] = record.spotify_artist
@@ -147,7 +161,7 @@ class SpotifySearchAlbumFetcher(SpotifyFetcher):
         Returns:
             Spotify response of search.
         """
-        base_url = 'https://api.spotify.com/v1/search'
+        base_url = f'{self._api_url}/v1/search'
         headers = {
             'Content-Type': 'application/json',
             'Accept': 'application/json',
@@ -159,7 +173,7 @@ class SpotifySearchAlbumFetcher(SpotifyFetcher):
             'market': 'US',
             'limit': 10
         }
-        return requests.get(base_url, params=data, headers=headers)
+        return self._get(self.ENDPOINT, base_url, params=data, headers=headers)
 
     def _handle_successful_response(self, resp: Response) -> SpotifyRecord:
         """
@@ -170,7 +184,7 @@ class SpotifySearchAlbumFetcher(SpotifyFetcher):
             A SpotifyRecord object containing the album id, album name, artist name, and the precision match score.
         """
 
-        results = SearchModel(**resp.json()).albums.items
+        results = self._parse(self.ENDPOINT, resp, parse_search)
         if len(results) == 0:
             self._logger.debug(f'Missing results for: {self._artist} - {self._album}')
             return self.SpotifyRecord()
@@ -183,7 +197,7 @@ class SpotifySearchAlbumFetcher(SpotifyFetcher):
             precision_match=precision_match,
         )
 
-    def _match_best_item(self, results: list[Item]) -> Tuple[Item, int]:
+    def _match_best_item(self, results: list[SearchItem]) -> Tuple[SearchItem, int]:
         """
         Find the best match for album and artist among the given search results.
 
@@ -2,21 +2,26 @@ import os
 import sys
 import pandas as pd
 import pyprind
-import requests
 import shared_utils.columns as c
 
-from typing import List, Dict
+from typing import List
 from requests import Response
 
 from data_processing.fetch.spotify_api.spotify_data_collection import SpotifyFetcher
-from data_processing.fetch.spotify_api.data_models.spotify_track_features_model import TrackFeatureModel
+from shared_utils import metrics, schemas
+from data_processing.fetch.spotify_api.response_parsers import parse_audio_features
 
 
 class SpotifyTrackFeaturesFetcher(SpotifyFetcher):
     """
     Class for fetching audio feature for tracks from the Spotify API.
+
+    Attributes:
+        ENDPOINT: Name of endpoint in metrics and traces.
     """
 
+    ENDPOINT = 'spotify/audio-features'
+
     def __init__(
             self,
             client_id: str,
@@ -39,11 +44,12 @@ class SpotifyTrackFeaturesFetcher(SpotifyFetcher):
 
     def _prepare_input_ids(self):
         """Prepare track IDs to fetch from spotify, based on fetched tracks."""
-        df_track_ids = pd.read_csv(self.input_filepath)
+        df_track_ids = schemas.read_csv(self.input_filepath, schemas.SPOTIFY_TRACKS_IDS_SCHEMA)
         self._track_ids: pd.Series = df_track_ids[c.SONG_ID]
 
         if os.path.exists(self.output_filepath):
-            df_track_ids = pd.read_csv(self.output_filepath)
+            df_track_ids = schemas.read_csv(
+                self.output_filepath, schemas.SPOTIFY_RAW_FEATURES_SCHEMA, usecols=[c.SONG_ID])
             self._track_ids = self._track_ids[~self._track_ids.isin(df_track_ids[c.SONG_ID])]
         self._logger.info(f'Number of track ids to fetch feature: {len(self._track_ids)}')
 
@@ -57,6 +63,7 @@ class SpotifyTrackFeaturesFetcher(SpotifyFetcher):
         progress_bar = pyprind.ProgBar(int(len(self._track_ids) / chunk_size + 1), stream=sys.stdout)
         for track_ids in self._ids_by_chunks(chunk_size):
             resp: Response = self._send_for_tracks_features(track_ids)
+            metrics.add_rows(rows_in=len(track_ids))
 
             # Handle response
             if resp.status_code == 200:
@@ -85,12 +92,12 @@ class SpotifyTrackFeaturesFetcher(SpotifyFetcher):
             A `Response` object containing the response from the Spotify API.
         """
 
-        base_url = f'https://api.spotify.com/v1/audio-features?ids={",".join(ids)}'
+        base_url = f'{self._api_url}/v1/audio-features?ids={",".join(ids)}'
         headers = {
             'Content-Type': 'application/json',
             'Authorization': f'Bearer {self._token}'
         }
-        return requests.get(base_url, headers=headers)
+        return self._get(self.ENDPOINT, base_url, headers=headers)
 
     def _handle_successful_response(self, resp: Response, track_ids: pd.Series):
         """
@@ -101,12 +108,10 @@ class SpotifyTrackFeaturesFetcher(SpotifyFetcher):
             track_ids: The track IDs that the response is for.
         """
 
-        batch: List[Dict[str, str]] = []
-        tracks_features = TrackFeatureModel(**resp.json()).audio_features
-        for i, features in enumerate(tracks_features):
-            if features:
-                batch.append(features.dict())
-            else:
-                self._logger.debug(f'Feature not found for {track_ids.values[i]} track.')
+        features, missing = self._parse(self.ENDPOINT, resp, parse_audio_features)
+        for i in missing:
+            self._logger.debug(f'Feature not found for {track_ids.values[i]} track.')
+        metrics.add_rows(rows_out=len(features[c.SONG_ID]))
         is_file_new = not os.path.exists(self.output_filepath)
-        pd.DataFrame(batch).to_csv(self.output_filepath, mode='a', index=False, header=is_file_new)
+        schemas.to_csv(pd.DataFrame(features), self.output_filepath, schemas.SPOTIFY_RAW_FEATURES_SCHEMA,
+                       mode='a', header=is_file_new)
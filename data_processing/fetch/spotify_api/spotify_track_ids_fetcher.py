@@ -2,14 +2,14 @@ import os
 import sys
 import pandas as pd
 import pyprind
-import requests
 import shared_utils.columns as c
 
-from typing import List, Dict
+from typing import List
 from requests import Response
 
-from data_processing.fetch.spotify_api.data_models.spotify_album_tracks_model import AlbumInfoModel
+from data_processing.fetch.spotify_api.response_parsers import parse_album_tracks
 from data_processing.fetch.spotify_api.spotify_data_collection import SpotifyFetcher
+from shared_utils import metrics, schemas
 from shared_utils.columns import SPOTIFY_SEARCH_COLS
 
 
@@ -27,8 +27,11 @@ class SpotifyTrackIDsFetcher(SpotifyFetcher):
         spotify_ids_input_filepath: Filepath for Spotify searched album ids input data.
         spotify_tracks_ids_output_filepath: Filepath for Spotify track ids output data.
         _spotify_ids: Spotify album IDs to fetch.
+        ENDPOINT: Name of endpoint in metrics and traces.
     """
 
+    ENDPOINT = 'spotify/albums'
+
     def __init__(
             self,
             client_id: str,
@@ -58,7 +61,8 @@ class SpotifyTrackIDsFetcher(SpotifyFetcher):
 
         self._spotify_ids = self._get_loaded_spotify_ids()
         if os.path.exists(self.spotify_tracks_ids_output_filepath):
-            df_song_ids = pd.read_csv(self.spotify_tracks_ids_output_filepath)
+            df_song_ids = schemas.read_csv(
+                self.spotify_tracks_ids_output_filepath, schemas.SPOTIFY_TRACKS_IDS_SCHEMA, usecols=[c.ALBUM_ID])
             fetched_ids = df_song_ids[c.ALBUM_ID].unique()
             self._spotify_ids = self._spotify_ids[~self._spotify_ids.isin(fetched_ids)]
         self._logger.info(f'Number of albums to fetch track ids: {len(self._spotify_ids)}')
@@ -72,7 +76,7 @@ class SpotifyTrackIDsFetcher(SpotifyFetcher):
             Spotify album id's.
         """
 
-        df_spotify_ids = pd.read_csv(self.spotify_ids_input_filepath)
+        df_spotify_ids = schemas.read_csv(self.spotify_ids_input_filepath, schemas.SPOTIFY_SEARCH_SCHEMA)
         assert (df_spotify_ids.columns.values == SPOTIFY_SEARCH_COLS).all(), 'Invalid input data structure.'
 
         df_spotify_ids = df_spotify_ids[df_spotify_ids.notna()]
@@ -90,6 +94,7 @@ class SpotifyTrackIDsFetcher(SpotifyFetcher):
         progress_bar = pyprind.ProgBar(int(len(self._spotify_ids) / chunk_size), stream=sys.stdout)
         for album_ids in self._ids_by_chunks(chunk_size):
             resp: Response = self._send_for_album_tracks(album_ids)
+            metrics.add_rows(rows_in=len(album_ids))
 
             if resp.status_code == 200:
                 self._handle_successful_response(resp)
@@ -119,12 +124,12 @@ class SpotifyTrackIDsFetcher(SpotifyFetcher):
             Spotify API response.
         """
 
-        base_url = f'https://api.spotify.com/v1/albums?ids={",".join(ids)}&market=US'
+        base_url = f'{self._api_url}/v1/albums?ids={",".join(ids)}&market=US'
         headers = {
             'Content-Type': 'application/json',
             'Authorization': f'Bearer {self._token}'
         }
-        return requests.get(base_url, headers=headers)
+        return self._get(self.ENDPOINT, base_url, headers=headers)
 
     def _handle_successful_response(self, resp: Response):
         """
@@ -135,18 +140,8 @@ class SpotifyTrackIDsFetcher(SpotifyFetcher):
             resp: Spotify API response.
         """
 
-        batch: List[Dict[str, str]] = []
-        albums = AlbumInfoModel(**resp.json()).albums
-        for album in albums:
-            for track in album.tracks.items:
-                record = {
-                    c.ALBUM_ID: album.id,
-                    c.SONG_ID: track.id,
-                    c.SONG_NAME: track.name,
-                    c.SONG_NUMBER: track.track_number,
-                    c.SONG_ARTISTS_NUMBER: len(track.artists)
-                }
-                batch.append(record)
-
+        tracks = self._parse(self.ENDPOINT, resp, parse_album_tracks)
+        metrics.add_rows(rows_out=len(tracks[c.SONG_ID]))
         is_file_new = not os.path.exists(self.spotify_tracks_ids_output_filepath)
-        pd.DataFrame(batch).to_csv(self.spotify_tracks_ids_output_filepath, mode='a', index=False, header=is_file_new)
+        schemas.to_csv(pd.DataFrame(tracks), self.spotify_tracks_ids_output_filepath, schemas.SPOTIFY_TRACKS_IDS_SCHEMA,
+                       mode='a', header=is_file_new)
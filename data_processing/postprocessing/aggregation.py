@@ -0,0 +1,110 @@
+import re
+import numpy as np
+
+MEAN = 'mean'
+MIN = 'min'
+MAX = 'max'
+STD = 'std'
+SKEW = 'skew'
+MEDIAN = 'median'
+
+AGG_STATS = [MEAN, MIN, MAX, STD]
+"""Default statistics of album tracks features."""
+
+_PERCENTILE_REGEX = re.compile(r'^p(\d{1,2}(\.\d+)?)$')
+"""Percentile statistic, e.g. 'p10' or 'p97.5'."""
+
+
+def aggregate_segments(
+        values: np.ndarray,
+        offsets: np.ndarray,
+        feature_names: list[str],
+        stats: list[str] = AGG_STATS
+) -> tuple[np.ndarray, list[str]]:
+    """
+    Compute statistics of consecutive segments of rows (e.g. tracks of each album) in one pass
+    of segmented reductions, without grouping by key.
+
+    Available statistics: 'mean', 'min', 'max', 'std' (sample), 'skew' (sample, as in pandas),
+    'median' and percentiles 'p<q>' (e.g. 'p10', 'p90'), linearly interpolated as in np.percentile.
+
+    Args:
+        values: Rows of all segments of shape (rows, features), ordered segment by segment.
+        offsets: Offsets of segments in values of shape (segments + 1,), every segment must be non-empty.
+        feature_names: Names of values columns.
+        stats: Statistics to compute.
+
+    Returns:
+        Tuple of float32 matrix of shape (segments, len(stats) * features) and its column names
+        (`<feature>_<stat>`), ordered statistic by statistic.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    starts = offsets[:-1]
+    counts = np.diff(offsets)
+    assert (counts > 0).all(), 'Every segment must contain at least one row.'
+
+    segment_ids = np.repeat(np.arange(len(counts)), counts)
+    n = counts[:, None].astype(np.float64)
+    mean = np.add.reduceat(values, starts, axis=0) / n
+
+    moments: dict[int, np.ndarray] = {}
+    sorted_values = None
+
+    def central_moment(k: int) -> np.ndarray:
+        if k not in moments:
+            moments[k] = np.add.reduceat((values - mean[segment_ids]) ** k, starts, axis=0)
+        return moments[k]
+
+    results = []
+    for stat in stats:
+        if stat == MEAN:
+            result = mean
+        elif stat == MIN:
+            result = np.minimum.reduceat(values, starts, axis=0)
+        elif stat == MAX:
+            result = np.maximum.reduceat(values, starts, axis=0)
+        elif stat == STD:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result = np.sqrt(central_moment(2) / (n - 1))
+        elif stat == SKEW:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                m2, m3 = central_moment(2) / n, central_moment(3) / n
+                result = np.sqrt(n * (n - 1)) / (n - 2) * m3 / m2 ** 1.5
+                result = np.where(m2 <= 1e-14 * mean ** 2, 0., result)
+                result[counts < 3] = np.nan
+        else:
+            if sorted_values is None:
+                sorted_values = _sort_within_segments(values, segment_ids)
+            result = _segment_percentile(sorted_values, starts, counts, _percentile(stat))
+        results.append(result)
+
+    names = [f'{name}_{stat}' for stat in stats for name in feature_names]
+    return np.hstack(results).astype(np.float32), names
+
+
+def _percentile(stat: str) -> float:
+    if stat == MEDIAN:
+        return 50.
+    match = _PERCENTILE_REGEX.match(stat)
+    assert match is not None, f'Unknown statistic {stat}.'
+    return float(match.group(1))
+
+
+def _sort_within_segments(values: np.ndarray, segment_ids: np.ndarray) -> np.ndarray:
+    """Returns: Copy of values with each column sorted within segments."""
+
+    sorted_values = np.empty_like(values)
+    for j in range(values.shape[1]):
+        sorted_values[:, j] = values[np.lexsort((values[:, j], segment_ids)), j]
+    return sorted_values
+
+
+def _segment_percentile(sorted_values: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """Returns: q-th percentile of each segment of sorted values (linear interpolation)."""
+
+    position = (counts - 1) * q / 100
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, counts - 1)
+    fraction = (position - lower)[:, None]
+    return sorted_values[starts + lower] * (1 - fraction) + sorted_values[starts + upper] * fraction
@@ -0,0 +1,120 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass
+from typing import Optional
+
+from shared_utils import columns as c
+from shared_utils.storage import CSV, PARQUET
+
+NPY = 'npy'
+FORMATS = [NPY, PARQUET, CSV]
+"""Formats of saved dataset: .npy arrays (memory-mappable) or a table with one column per feature."""
+
+_TABLE_NAME = 'album_rating'
+_NPY_FILES = ['features.npy', 'labels.npy', 'album_ids.npy', 'feature_names.json']
+_TABLE_FILES = [f'{_TABLE_NAME}.{fmt}' for fmt in [PARQUET, CSV]]
+
+
+@dataclass
+class FeatureMatrix:
+    """
+    Final dataset as contiguous arrays, one row per sample.
+
+    Attributes:
+        features: Float32 features of shape (samples, features).
+        labels: Rating classes of shape (samples,).
+        album_ids: Album id of each sample of shape (samples,).
+        feature_names: Names of feature columns.
+    """
+
+    features: np.ndarray
+    labels: np.ndarray
+    album_ids: np.ndarray
+    feature_names: list[str]
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def save(self, path: str, fmt: str = NPY):
+        """
+        Save dataset to directory - as .npy files, which can be memory-mapped on load, or as
+        a table with album id, rating and one column per feature.
+
+        Args:
+            path: Output directory.
+            fmt: Output format, one of FORMATS.
+        """
+
+        assert fmt in FORMATS, f'Invalid format {fmt}, expected one of: {FORMATS}.'
+
+        os.makedirs(path, exist_ok=True)
+        # Remove dataset saved previously in other format, so it is not loaded instead of this one.
+        for filename in _NPY_FILES + _TABLE_FILES:
+            if os.path.exists(os.path.join(path, filename)):
+                os.remove(os.path.join(path, filename))
+
+        if fmt != NPY:
+            self._save_table(os.path.join(path, f'{_TABLE_NAME}.{fmt}'), fmt)
+            return
+
+        np.save(os.path.join(path, 'features.npy'), np.ascontiguousarray(self.features, dtype=np.float32))
+        np.save(os.path.join(path, 'labels.npy'), self.labels)
+        np.save(os.path.join(path, 'album_ids.npy'), np.asarray(self.album_ids).astype(str))
+        with open(os.path.join(path, 'feature_names.json'), 'w') as json_file:
+            json.dump(self.feature_names, json_file)
+
+    def _save_table(self, filepath: str, fmt: str):
+        df = pd.DataFrame(np.asarray(self.features, dtype=np.float32), columns=self.feature_names)
+        df.insert(0, c.ALBUM_ID, np.asarray(self.album_ids).astype(str))
+        df.insert(1, c.RATING, self.labels)
+
+        if fmt == PARQUET:
+            df.to_parquet(filepath, index=False)
+        else:
+            df.to_csv(filepath, index=False)
+
+
+def load_feature_matrix(path: str, mmap_mode: Optional[str] = 'r') -> FeatureMatrix:
+    """
+    Load final dataset saved with FeatureMatrix.save() in any format.
+
+    Examples:
+    ---------
+    >>> dataset = load_feature_matrix(f'{PROJECT_DIR}/data/final/flatten')
+    >>> X, y = dataset.features, dataset.labels
+
+    Args:
+        path: Directory of the dataset (e.g. 'data/final/flatten').
+        mmap_mode: Memory-map mode of arrays saved as .npy (see np.load), None to load them into memory.
+
+    Returns:
+        Loaded dataset.
+    """
+
+    for filename in _TABLE_FILES:
+        filepath = os.path.join(path, filename)
+        if os.path.exists(filepath):
+            if filename.endswith(PARQUET):
+                df = pd.read_parquet(filepath)
+            else:
+                df = pd.read_csv(filepath, dtype={c.ALBUM_ID: str})
+            feature_names = df.columns.drop([c.ALBUM_ID, c.RATING]).tolist()
+            return FeatureMatrix(
+                features=df[feature_names].to_numpy(dtype=np.float32),
+                labels=df[c.RATING].to_numpy(),
+                album_ids=df[c.ALBUM_ID].to_numpy(dtype=object),
+                feature_names=feature_names,
+            )
+
+    with open(os.path.join(path, 'feature_names.json'), 'r') as json_file:
+        feature_names = json.load(json_file)
+
+    return FeatureMatrix(
+        features=np.load(os.path.join(path, 'features.npy'), mmap_mode=mmap_mode),
+        labels=np.load(os.path.join(path, 'labels.npy'), mmap_mode=mmap_mode),
+        album_ids=np.load(os.path.join(path, 'album_ids.npy'), mmap_mode=mmap_mode),
+        feature_names=feature_names,
+    )
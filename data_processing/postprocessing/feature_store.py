@@ -0,0 +1,217 @@
+import json
+import os
+import sqlite3
+import threading
+import numpy as np
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Sequence
+
+BLOB_DTYPE = np.dtype('<f4')
+"""Type of values in stored vectors (little-endian float32)."""
+
+MAX_QUERY_IDS = 500
+"""Maximum number of album ids in one query of multi_get() (SQLite limits number of query parameters)."""
+
+
+@dataclass
+class StoredFeatures:
+    """
+    Vectors of albums read with FeatureStore.multi_get().
+
+    Attributes:
+        album_ids: Requested album ids of shape (albums,).
+        found: Boolean mask of shape (albums,) - False for albums missing in the store.
+        vectors: Float32 matrix of shape (albums, group features) of each requested group, rows of missing
+            albums are filled with NaN.
+    """
+
+    album_ids: np.ndarray
+    found: np.ndarray
+    vectors: dict[str, np.ndarray]
+
+
+class FeatureStore:
+    """
+    Embedded key-value store of album feature vectors for online scoring, kept in one SQLite file.
+    Each album is one row keyed by its id (indexed primary key), with a float32 blob per group
+    of features (e.g. Spotify features flattened track by track, RYM features). The file is written
+    once with write() and replaced as a whole, so it is opened read-only and immutable.
+
+    Examples:
+    ---------
+    >>> FeatureStore.write(path, album_ids, {'spotify': spotify_values, 'rym': rym_values},
+    ...                    {'spotify': spotify_names, 'rym': rym_names})
+    >>> with FeatureStore(path) as store:
+    ...     store.get('3Ubwe5Tys8ZuTmtIKF7u2B')['rym']
+    ...     store.multi_get(album_ids, ['spotify', 'rym']).vectors['spotify']
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Store file saved with write().
+        """
+
+        assert os.path.exists(path), f'Feature store {path} does not exist.'
+
+        self.path = path
+        # Lookups may come from any thread of a service, the lock serializes use of the connection.
+        self._conn = sqlite3.connect(
+            f'{Path(path).absolute().as_uri()}?mode=ro&immutable=1', uri=True, check_same_thread=False)
+        # Reading pages through memory map halves time of point lookups.
+        self._conn.execute(f'PRAGMA mmap_size = {os.path.getsize(path)}')
+        self._lock = threading.Lock()
+        self.feature_names: dict[str, list[str]] = {
+            name: json.loads(feature_names)
+            for name, feature_names in self._conn.execute('SELECT name, feature_names FROM groups ORDER BY position')
+        }
+
+    @property
+    def groups(self) -> list[str]:
+        """Returns: Names of groups of features, in order of store columns."""
+
+        return list(self.feature_names)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM albums').fetchone()[0]
+
+    def __contains__(self, album_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM albums WHERE album_id = ?', (album_id,)).fetchone() is not None
+
+    def get(self, album_id: str, groups: Optional[list[str]] = None) -> Optional[dict[str, np.ndarray]]:
+        """
+        Read vectors of one album.
+
+        Args:
+            album_id: Album id.
+            groups: Groups of features to read, all if None.
+
+        Returns:
+            Float32 vector of each group, None if album is not in the store.
+        """
+
+        groups = self._checked_groups(groups)
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT {_columns(groups)} FROM albums WHERE album_id = ?', (album_id,)).fetchone()
+        if row is None:
+            return None
+        return {group: np.frombuffer(blob, dtype=BLOB_DTYPE) for group, blob in zip(groups, row)}
+
+    def multi_get(self, album_ids: Sequence[str], groups: Optional[list[str]] = None) -> StoredFeatures:
+        """
+        Read vectors of many albums with one query per MAX_QUERY_IDS albums.
+
+        Args:
+            album_ids: Album ids, may contain duplicates and albums missing in the store.
+            groups: Groups of features to read, all if None.
+
+        Returns:
+            Matrices of vectors of each group, rows in order of album_ids.
+        """
+
+        groups = self._checked_groups(groups)
+        album_ids = np.asarray(album_ids, dtype=object)
+        unique_ids = list(dict.fromkeys(album_ids.tolist()))
+
+        rows = {}
+        with self._lock:
+            for start in range(0, len(unique_ids), MAX_QUERY_IDS):
+                chunk = unique_ids[start:start + MAX_QUERY_IDS]
+                placeholders = ', '.join('?' * len(chunk))
+                query = f'SELECT album_id, {_columns(groups)} FROM albums WHERE album_id IN ({placeholders})'
+                rows.update((row[0], row[1:]) for row in self._conn.execute(query, chunk))
+
+        found = np.fromiter((album_id in rows for album_id in album_ids), dtype=bool, count=len(album_ids))
+        found_rows = [rows[album_id] for album_id in album_ids[found]]
+        vectors = {}
+        for i, group in enumerate(groups):
+            matrix = np.full((len(album_ids), len(self.feature_names[group])), np.nan, dtype=np.float32)
+            if found_rows:
+                # Blobs are joined and converted once, instead of converting each row.
+                matrix[found] = np.frombuffer(b''.join(row[i] for row in found_rows), dtype=BLOB_DTYPE).reshape(
+                    len(found_rows), -1)
+            vectors[group] = matrix
+
+        return StoredFeatures(album_ids, found, vectors)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self) -> 'FeatureStore':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _checked_groups(self, groups: Optional[list[str]]) -> list[str]:
+        if groups is None:
+            return self.groups
+        assert all(group in self.feature_names for group in groups), \
+            f'Unknown group in {groups}, expected: {self.groups}.'
+        return groups
+
+    @classmethod
+    def write(
+            cls,
+            path: str,
+            album_ids: np.ndarray,
+            vectors: dict[str, np.ndarray],
+            feature_names: dict[str, list[str]]
+    ):
+        """
+        Save vectors of albums as a new store. Store is written to a temporary file, which then replaces
+        the previous store, so open stores keep reading their version.
+
+        Args:
+            path: Output file.
+            album_ids: Unique album ids of shape (albums,).
+            vectors: Matrix of shape (albums, group features) of each group, rows in order of album_ids.
+            feature_names: Names of features of each group.
+        """
+
+        assert len(set(album_ids)) == len(album_ids), 'Album ids are not unique.'
+        assert set(vectors) == set(feature_names), 'Vectors and feature names have different groups.'
+        for group, values in vectors.items():
+            assert group.isidentifier(), f'Invalid group name {group}, expected identifier.'
+            assert values.shape == (len(album_ids), len(feature_names[group])), \
+                f'Invalid shape of {group} vectors {values.shape}.'
+
+        groups = list(vectors)
+        tmp_path = f'{path}.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute('PRAGMA journal_mode = OFF')
+            conn.execute('PRAGMA synchronous = OFF')
+            conn.execute('CREATE TABLE groups (name TEXT PRIMARY KEY, position INTEGER, feature_names TEXT)')
+            conn.executemany('INSERT INTO groups VALUES (?, ?, ?)',
+                             [(group, i, json.dumps(feature_names[group])) for i, group in enumerate(groups)])
+            conn.execute(f'CREATE TABLE albums (album_id TEXT PRIMARY KEY, '
+                         f'{", ".join(f"{_quote(group)} BLOB NOT NULL" for group in groups)})')
+
+            blobs = [np.ascontiguousarray(vectors[group], dtype=BLOB_DTYPE) for group in groups]
+            conn.executemany(
+                f'INSERT INTO albums VALUES (?, {", ".join("?" * len(groups))})',
+                ((str(album_id), *[values[i].tobytes() for values in blobs]) for i, album_id in enumerate(album_ids)))
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+
+
+# Functions
+
+def _quote(group: str) -> str:
+    return f'"{group}"'
+
+
+def _columns(groups: list[str]) -> str:
+    return ', '.join(map(_quote, groups))
@@ -1,166 +1,347 @@
-import ast
 import os
+import numpy as np
 import pandas as pd
-import json
 
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from data_processing.feature.album_tensor import AlbumTensor, album_offsets, pad_sequences
+from data_processing.postprocessing.aggregation import AGG_STATS, aggregate_segments
+from data_processing.postprocessing.feature_matrix import FeatureMatrix, NPY
+from data_processing.postprocessing.feature_store import FeatureStore
 from shared_utils import columns as c
+from shared_utils import metrics, schemas, storage
+from shared_utils.paths import album_tensor_path
+from shared_utils.storage import dataset_path
 from shared_utils.utils import PROJECT_DIR
 
+FLATTEN = 'flatten'
+AGG_FLATTEN = 'agg_flatten'
+SINGLE = 'single'
+VARIANTS = [FLATTEN, AGG_FLATTEN, SINGLE]
+"""Variants of final dataset, saved in subdirectories with the same names."""
+
+FEATURE_STORE = 'feature_store.sqlite'
+SPOTIFY = 'spotify'
+SPOTIFY_AGG = 'spotify_agg'
+RYM = 'rym'
+VARIANT_GROUPS = {FLATTEN: [SPOTIFY, RYM], AGG_FLATTEN: [SPOTIFY_AGG, RYM]}
+"""Feature store saved in output directory, its groups of features, and groups which joined in this order give
+features of album-level variants (e.g. np.hstack of SPOTIFY and RYM vectors is a row of FLATTEN dataset)."""
+
+
+@dataclass
+class GroupedFeatures:
+    """
+    Spotify and RYM features sorted and grouped by album once, shared by all dataset variants.
+
+    Attributes:
+        album_ids: Sorted ids of albums with Spotify features.
+        offsets: Offsets of albums tracks in values.
+        song_numbers: Song number of each track.
+        values: Float32 Spotify features of tracks of shape (tracks, features), ordered album by album.
+        feature_names: Names of Spotify features.
+        rym_album_ids: Ids of albums with RYM features.
+        rym_values: Float32 RYM features of shape (rym albums, features).
+        rym_labels: Rating class of each RYM album.
+        rym_feature_names: Names of RYM features.
+        tensor: Album tensor saved by feature selection, used for flatten variant if given.
+    """
+
+    album_ids: np.ndarray
+    offsets: np.ndarray
+    song_numbers: np.ndarray
+    values: np.ndarray
+    feature_names: list[str]
+    rym_album_ids: np.ndarray
+    rym_values: np.ndarray
+    rym_labels: np.ndarray
+    rym_feature_names: list[str]
+    tensor: Optional[AlbumTensor] = None
+
 
 class FinalizeDataProcessor:
     """
-    This class contains methods to merge processed data to various variants 
-    of final dataset.
+    This class contains methods to merge processed data to various variants
+    of final dataset. Each variant is saved as FeatureMatrix (see load_feature_matrix()).
     """
 
     def __init__(
             self,
             rym_rating_path: str,
             spotify_features: str,
-            output_dir: str
+            output_dir: str,
+            years: Optional[storage.Years] = None,
+            spotify_tensor_path: Optional[str] = None
     ):
-        self.df_rym_ratings = pd.read_csv(rym_rating_path)
-        self.df_spotify_features = pd.read_csv(spotify_features)
-
-        self._spotify_cols = self.df_spotify_features.columns.drop([c.ALBUM_ID, c.SONG_NUMBER]).tolist()
-        self._rym_cols = self.df_rym_ratings.columns.drop([c.ALBUM_ID, c.RATING]).tolist()
+        """
+        Args:
+            rym_rating_path: Input file or dataset with RYM features.
+            spotify_features: Input file or dataset with Spotify features.
+            output_dir: Output directory for final datasets.
+            years: Range of release years to read from partitioned inputs, all if None.
+            spotify_tensor_path: Album tensor saved by SpotifyFeatureSelection. If given,
+                flatten dataset is built from it instead of regrouping Spotify features.
+        """
 
+        self.df_rym_ratings = storage.read_frame(
+            rym_rating_path, schemas.RYM_FEATURE_SCHEMA, default_dtype=schemas.GENRE_DTYPE, years=years)
+        self.df_spotify_features = storage.read_frame(spotify_features, schemas.SPOTIFY_FEATURE_SCHEMA, years=years)
+        self.spotify_tensor = AlbumTensor.load(spotify_tensor_path) if spotify_tensor_path is not None else None
         self.output_dir = output_dir
-        for subdir in ['flatten', 'agg_flatten', 'single']:
-            subdir_path = os.path.join(output_dir, subdir)
-            if not os.path.exists(subdir_path):
-                os.makedirs(subdir_path)
+        self._grouped: Optional[GroupedFeatures] = None
 
-    def finalize_to_flatten(self):
+    def finalize_all(
+            self,
+            variants: Optional[list[str]] = None,
+            fmt: str = NPY,
+            processes: Optional[int] = None,
+            stats: list[str] = AGG_STATS
+    ):
+        """
+        Save given variants of final dataset. Features are sorted and grouped by album once
+        and every variant is derived from the same grouped arrays.
+
+        Args:
+            variants: Variants to save (see VARIANTS), all if None.
+            fmt: Output format of every variant (see FeatureMatrix.save()).
+            processes: Number of processes building variants in parallel, variants are built
+                one by one in this process if None.
+            stats: Statistics of agg_flatten variant (see aggregate_segments()).
         """
-        ...
+
+        variants = VARIANTS if variants is None else variants
+        assert all(variant in VARIANTS for variant in variants), f'Unknown variant, expected one of: {VARIANTS}.'
+
+        grouped = self.group_features()
+        if processes is None or len(variants) < 2:
+            datasets = [build_variant(grouped, variant, stats) for variant in variants]
+        else:
+            with ProcessPoolExecutor(min(processes, len(variants))) as executor:
+                n = len(variants)
+                datasets = list(executor.map(build_variant, [grouped] * n, variants, [stats] * n))
+
+        metrics.add_rows(rows_in=len(self.df_spotify_features), rows_out=sum(len(ds.features) for ds in datasets))
+        for variant, dataset in zip(variants, datasets):
+            dataset.save(os.path.join(self.output_dir, variant), fmt)
+            print(f'{variant}: saved {dataset.features.shape}.')
+
+    def finalize_to_flatten(self, fmt: str = NPY):
         """
+        Save dataset with one row per album: features of its tracks flattened track by track and its RYM features.
+        """
+
+        self.finalize_all([FLATTEN], fmt)
+
+    def finalize_to_aggregated(self, stats: list[str] = AGG_STATS, fmt: str = NPY):
+        """
+        Save dataset with one row per album: statistics of its tracks features and its RYM features.
+
+        Args:
+            stats: Statistics of tracks features (see aggregate_segments()), e.g. ['mean', 'std', 'p10', 'skew'].
+            fmt: Output format.
+        """
+
+        self.finalize_all([AGG_FLATTEN], fmt, stats=stats)
+
+    def finalize_to_single(self, fmt: str = NPY):
+        """
+        Save dataset with one row per track: its features and RYM features of its album.
+        """
+
+        self.finalize_all([SINGLE], fmt)
+
+    def save_feature_store(self, path: Optional[str] = None, stats: list[str] = AGG_STATS):
+        """
+        Save Spotify features flattened track by track (SPOTIFY), their statistics (SPOTIFY_AGG) and RYM features
+        (RYM) of each album to FeatureStore, for scoring albums one by one without loading final datasets.
+        Albums are the same as in album-level variants.
+
+        Args:
+            path: Output file, FEATURE_STORE in output directory if None.
+            stats: Statistics of SPOTIFY_AGG features, the same as of agg_flatten variant.
+        """
+
+        path = os.path.join(self.output_dir, FEATURE_STORE) if path is None else path
+        grouped = self.group_features()
+
+        album_ids = grouped.rym_album_ids
+        found = np.ones(len(album_ids), dtype=bool)
+        positions, feature_names = {}, {}
+        spotify_vectors = {}
+        for group, variant in [(SPOTIFY, FLATTEN), (SPOTIFY_AGG, AGG_FLATTEN)]:
+            ids, spotify_vectors[group], feature_names[group] = spotify_album_vectors(grouped, variant, stats)
+            positions[group] = pd.Index(np.asarray(ids, dtype=object)).get_indexer(album_ids)
+            found &= positions[group] >= 0
 
-        # Flatten spotify
-        grouped_spotify = self.df_spotify_features.groupby(c.ALBUM_ID).apply(
-            lambda row: row[self._spotify_cols].values.flatten().tolist()
-        ).reset_index()
-        grouped_spotify['features_spotify'] = grouped_spotify[0]
-        print('flatten: spotify grouped.')
-
-        # Flatten rym
-        grouped_rym = self.df_rym_ratings.groupby(c.ALBUM_ID).apply(
-            lambda row: row[self._rym_cols].values.flatten().tolist()
-        ).reset_index()
-        grouped_rym['features_rym'] = grouped_rym[0]
-        print('flatten: rym grouped.')
-
-        # Finalize
-        flatten_df = (
-            self.df_rym_ratings[[c.ALBUM_ID, c.RATING]]
-            .merge(grouped_rym, on=c.ALBUM_ID)
-            .merge(grouped_spotify, on=c.ALBUM_ID))
-        flatten_df[c.FEATURE] = flatten_df['features_spotify'] + flatten_df['features_rym']
-
-        spotify_cols = [f'{name}{i // len(self._spotify_cols)}' for i, name in enumerate(self._spotify_cols * 16)]
-        feature_names = spotify_cols + self._rym_cols
-
-        self._save(flatten_df[[c.ALBUM_ID, c.FEATURE, c.RATING]], feature_names, 'flatten')
-
-    def finalize_to_aggregated(self):
-        df = self.df_spotify_features
-        df_agg_mean = df.groupby(c.ALBUM_ID).mean()
-        df_agg_min = df.groupby(c.ALBUM_ID).min()
-        df_agg_max = df.groupby(c.ALBUM_ID).max()
-        df_agg_std = df.groupby(c.ALBUM_ID).std()
-
-        df1 = df_agg_mean
-        df2 = df1.merge(df_agg_min, suffixes=['_mean', '_min'], on=c.ALBUM_ID)
-        df3 = df2.merge(df_agg_max, suffixes=['', '_max'], on=c.ALBUM_ID)
-        df4 = df3.merge(df_agg_std, suffixes=['_max', '_std'], on=c.ALBUM_ID).reset_index()
-        spotify_cols = df4.columns
-        spotify_cols.drop([c.ALBUM_ID])
-        df4['features_spotify'] = df4.apply(lambda row: [row[col] for col in df4.columns if col != c.ALBUM_ID], axis=1)
-
-
-        # Flatten rym
-        grouped_rym = self.df_rym_ratings.groupby(c.ALBUM_ID).apply(
-            lambda row: row[self._rym_cols].values.flatten().tolist()
-        ).reset_index()
-        grouped_rym['features_rym'] = grouped_rym[0]
-        print('flatten: rym grouped.')
-
-        # Finalize
-        flatten_df = (
-            self.df_rym_ratings[[c.ALBUM_ID, c.RATING]]
-            .merge(grouped_rym, on=c.ALBUM_ID)
-            .merge(df4, on=c.ALBUM_ID))
-        flatten_df[c.FEATURE] = flatten_df['features_spotify'] + flatten_df['features_rym']
-        # spotify_cols = flatten_df.columns
-
-        feature_names = list(spotify_cols) + list(self._rym_cols)
-
-        self._save(flatten_df[[c.ALBUM_ID, c.FEATURE, c.RATING]], feature_names, 'agg_flatten')
-
-    def finalize_to_single(self):
+        vectors = {group: values[positions[group][found]] for group, values in spotify_vectors.items()}
+        vectors[RYM] = grouped.rym_values[found]
+        feature_names[RYM] = grouped.rym_feature_names
+
+        FeatureStore.write(path, album_ids[found], vectors, feature_names)
+        metrics.count('feature_store_albums', int(found.sum()))
+        print(f'Feature store: saved {found.sum()} albums to {path}.')
+
+    def group_features(self) -> GroupedFeatures:
         """
-        ...
+        Returns: Features sorted and grouped by album (computed once and reused by every variant).
         """
 
-        # Flatten spotify
-        grouped_spotify = self.df_spotify_features[self._spotify_cols].apply(
-            lambda row: row.tolist(), axis=1
-        ).reset_index()
-        grouped_spotify['features_spotify'] = grouped_spotify[0]
-        grouped_spotify[c.ALBUM_ID] = self.df_spotify_features[c.ALBUM_ID]
-        print('flatten: spotify grouped.')
-
-        # Flatten rym
-        grouped_rym = self.df_rym_ratings[self._rym_cols].apply(
-            lambda row: row.tolist(), axis=1
-        ).reset_index()
-        grouped_rym['features_rym'] = grouped_rym[0]
-        grouped_rym[c.ALBUM_ID] = self.df_rym_ratings[c.ALBUM_ID]
-        print('flatten: rym grouped.')
-
-        # Finalize
-        flatten_df = (
-            self.df_rym_ratings[[c.ALBUM_ID, c.RATING]]
-            .merge(grouped_rym, on=c.ALBUM_ID)
-            .merge(grouped_spotify, on=c.ALBUM_ID, how='right')
-        ).dropna()
-        flatten_df[c.FEATURE] = flatten_df['features_spotify'] + flatten_df['features_rym']
-        spotify_cols = [f'{name}{i // len(self._spotify_cols)}' for i, name in enumerate(self._spotify_cols * 1)]
-        feature_names = spotify_cols + self._rym_cols
-
-        self._save(flatten_df[[c.ALBUM_ID, c.FEATURE, c.RATING]], feature_names, 'single')
-
-    def _save(self, df: pd.DataFrame, feature_names: list[str], subdir: str):
-        path = os.path.join(self.output_dir, subdir)
-
-        df.to_csv(path + '/album_rating.csv', index=False)
-        df.to_parquet(path + '/album_rating.parquet', index=False)
-
-        with open(path + '/album_rating_feature_names.json', 'w') as json_file:
-            json.dump(feature_names, json_file)
-
-
-    # def merge_to_features_in_list(self, path: str):
-    #     """Aggregate feature to list to one column called 'feature'."""
-    #
-    #     df_merged_features = self.df_rym_ratings.merge(self.df_spotify_features, on='album_id', how='inner')
-    #
-    #     # Cast features in string to the list
-    #     df_merged_features['feature'] = df_merged_features['feature'].apply(lambda x: ast.literal_eval(x))
-    #
-    #     # Save to csv
-    #     df_merged_features[['feature', 'rating']].to_csv(path + '.csv', index=False)
-    #     df_merged_features[['feature', 'rating']].to_parquet(path + '.parquet', index=False)
+        if self._grouped is None:
+            self._grouped = group_features(self.df_rym_ratings, self.df_spotify_features, self.spotify_tensor)
+        return self._grouped
+
+
+# Functions
+
+def group_features(
+        df_rym_ratings: pd.DataFrame,
+        df_spotify_features: pd.DataFrame,
+        spotify_tensor: Optional[AlbumTensor] = None
+) -> GroupedFeatures:
+    """
+    Sort and group features by album.
+
+    Args:
+        df_rym_ratings: RYM features (see RymFeatureSelection).
+        df_spotify_features: Padded Spotify features, one row per track (see SpotifyFeatureSelection).
+        spotify_tensor: Album tensor of the same Spotify features, used for flatten variant if given.
+
+    Returns:
+        Grouped features shared by all dataset variants.
+    """
+
+    spotify_cols = df_spotify_features.columns.drop([c.ALBUM_ID, c.SONG_NUMBER]).tolist()
+    rym_cols = df_rym_ratings.columns.drop([c.ALBUM_ID, c.RATING]).tolist()
+
+    # Stable sort keeps order of tracks within albums, which are already padded and ordered.
+    codes, album_ids = pd.factorize(df_spotify_features[c.ALBUM_ID], sort=True)
+    order = np.argsort(codes, kind='stable')
+
+    return GroupedFeatures(
+        album_ids=np.asarray(album_ids, dtype=object),
+        offsets=album_offsets(codes[order]),
+        song_numbers=df_spotify_features[c.SONG_NUMBER].to_numpy(dtype=np.float32)[order],
+        values=df_spotify_features[spotify_cols].to_numpy(dtype=np.float32)[order],
+        feature_names=spotify_cols,
+        rym_album_ids=df_rym_ratings[c.ALBUM_ID].to_numpy(dtype=object),
+        rym_values=df_rym_ratings[rym_cols].to_numpy(dtype=np.float32),
+        rym_labels=df_rym_ratings[c.RATING].to_numpy(),
+        rym_feature_names=rym_cols,
+        tensor=spotify_tensor,
+    )
+
+
+def build_variant(grouped: GroupedFeatures, variant: str, stats: list[str] = AGG_STATS) -> FeatureMatrix:
+    """
+    Build variant of final dataset from grouped features.
+
+    Args:
+        grouped: Features grouped by album (see group_features()).
+        variant: FLATTEN, AGG_FLATTEN or SINGLE.
+        stats: Statistics of AGG_FLATTEN variant.
+
+    Returns:
+        Final dataset.
+    """
+
+    if variant in [FLATTEN, AGG_FLATTEN]:
+        return _join_albums(grouped, *spotify_album_vectors(grouped, variant, stats))
+
+    if variant == SINGLE:
+        positions = pd.Index(grouped.rym_album_ids).get_indexer(grouped.album_ids)
+        track_positions = np.repeat(positions, np.diff(grouped.offsets))
+        found = track_positions >= 0
+        rym_rows = track_positions[found]
+
+        return FeatureMatrix(
+            features=np.hstack([grouped.values[found], grouped.rym_values[rym_rows]]),
+            labels=grouped.rym_labels[rym_rows],
+            album_ids=grouped.rym_album_ids[rym_rows],
+            feature_names=[f'{name}0' for name in grouped.feature_names] + grouped.rym_feature_names,
+        )
+
+    raise ValueError(f'Unknown variant {variant}, expected one of: {VARIANTS}.')
+
+
+def spotify_album_vectors(
+        grouped: GroupedFeatures,
+        variant: str,
+        stats: list[str] = AGG_STATS
+) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    """
+    Build album-level Spotify features of variant from grouped features.
+
+    Args:
+        grouped: Features grouped by album (see group_features()).
+        variant: FLATTEN (tracks features flattened track by track) or AGG_FLATTEN (statistics of tracks features).
+        stats: Statistics of AGG_FLATTEN variant.
+
+    Returns:
+        Album ids, Spotify features matrix with one row per album and names of its columns.
+    """
+
+    if variant == FLATTEN:
+        tensor = grouped.tensor
+        if tensor is None:
+            max_len = int(np.diff(grouped.offsets).max(initial=0))
+            features, mask, _ = pad_sequences(grouped.values, grouped.offsets, max_len)
+            tensor = AlbumTensor(grouped.album_ids, features, mask, grouped.feature_names)
+        return tensor.album_ids, tensor.flatten(), tensor.flatten_feature_names()
+
+    if variant == AGG_FLATTEN:
+        # Song number statistics are kept to match features of previous dataset versions.
+        values = np.hstack([grouped.song_numbers[:, None], grouped.values])
+        agg_values, agg_names = aggregate_segments(
+            values, grouped.offsets, [c.SONG_NUMBER] + grouped.feature_names, stats)
+        return grouped.album_ids, agg_values, agg_names
+
+    raise ValueError(f'Variant {variant} has no album-level features, expected {FLATTEN} or {AGG_FLATTEN}.')
+
+
+def _join_albums(
+        grouped: GroupedFeatures,
+        album_ids: np.ndarray,
+        spotify_values: np.ndarray,
+        spotify_names: list[str]
+) -> FeatureMatrix:
+    """
+    Join album-level Spotify features with RYM features of the same albums, in order of RYM albums.
+
+    Args:
+        grouped: Grouped features with RYM features.
+        album_ids: Album id of each row of spotify_values.
+        spotify_values: Spotify features matrix with one row per album.
+        spotify_names: Names of spotify_values columns.
+
+    Returns:
+        Final dataset of albums present in both inputs.
+    """
+
+    positions = pd.Index(np.asarray(album_ids, dtype=object)).get_indexer(grouped.rym_album_ids)
+    found = positions >= 0
+
+    return FeatureMatrix(
+        features=np.hstack([spotify_values[positions[found]], grouped.rym_values[found]]),
+        labels=grouped.rym_labels[found],
+        album_ids=grouped.rym_album_ids[found],
+        feature_names=list(spotify_names) + grouped.rym_feature_names,
+    )
 
 
 if __name__ == "__main__":
     START_YEAR = 1965
     END_YEAR = 2022
+    YEARS = (START_YEAR, END_YEAR)
 
     finalizer = FinalizeDataProcessor(
-        rym_rating_path=f'{PROJECT_DIR}/data/feature/rym_{START_YEAR}_{END_YEAR}.csv',
-        spotify_features=f'{PROJECT_DIR}/data/feature/spotify_{START_YEAR}_{END_YEAR}.csv',
-        output_dir=f'{PROJECT_DIR}/data/final/'
+        rym_rating_path=dataset_path(f'{PROJECT_DIR}/data/feature/rym', YEARS),
+        spotify_features=dataset_path(f'{PROJECT_DIR}/data/feature/spotify', YEARS),
+        output_dir=f'{PROJECT_DIR}/data/final/',
+        years=YEARS,
+        spotify_tensor_path=album_tensor_path(dataset_path(f'{PROJECT_DIR}/data/feature/spotify', YEARS))
     )
 
-    finalizer.finalize_to_aggregated()
+    finalizer.finalize_all()
+    finalizer.save_feature_store()
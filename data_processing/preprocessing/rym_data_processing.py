@@ -4,6 +4,7 @@ import ast
 
 import shared_utils.columns as c
 
+from shared_utils import metrics, schemas, storage
 from shared_utils.columns import RYM_COLS
 from shared_utils.utils import PROJECT_DIR
 from data_processing.preprocessing.genre_mapper import GenreMapper
@@ -15,7 +16,7 @@ class RymDataProcessor:
     Attributes:
         MINIMUM_RATE_NUMBER: Minimum number of ratings required to save record.
         _input_df: Read dataframe from input_path with fetched data.
-        _output_path: Filepath of the output CSV file to save the processed data to.
+        _output_path: Path of the output (CSV file or year-partitioned dataset) to save the processed data to.
     """
 
     MINIMUM_RATE_NUMBER = 50
@@ -24,10 +25,10 @@ class RymDataProcessor:
         """
         Args:
             input_path: Filepath of the input CSV file containing the fetched rym data.
-            output_path: Filepath of the output CSV file to save the processed data to.
+            output_path: Path of the output (CSV file or year-partitioned dataset) to save the processed data to.
         """
 
-        self._input_df = pd.read_csv(input_path)
+        self._input_df = schemas.read_csv(input_path, schemas.RYM_RAW_SCHEMA)
         self._input_df.dropna(inplace=True)
         self._output_path = output_path
 
@@ -35,7 +36,7 @@ class RymDataProcessor:
 
     def process(self) -> None:
         """
-        Process read data from input_path and stores in CSV at output_path.
+        Process read data from input_path and stores it at output_path.
         1. Convert the date column to YYYY-mm-dd format.
         2. Drop duplicates and keep the last entry for each artist and album.
         3. Convert the ratings_number column to integer.
@@ -57,7 +58,8 @@ class RymDataProcessor:
             )
         )
 
-        df.to_csv(self._output_path, index=False)
+        storage.write_frame(df, self._output_path, schemas.RYM_PROCESSED_SCHEMA)
+        metrics.add_rows(rows_in=len(self._input_df), rows_out=len(df))
 
     def _date_convert(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -1,9 +1,13 @@
+import os
+import tempfile
 import pandas as pd
 import shared_utils.columns as c
 
-from shared_utils.utils import create_logger, MIN_TEMPO, MAX_TEMPO, MAX_DURATION_MS, MIN_TIME_SIGNATURE, \
-    MAX_DANCEABILITY, MAX_ENERGY, MAX_KEY, MIN_LOUDNESS, VALID_MODES, MAX_SPEECHINESS, MAX_ACOUSTICNESS, \
-    MAX_INSTRUMENTALNESS, MAX_LIVENESS, MAX_VALENCE, MIN_DURATION_MS, MAX_TIME_SIGNATURE, MEDIAN_TIME_SIGNATURE
+from typing import Optional
+
+from shared_utils import metrics, schemas, storage
+from shared_utils.feature_rules import SPOTIFY_FEATURE_RULES, apply_feature_rules
+from shared_utils.utils import create_logger
 from shared_utils.columns import SPOTIFY_SEARCH_COLS, SPOTIFY_RAW_FEATURES
 
 
@@ -15,25 +19,50 @@ class SpotifyDataProcessor:
         search_result_filepath (str): The file path to the csv file containing the search results for albums.
         track_ids_filepath (str): The file path to the csv file containing the track ids and corresponding album ids.
         track_features_filepath (str): The file path to the csv file containing the track feature.
-        search_result_output_filepath (str): The file path to save the processed search results.
-        track_features_output_filepath (str): The file path to save the processed track feature.
+        search_result_output_filepath (str): The path (CSV file or year-partitioned dataset) to save the
+            processed search results.
+        track_features_output_filepath (str): The path (CSV file or year-partitioned dataset) to save the
+            processed track feature.
+        chunk_size (Optional[int]): If given, the track feature file is streamed in chunks of this many rows
+            instead of being loaded into memory at once.
+        num_partitions (int): Number of album_id hash partitions used to spill merged feature in chunked mode.
+        release_years (Optional[pd.Series]): Release years indexed by album id, used to partition outputs.
+        max_tracks (Optional[int]): Maximum number of tracks with feature kept for each album, all tracks
+            are kept if None (e.g. for ragged features used by variable-length models).
+
+    Attributes:
+        MIN_ALBUM_FEATURES: Minimum number of tracks with feature required to keep an album.
+        MAX_ALBUM_FEATURES: Default maximum number of tracks with feature kept for each album.
     """
 
+    MIN_ALBUM_FEATURES = 4
+    MAX_ALBUM_FEATURES = 16
+
     def __init__(
             self,
             search_result_filepath: str,
             track_ids_filepath: str,
             track_features_filepath: str,
             search_result_output_filepath: str,
-            track_features_output_filepath: str
+            track_features_output_filepath: str,
+            chunk_size: Optional[int] = None,
+            num_partitions: int = 16,
+            release_years: Optional[pd.Series] = None,
+            max_tracks: Optional[int] = MAX_ALBUM_FEATURES
     ):
         self._logger = create_logger('SpotifyDataProcessor')
         self._search_result_output_filepath = search_result_output_filepath
         self._track_features_output_filepath = track_features_output_filepath
+        self._track_features_filepath = track_features_filepath
+        self._chunk_size = chunk_size
+        self._num_partitions = num_partitions
+        self._release_years = release_years
+        self._max_tracks = max_tracks
 
-        self._df_search = pd.read_csv(search_result_filepath)
-        self._df_track_ids = pd.read_csv(track_ids_filepath)
-        self._df_features = pd.read_csv(track_features_filepath)
+        self._df_search = schemas.read_csv(search_result_filepath, schemas.SPOTIFY_SEARCH_SCHEMA)
+        self._df_track_ids = schemas.read_csv(track_ids_filepath, schemas.SPOTIFY_TRACKS_IDS_SCHEMA)
+        if chunk_size is None:
+            self._df_features = schemas.read_csv(track_features_filepath, schemas.SPOTIFY_RAW_FEATURES_SCHEMA)
 
     def process_and_save(self):
         """
@@ -44,39 +73,122 @@ class SpotifyDataProcessor:
         2. Save processed search result and merged tracks ids with feature.
         """
 
+        if self._chunk_size is not None:
+            self._process_and_save_in_chunks()
+            return
+
         self._logger.info(f'Features size before clean: {self._df_features.shape}')
+        metrics.add_rows(rows_in=len(self._df_features))
         self._logger.info(f'Track ids size before clean: {self._df_track_ids.shape}')
         self._logger.info(f'Album search size before clean: {self._df_search.shape}')
 
         self._df_search, self._df_features = self.process_features_and_search_results(
             self._df_search,
             self._df_track_ids,
-            self._df_features
+            self._df_features,
+            self._max_tracks
         )
 
         self._logger.info(f'Album search size after feature: {self._df_search.shape}')
         self._logger.info(f'Features size after feature: {self._df_features.shape}')
 
-        self._df_search.to_csv(self._search_result_output_filepath, index=False)
-        self._df_features.to_csv(self._track_features_output_filepath, index=False)
+        storage.write_frame(self._df_search, self._search_result_output_filepath,
+                            schemas.SPOTIFY_ALBUM_PROCESSED_SCHEMA, self._release_years)
+        storage.write_frame(self._df_features, self._track_features_output_filepath,
+                            schemas.SPOTIFY_TRACKS_PROCESSED_SCHEMA, self._release_years)
+        metrics.add_rows(rows_out=len(self._df_features))
+
+    def _process_and_save_in_chunks(self):
+        """
+        Out-of-core variant of process_and_save() with memory bounded by chunk and partition size.
+
+        1. Read track feature in chunks, clean each chunk and merge it with in-memory track ids.
+        2. Spill merged chunks to temporary files partitioned by album_id hash,
+           so all tracks of an album end up in the same partition.
+        3. Select albums and their top tracks partition by partition and append them to output file.
+        4. Clean search results based on numbers of saved tracks of albums.
+        """
+
+        self._logger.info(f'Track ids size before clean: {self._df_track_ids.shape}')
+        self._logger.info(f'Album search size before clean: {self._df_search.shape}')
+
+        df_tracks = self._df_track_ids.drop_duplicates(subset=[c.SONG_ID])
+        # Only numbers of saved tracks of albums are kept in memory (albums never span partitions).
+        saved_counts: list[pd.Series] = []
+        storage.remove_frame(self._track_features_output_filepath, self._output_years())
+        with tempfile.TemporaryDirectory() as spill_dir:
+            chunks = schemas.read_csv(
+                self._track_features_filepath, schemas.SPOTIFY_RAW_FEATURES_SCHEMA, chunksize=self._chunk_size)
+            for chunk in chunks:
+                metrics.add_rows(rows_in=len(chunk))
+                chunk = self.clear_tracks_features(chunk).merge(df_tracks, on=c.SONG_ID)
+                self._spill_by_album_partition(chunk, spill_dir)
+
+            for filename in sorted(os.listdir(spill_dir)):
+                # Duplicated tracks from different chunks always belong to the same album and partition.
+                df = schemas.read_csv(os.path.join(spill_dir, filename), schemas.SPOTIFY_TRACKS_PROCESSED_SCHEMA)
+                df = df.drop_duplicates(subset=[c.SONG_ID])
+                df = self.remove_albums_with_not_enough_features(df, self.MIN_ALBUM_FEATURES)
+                if self._max_tracks is not None:
+                    df = self.select_top_n_features(df, self._max_tracks, c.SONG_NUMBER)
+
+                storage.write_frame(df, self._track_features_output_filepath, schemas.SPOTIFY_TRACKS_PROCESSED_SCHEMA,
+                                    self._release_years, append=True)
+                saved_counts.append(df.groupby(c.ALBUM_ID).size())
+                metrics.add_rows(rows_out=len(df))
+
+        # No partitions are spilled if features are empty or all tracks are removed.
+        features_num = pd.concat(saved_counts) if saved_counts else pd.Series([], dtype='int64')
+        self._df_search = self._clear_search_results_by_counts(
+            self._df_search, df_tracks.groupby(c.ALBUM_ID).size(), features_num)
+
+        self._logger.info(f'Album search size after feature: {self._df_search.shape}')
+        self._logger.info(f'Features size after feature: {features_num.sum()} rows')
+
+        storage.write_frame(self._df_search, self._search_result_output_filepath,
+                            schemas.SPOTIFY_ALBUM_PROCESSED_SCHEMA, self._release_years)
+
+    def _output_years(self) -> list[int]:
+        """Returns: Release years of partitions written by this processor."""
+
+        if self._release_years is None:
+            return [storage.UNKNOWN_YEAR]
+        return sorted(set(self._release_years.astype(int)) | {storage.UNKNOWN_YEAR})
+
+    def _spill_by_album_partition(self, df: pd.DataFrame, spill_dir: str):
+        """
+        Append rows of dataframe to partition files in spill_dir based on album_id hash.
+
+        Args:
+            df: Merged track feature and track ids dataframe.
+            spill_dir: Directory for partition files.
+        """
+
+        partitions = pd.util.hash_pandas_object(df[c.ALBUM_ID], index=False).to_numpy() % self._num_partitions
+        for partition, df_partition in df.groupby(partitions):
+            path = os.path.join(spill_dir, f'partition_{partition:04d}.csv')
+            schemas.to_csv(df_partition, path, schemas.SPOTIFY_TRACKS_PROCESSED_SCHEMA,
+                           mode='a', header=not os.path.exists(path))
 
     @staticmethod
     def process_features_and_search_results(
             df_search: pd.DataFrame,
             df_tracks: pd.DataFrame,
-            df_features: pd.DataFrame
+            df_features: pd.DataFrame,
+            max_tracks: Optional[int] = MAX_ALBUM_FEATURES
     ) -> tuple[pd.DataFrame, pd.DataFrame]:
         """
         1. Clean feature and cut outliers.
         2. Merge feature with tracks.
         3. Clean albums search data.
-        4. Select first 16 feature for each album.
+        4. Select first max_tracks feature for each album.
         5. Select albums with enough amount of feature.
 
         Args:
             df_search: The input dataframe with search results for albums.
             df_tracks: The input dataframe with track ids and corresponding album ids.
             df_features: The input dataframe with track feature.
+            max_tracks: Maximum number of tracks kept for each album, all if None.
 
         Returns:
             A tuple of cleaned search results and merged track feature dataframes.
@@ -85,8 +197,10 @@ class SpotifyDataProcessor:
         df_tracks = df_tracks.drop_duplicates(subset=[c.SONG_ID])
         df_features = SpotifyDataProcessor.clear_tracks_features(df_features)
         df_features = df_features.merge(df_tracks, on=c.SONG_ID)
-        df_features = SpotifyDataProcessor.remove_albums_with_not_enough_features(df_features, 4)
-        df_features = SpotifyDataProcessor.select_top_n_features(df_features, 16, c.SONG_NUMBER)
+        df_features = SpotifyDataProcessor.remove_albums_with_not_enough_features(
+            df_features, SpotifyDataProcessor.MIN_ALBUM_FEATURES)
+        if max_tracks is not None:
+            df_features = SpotifyDataProcessor.select_top_n_features(df_features, max_tracks, c.SONG_NUMBER)
         df_search = SpotifyDataProcessor.clear_search_results(df_search, df_tracks, df_features)
 
         return df_search, df_features
@@ -94,7 +208,8 @@ class SpotifyDataProcessor:
     @staticmethod
     def clear_tracks_features(df_features: pd.DataFrame) -> pd.DataFrame:
         """
-        Remove outliers from the track feature dataframe.
+        Remove outliers from the track feature dataframe. Outliers are clamped or
+        dropped based on rules from SPOTIFY_FEATURE_RULES in a single pass.
 
         Args:
             df_features: The input dataframe with Spotify track feature.
@@ -105,8 +220,11 @@ class SpotifyDataProcessor:
         assert all(col in df_features.columns for col in SPOTIFY_RAW_FEATURES), 'Input is missing feature columns.'
 
         df = SpotifyDataProcessor._prepare_df(df_features)
-        df = SpotifyDataProcessor._replace_outliers(df)
-        df = SpotifyDataProcessor._cut_outliers(df)
+        df, rule_metrics = apply_feature_rules(df, SPOTIFY_FEATURE_RULES)
+        create_logger('SpotifyDataProcessor').info(f'Tracks dropped by feature rules: {rule_metrics}')
+        # Counted per call, so chunked processing reports totals of all chunks.
+        for name, dropped in rule_metrics.items():
+            metrics.count(f'feature_rule_dropped/{name}', dropped)
 
         return df
 
@@ -123,48 +241,6 @@ class SpotifyDataProcessor:
         """
         return df.dropna().drop_duplicates(subset=[c.SONG_ID]).round(4)
 
-    @staticmethod
-    def _replace_outliers(df: pd.DataFrame) -> pd.DataFrame:
-        """
-        Replace outlier values in the dataframe with certain min and max.
-
-        Args:
-            df: The input dataframe with Spotify track feature.
-
-        Returns:
-            Copy of input dataframe with outlier values replaced.
-        """
-        df.loc[df[c.TEMPO] < MIN_TEMPO, c.TEMPO] = MIN_TEMPO
-        df.loc[df[c.TEMPO] > MAX_TEMPO, c.TEMPO] = MAX_TEMPO
-        df.loc[df[c.DURATION_MS] > MAX_DURATION_MS, c.DURATION_MS] = MAX_DURATION_MS
-        df.loc[df[c.TIME_SIGNATURE] < MIN_TIME_SIGNATURE, c.TIME_SIGNATURE] = MEDIAN_TIME_SIGNATURE
-        return df
-
-    @staticmethod
-    def _cut_outliers(df: pd.DataFrame) -> pd.DataFrame:
-        """
-        Remove outliers from the dataframe based on certain min and max values.
-
-        Args:
-            df: The input dataframe with Spotify track feature.
-
-        Returns:
-            Copy of input dataframe with outliers removed.
-        """
-        df = df[df[c.DANCEABILITY].between(0, MAX_DANCEABILITY, inclusive='neither')]
-        df = df[df[c.ENERGY].between(0, MAX_ENERGY)]
-        df = df[df[c.KEY].between(0, MAX_KEY)]
-        df = df[df[c.LOUDNESS].between(MIN_LOUDNESS, 0, inclusive='left')]
-        df = df[df[c.MODE].isin(VALID_MODES)]
-        df = df[df[c.SPEECHINESS].between(0, MAX_SPEECHINESS, inclusive='neither')]
-        df = df[df[c.ACOUSTICNESS].between(0, MAX_ACOUSTICNESS)]
-        df = df[df[c.INSTRUMENTALNESS].between(0, MAX_INSTRUMENTALNESS)]
-        df = df[df[c.LIVENESS].between(0, MAX_LIVENESS)]
-        df = df[df[c.VALENCE].between(0, MAX_VALENCE)]
-        df = df[df[c.DURATION_MS] >= MIN_DURATION_MS]
-        df = df[df[c.TIME_SIGNATURE].between(MIN_TIME_SIGNATURE, MAX_TIME_SIGNATURE)]
-        return df
-
     @staticmethod
     def remove_albums_with_not_enough_features(df_features: pd.DataFrame, min_features: int) -> pd.DataFrame:
         """
@@ -204,6 +280,9 @@ s
             A new dataframe with the top n feature selected for each group.
         """
 
+        # Apply on empty dataframe returns album ids also as index.
+        if df.empty:
+            return df
         return df.groupby(c.ALBUM_ID, group_keys=False).apply(lambda x: x.nlargest(n, criterion))
 
     @staticmethod
@@ -214,6 +293,31 @@ s
     ) -> pd.DataFrame:
         assert all(col in df_track_ids for col in [c.ALBUM_ID, c.SONG_ID]), 'Input is missing id columns.'
         assert all(col in df_features for col in [c.ALBUM_ID, c.SONG_ID]), 'Input is missing id columns.'
+
+        return SpotifyDataProcessor._clear_search_results_by_counts(
+            df_search,
+            df_track_ids.groupby(c.ALBUM_ID).size(),
+            df_features.groupby(c.ALBUM_ID).size()
+        )
+
+    @staticmethod
+    def _clear_search_results_by_counts(
+            df_search: pd.DataFrame,
+            tracks_num: pd.Series,
+            features_num: pd.Series
+    ) -> pd.DataFrame:
+        """
+        Clean search results and add numbers of tracks and tracks with feature of each album,
+        dropping albums without any.
+
+        Args:
+            df_search: The input dataframe with search results for albums.
+            tracks_num: Number of tracks of each album, indexed by album id.
+            features_num: Number of tracks with feature of each album, indexed by album id.
+
+        Returns:
+            Cleaned search results with NUM_TRACKS and NUM_FEATURES columns.
+        """
         assert all(col in df_search.columns for col in SPOTIFY_SEARCH_COLS), 'Input is missing some columns.'
 
         # Prepare df.
@@ -224,11 +328,11 @@ s
         df = df[df[c.PREC_MATCH] >= 3.]
 
         # Number of tracks per album found in spotify.
-        df_tracks_num = df_track_ids.groupby(c.ALBUM_ID).size().reset_index(name=c.NUM_TRACKS)
+        df_tracks_num = tracks_num.rename_axis(c.ALBUM_ID).reset_index(name=c.NUM_TRACKS)
         df = df.merge(df_tracks_num, how='left', on=[c.ALBUM_ID])
 
         # Number of tracks per album after feature found in spotify.
-        df_features_num = df_features.groupby(c.ALBUM_ID).size().reset_index(name=c.NUM_FEATURES)
+        df_features_num = features_num.rename_axis(c.ALBUM_ID).reset_index(name=c.NUM_FEATURES)
         df = df.merge(df_features_num, how='left', on=[c.ALBUM_ID])
 
         return df.dropna()
@@ -1,111 +1,204 @@
+import argparse
 import os
 
-from data_processing.fetch.genius_api.genius_albym_lyrics_fetcher import GeniusDataFetcher
-from data_processing.fetch.spotify_api.spotify_search_album_fetcher import SpotifySearchAlbumFetcher
-from data_processing.fetch.spotify_api.spotify_track_features_fetcher import SpotifyTrackFeaturesFetcher
-from data_processing.fetch.spotify_api.spotify_track_ids_fetcher import SpotifyTrackIDsFetcher
-from data_processing.preprocessing.finalize_data_processing import FinalizeDataProcessor
-from data_processing.preprocessing.spotify_data_processing import SpotifyDataProcessor
+from typing import Optional
+
+from shared_utils import metrics, profiling, tracing
+from shared_utils.lazy_import import LazyRegistry
+from shared_utils.paths import dataset_path, album_tensor_path, ragged_features_path, transformer_path, Years, \
+    DEFAULT_FORMAT, PARQUET, CSV
+from shared_utils.stage_graph import Stage, StageGraph
 from shared_utils.utils import PROJECT_DIR
-from data_processing.fetch.rym.rym_data_collection import RymFetcher
-from data_processing.preprocessing.rym_data_processing import RymDataProcessor
-
-# Initialize variables before running pipelines.
-STEPS = {
-    'FetchRym': 0,
-    'PreprocessRym': 0,
-    'SearchSpotifyAlbums': 0,
-    'FetchSpotifyTrackIDs': 0,
-    'FetchSpotifyTrackFeatures': 0,
-    'PreprocessSpotify': 0,
-    'FetchGenius': 0,
-    'FinalizeDataset': 1,
-}
 
 START_YEAR = 1980
 END_YEAR = 1980
-
-spotify_client_id = os.getenv('SPOTIFY_CLIENT_ID')
-spotify_client_secret = os.getenv('SPOTIFY_CLIENT_SECRET')
-
-# Paths
-rym_path = f'{PROJECT_DIR}/data/raw/rym/rym_charts.csv'
-rym_processed_path = f'{PROJECT_DIR}/data/processed/rym/rym_charts_{START_YEAR}_{END_YEAR}.csv'
-
-spotify_search_path = f'{PROJECT_DIR}/data/raw/spotify/spotify_search_album_id_{START_YEAR}_{END_YEAR}.csv'
-spotify_track_ids_path = f'{PROJECT_DIR}/data/raw/spotify/spotify_tracks_ids_{START_YEAR}_{END_YEAR}.csv'
-spotify_track_features_path = f'{PROJECT_DIR}/data/raw/spotify/spotify_tracks_feature_{START_YEAR}_{END_YEAR}.csv'
-spotify_processed_track_features_path = f'{PROJECT_DIR}/data/processed/spotify/spotify_tracks_feature_{START_YEAR}_{END_YEAR}.csv'
-spotify_processed_search_path = f'{PROJECT_DIR}/data/processed/spotify/spotify_search_album_id_{START_YEAR}_{END_YEAR}.csv'
-
-genius_stats_path = f'{PROJECT_DIR}/data/raw/genius/genius_stats_{START_YEAR}_{END_YEAR}.csv'
-genius_lyrics_dir = f'{PROJECT_DIR}/data/raw/genius/lyrics_{START_YEAR}_{END_YEAR}'
-
-final_dataset_path = f'{PROJECT_DIR}/data/final/features_rating.csv'
-
-# Run pipeline based on declared steps.
-if __name__ == '__main__':
-    if STEPS['FetchRym']:
-        rym_fetcher = RymFetcher(rym_path)
-        rym_fetcher.fetch(START_YEAR, END_YEAR)
-
-    if STEPS['PreprocessRym']:
-        rym_data_processor = RymDataProcessor(
-            rym_path,
-            rym_processed_path
-        )
-        rym_data_processor.process()
-
-    if STEPS['SearchSpotifyAlbums']:
-        search_fetcher = SpotifySearchAlbumFetcher(
-            spotify_client_id,
-            spotify_client_secret,
-            rym_processed_path,
-            spotify_search_path
-        )
-        search_fetcher.fetch()
-
-    if STEPS['FetchSpotifyTrackIDs']:
-        search_fetcher = SpotifyTrackIDsFetcher(
-            spotify_client_id,
-            spotify_client_secret,
-            spotify_search_path,
-            spotify_track_ids_path
-        )
-        search_fetcher.fetch()
-
-    if STEPS['FetchSpotifyTrackFeatures']:
-        search_fetcher = SpotifyTrackFeaturesFetcher(
-            spotify_client_id,
-            spotify_client_secret,
-            spotify_track_ids_path,
-            spotify_track_features_path
-        )
-        search_fetcher.fetch()
-
-    if STEPS['PreprocessSpotify']:
-        spotify_processor = SpotifyDataProcessor(
+"""Default range of release years to process."""
+
+DEFAULT_STAGES = ['FinalizeDataset']
+"""Stages run by default (with stale stages they depend on)."""
+
+STAGE_REGISTRY = LazyRegistry({
+    'RymFetcher': 'data_processing.fetch.rym.rym_data_collection:RymFetcher',
+    'RymDataProcessor': 'data_processing.preprocessing.rym_data_processing:RymDataProcessor',
+    'SpotifySearchAlbumFetcher':
+        'data_processing.fetch.spotify_api.spotify_search_album_fetcher:SpotifySearchAlbumFetcher',
+    'SpotifyTrackIDsFetcher': 'data_processing.fetch.spotify_api.spotify_track_ids_fetcher:SpotifyTrackIDsFetcher',
+    'SpotifyTrackFeaturesFetcher':
+        'data_processing.fetch.spotify_api.spotify_track_features_fetcher:SpotifyTrackFeaturesFetcher',
+    'SpotifyDataProcessor': 'data_processing.preprocessing.spotify_data_processing:SpotifyDataProcessor',
+    'GeniusDataFetcher': 'data_processing.fetch.genius_api.genius_albym_lyrics_fetcher:GeniusDataFetcher',
+    'SpotifyFeatureSelection': 'data_processing.feature.spotify_feature_selection:SpotifyFeatureSelection',
+    'RymFeatureSelection': 'data_processing.feature.rym_feature_selection:RymFeatureSelection',
+    'FinalizeDataProcessor': 'data_processing.postprocessing.finalize_data_processing:FinalizeDataProcessor',
+    'load_release_years': 'shared_utils.storage:load_release_years',
+})
+"""Classes and functions used by stages, imported only when a stage using them is run (with their dependencies,
+e.g. rymscraper, lyricsgenius or pandas)."""
+
+
+def build_stages(years: Years, fmt: str = DEFAULT_FORMAT) -> list[Stage]:
+    """
+    Declare stages of data pipeline for given range of years. Stages get their classes from STAGE_REGISTRY
+    when they are run, so unused fetchers and their dependencies are never loaded.
+
+    Args:
+        years: Range of release years to process.
+        fmt: Format of processed outputs - year-partitioned parquet datasets or CSV files.
+
+    Returns:
+        Stages of the pipeline.
+    """
+
+    start_year, end_year = years
+    spotify_client_id = os.getenv('SPOTIFY_CLIENT_ID')
+    spotify_client_secret = os.getenv('SPOTIFY_CLIENT_SECRET')
+
+    # Paths
+    rym_path = f'{PROJECT_DIR}/data/raw/rym/rym_charts.csv'
+    rym_processed_path = dataset_path(f'{PROJECT_DIR}/data/processed/rym/rym_charts', years, fmt)
+
+    spotify_search_path = f'{PROJECT_DIR}/data/raw/spotify/spotify_search_album_id_{start_year}_{end_year}.csv'
+    spotify_track_ids_path = f'{PROJECT_DIR}/data/raw/spotify/spotify_tracks_ids_{start_year}_{end_year}.csv'
+    spotify_track_features_path = f'{PROJECT_DIR}/data/raw/spotify/spotify_tracks_feature_{start_year}_{end_year}.csv'
+    spotify_processed_track_features_path = dataset_path(
+        f'{PROJECT_DIR}/data/processed/spotify/spotify_tracks_feature', years, fmt)
+    spotify_processed_search_path = dataset_path(
+        f'{PROJECT_DIR}/data/processed/spotify/spotify_search_album_id', years, fmt)
+
+    genius_stats_path = f'{PROJECT_DIR}/data/raw/genius/genius_stats_{start_year}_{end_year}.csv'
+    genius_lyrics_dir = f'{PROJECT_DIR}/data/raw/genius/lyrics_{start_year}_{end_year}'
+
+    spotify_feature_path = dataset_path(f'{PROJECT_DIR}/data/feature/spotify', years, fmt)
+    # Album tensor, ragged features and fitted transformer are saved next to Spotify features.
+    spotify_tensor_path = album_tensor_path(spotify_feature_path)
+    spotify_feature_outputs = [spotify_feature_path, spotify_tensor_path, ragged_features_path(spotify_feature_path),
+                               transformer_path(spotify_feature_path)]
+    rym_feature_path = dataset_path(f'{PROJECT_DIR}/data/feature/rym', years, fmt)
+    final_dir = f'{PROJECT_DIR}/data/final'
+
+    # Outputs of these stages have the same paths for any range of years (and parquet outputs for any format).
+    params = {'years': [start_year, end_year], 'format': fmt}
+
+    def fetch_rym():
+        STAGE_REGISTRY['RymFetcher'](rym_path).fetch(start_year, end_year)
+
+    def preprocess_rym():
+        STAGE_REGISTRY['RymDataProcessor'](rym_path, rym_processed_path).process()
+
+    def search_spotify_albums():
+        STAGE_REGISTRY['SpotifySearchAlbumFetcher'](
+            spotify_client_id, spotify_client_secret, rym_processed_path, spotify_search_path, years).fetch()
+
+    def fetch_spotify_track_ids():
+        STAGE_REGISTRY['SpotifyTrackIDsFetcher'](
+            spotify_client_id, spotify_client_secret, spotify_search_path, spotify_track_ids_path).fetch()
+
+    def fetch_spotify_track_features():
+        STAGE_REGISTRY['SpotifyTrackFeaturesFetcher'](
+            spotify_client_id, spotify_client_secret, spotify_track_ids_path, spotify_track_features_path).fetch()
+
+    def preprocess_spotify():
+        STAGE_REGISTRY['SpotifyDataProcessor'](
             spotify_search_path,
             spotify_track_ids_path,
             spotify_track_features_path,
             spotify_processed_search_path,
-            spotify_processed_track_features_path
-        )
-        spotify_processor.process_and_save()
+            spotify_processed_track_features_path,
+            release_years=STAGE_REGISTRY['load_release_years'](rym_processed_path, spotify_search_path, years)
+        ).process_and_save()
 
-    if STEPS['FetchGenius']:
-        genius_fetcher = GeniusDataFetcher(
-            spotify_processed_search_path,
-            genius_stats_path,
-            genius_lyrics_dir
-        )
-        genius_fetcher.fetch()
+    def fetch_genius():
+        STAGE_REGISTRY['GeniusDataFetcher'](
+            spotify_processed_search_path, genius_stats_path, genius_lyrics_dir, years).fetch()
 
-    if STEPS['FinalizeDataset']:
-        data_finalizer = FinalizeDataProcessor(
-            rym_processed_path,
-            spotify_processed_search_path,
+    def select_spotify_features():
+        STAGE_REGISTRY['SpotifyFeatureSelection'](
             spotify_processed_track_features_path,
-            genius_stats_path
+            spotify_feature_path,
+            years=years,
+            release_years=STAGE_REGISTRY['load_release_years'](rym_processed_path, spotify_processed_search_path, years)
+        ).run_and_save()
+
+    def select_rym_features():
+        STAGE_REGISTRY['RymFeatureSelection'](
+            rym_processed_path, spotify_processed_search_path, rym_feature_path, years).run_and_save()
+
+    def finalize_dataset():
+        finalizer = STAGE_REGISTRY['FinalizeDataProcessor'](
+            rym_feature_path,
+            spotify_feature_path,
+            final_dir,
+            years=years,
+            spotify_tensor_path=spotify_tensor_path
         )
-        data_finalizer.merge_to_features_in_list(final_dataset_path)
+        finalizer.finalize_all()
+        finalizer.save_feature_store()
+
+    return [
+        Stage('FetchRym', fetch_rym, outputs=[rym_path], params={'years': [start_year, end_year]}),
+        Stage('PreprocessRym', preprocess_rym, inputs=[rym_path], outputs=[rym_processed_path], params=params),
+        Stage('SearchSpotifyAlbums', search_spotify_albums, inputs=[rym_processed_path], outputs=[spotify_search_path]),
+        Stage('FetchSpotifyTrackIDs', fetch_spotify_track_ids,
+              inputs=[spotify_search_path], outputs=[spotify_track_ids_path]),
+        Stage('FetchSpotifyTrackFeatures', fetch_spotify_track_features,
+              inputs=[spotify_track_ids_path], outputs=[spotify_track_features_path]),
+        Stage('PreprocessSpotify', preprocess_spotify,
+              inputs=[rym_processed_path, spotify_search_path, spotify_track_ids_path, spotify_track_features_path],
+              outputs=[spotify_processed_search_path, spotify_processed_track_features_path], params=params),
+        Stage('FetchGenius', fetch_genius,
+              inputs=[spotify_processed_search_path], outputs=[genius_stats_path, genius_lyrics_dir]),
+        Stage('SelectSpotifyFeatures', select_spotify_features,
+              inputs=[spotify_processed_track_features_path, rym_processed_path, spotify_processed_search_path],
+              outputs=spotify_feature_outputs, params=params),
+        Stage('SelectRymFeatures', select_rym_features,
+              inputs=[rym_processed_path, spotify_processed_search_path], outputs=[rym_feature_path], params=params),
+        Stage('FinalizeDataset', finalize_dataset,
+              inputs=[spotify_feature_path, spotify_tensor_path, rym_feature_path], outputs=[final_dir], params=params),
+    ]
+
+
+def parse_args(args: Optional[list[str]] = None) -> argparse.Namespace:
+    stage_names = [stage.name for stage in build_stages((START_YEAR, END_YEAR))]
+
+    parser = argparse.ArgumentParser(
+        description='Run data pipeline stages in dependency order, skipping stages with up to date outputs.')
+    parser.add_argument('--start-year', type=int, default=START_YEAR, help='First release year to process.')
+    parser.add_argument('--end-year', type=int, default=END_YEAR, help='Last release year to process.')
+    parser.add_argument('--stages', nargs='+', choices=stage_names, default=DEFAULT_STAGES, metavar='STAGE',
+                        help=f'Stages to run, with stale stages they depend on. Available: {", ".join(stage_names)}.')
+    parser.add_argument('--only', action='store_true', help='Do not run stages which given stages depend on.')
+    parser.add_argument('--force', action='store_true', help='Run given stages even if their outputs are up to date.')
+    parser.add_argument('--workers', type=int, default=2, help='Maximum number of concurrently running stages.')
+    parser.add_argument('--format', choices=[PARQUET, CSV], default=DEFAULT_FORMAT, help='Format of processed outputs.')
+    parser.add_argument('--dry-run', action='store_true', help='Only print stages which would be run.')
+    parser.add_argument('--metrics-dir', default=f'{PROJECT_DIR}/data/metrics',
+                        help='Directory of JSON-lines reports with metrics of run stages.')
+    profiling.add_profile_arguments(parser, f'{PROJECT_DIR}/data/profiles')
+    return parser.parse_args(args)
+
+
+def main(args: Optional[list[str]] = None):
+    args = parse_args(args)
+    graph = StageGraph(build_stages((args.start_year, args.end_year), args.format))
+
+    if args.dry_run:
+        print('\n'.join(graph.plan(args.stages, args.force, with_upstream=not args.only)) or 'Nothing to run.')
+        return
+
+    report = metrics.start_run(args.metrics_dir, 'pipeline', years=[args.start_year, args.end_year],
+                               stages=args.stages, format=args.format, workers=args.workers)
+    workers = args.workers
+    if profiling.start_profiling_from_args(args, f'pipeline_{report.run_id}') is not None:
+        # Profiles of concurrently running stages would include each other's time.
+        workers = 1
+    try:
+        graph.run(args.stages, args.force, with_upstream=not args.only, workers=workers)
+    finally:
+        tracing.TRACER.dump(report)
+        if os.path.exists(report.path):
+            print(f'Metrics saved to {report.path}.')
+
+
+# Run pipeline, e.g. `python -m data_processing.run_pipeline --start-year 1980 --end-year 1990 --stages FinalizeDataset`
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+import hashlib
+import inspect
+import json
+import os
+import re
+import shutil
+import time
+
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import shared_utils.columns as c
+
+from shared_utils.storage import Years
+from shared_utils.utils import create_logger
+
+# Consts
+
+MANIFEST_FILE = 'manifest.json'
+"""File saved in each complete cache entry."""
+
+_FINGERPRINTS_FILE = 'fingerprints.json'
+"""Hashes of files memoized by their size and modification time, so unchanged files are not read again."""
+
+_PARTITION_REGEX = re.compile(rf'^{c.YEAR}=(-?\d+)$')
+_CHUNK_SIZE = 1 << 20
+
+
+class BuildCache:
+    """
+    Content-addressed cache of stage outputs. Each output is stored in `<cache_dir>/<stage>/<key>`,
+    where key is a hash of the stage inputs content, source code and parameters - so an output is
+    reused while none of them changed, and is built again (under a new key) otherwise.
+
+    Examples:
+    ---------
+    >>> cache = BuildCache(f'{PROJECT_DIR}/data/cache')
+    >>> key = cache.key([input_path], params={'max_len': 16}, code=[SpotifyFeatureSelection], years=YEARS)
+    >>> entry = cache.get('spotify', key)
+    >>> if entry is None:
+    ...     with cache.build('spotify', key) as entry:
+    ...         save_output(entry)
+    """
+
+    def __init__(self, cache_dir: str):
+        """
+        Args:
+            cache_dir: Directory of cache entries.
+        """
+
+        self.cache_dir = cache_dir
+        self._logger = create_logger('BuildCache')
+        self._fingerprints_path = os.path.join(cache_dir, _FINGERPRINTS_FILE)
+        self._fingerprints: dict[str, list] = {}
+        if os.path.exists(self._fingerprints_path):
+            with open(self._fingerprints_path, 'r') as json_file:
+                self._fingerprints = json.load(json_file)
+
+    def key(
+            self,
+            inputs: list[str] = (),
+            params: Optional[dict] = None,
+            code: list = (),
+            dependencies: list[str] = (),
+            years: Optional[Years] = None
+    ) -> str:
+        """
+        Compute key of stage output.
+
+        Args:
+            inputs: Input files or partitioned datasets of the stage.
+            params: Parameters of the stage (JSON serializable).
+            code: Modules, classes or functions the output depends on - their source files are hashed.
+            dependencies: Keys of upstream stages outputs used by the stage.
+            years: Range of release years read by the stage - other partitions of inputs are not hashed.
+
+        Returns:
+            Hex digest of all of above.
+        """
+
+        payload = {
+            'inputs': [self.fingerprint(path, years) for path in inputs],
+            'params': params or {},
+            'code': sorted({self._file_hash(inspect.getsourcefile(obj)) for obj in code}),
+            'dependencies': list(dependencies),
+            'years': list(years) if years is not None else None,
+        }
+        self._save_fingerprints()
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def fingerprint(self, path: str, years: Optional[Years] = None) -> str:
+        """
+        Hash content of file, or manifest of files of a (partitioned) dataset directory.
+
+        Args:
+            path: Path of file or directory.
+            years: Range of release years of partitions (`year=<year>` directories) to hash, all if None.
+
+        Returns:
+            Hex digest of content.
+        """
+
+        assert os.path.exists(path), f'Input {path} does not exist.'
+        if os.path.isfile(path):
+            return self._file_hash(path)
+
+        manifest = []
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if _in_years(d, years))
+            for filename in sorted(files):
+                filepath = os.path.join(root, filename)
+                manifest.append((os.path.relpath(filepath, path), self._file_hash(filepath)))
+        return hashlib.sha256(json.dumps(manifest).encode()).hexdigest()
+
+    def entry_path(self, stage: str, key: str) -> str:
+        return os.path.join(self.cache_dir, stage, key)
+
+    def get(self, stage: str, key: str) -> Optional[str]:
+        """
+        Returns: Directory of complete cache entry of stage output with given key, None if it is missing.
+        """
+
+        entry = self.entry_path(stage, key)
+        manifest_path = os.path.join(entry, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            self._logger.info(f'{stage}: cache miss ({key[:12]}).')
+            return None
+
+        # Modification time of manifest marks last use of entry (see prune()).
+        os.utime(manifest_path)
+        self._logger.info(f'{stage}: cache hit ({key[:12]}).')
+        return entry
+
+    @contextmanager
+    def build(self, stage: str, key: str) -> Iterator[str]:
+        """
+        Context manager yielding temporary directory for stage output. The directory becomes cache entry
+        only if the block completes, so interrupted builds never leave incomplete entries.
+
+        Args:
+            stage: Name of stage.
+            key: Key of the output (see key()).
+
+        Returns:
+            Iterator with directory to save the output to.
+        """
+
+        entry = self.entry_path(stage, key)
+        tmp_dir = f'{entry}.tmp-{os.getpid()}'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        try:
+            yield tmp_dir
+            with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as json_file:
+                json.dump({'stage': stage, 'key': key, 'created': time.time()}, json_file)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp_dir, entry)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self._logger.info(f'{stage}: cached ({key[:12]}).')
+
+    def prune(self, stage: str, keep: int = 1):
+        """Remove all but `keep` most recently used entries of stage."""
+
+        stage_dir = os.path.join(self.cache_dir, stage)
+        if not os.path.exists(stage_dir):
+            return
+
+        entries = [os.path.join(stage_dir, name) for name in os.listdir(stage_dir)]
+        entries = [entry for entry in entries if os.path.exists(os.path.join(entry, MANIFEST_FILE))]
+        entries.sort(key=lambda entry: os.path.getmtime(os.path.join(entry, MANIFEST_FILE)), reverse=True)
+        for entry in entries[keep:]:
+            shutil.rmtree(entry, ignore_errors=True)
+
+    def _file_hash(self, path: str) -> str:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        memo = self._fingerprints.get(path)
+        if memo is not None and memo[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return memo[2]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(_CHUNK_SIZE), b''):
+                digest.update(chunk)
+
+        self._fingerprints[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def _save_fingerprints(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f'{self._fingerprints_path}.tmp-{os.getpid()}'
+        with open(tmp_path, 'w') as json_file:
+            json.dump(self._fingerprints, json_file)
+        os.replace(tmp_path, self._fingerprints_path)
+
+
+def _in_years(dirname: str, years: Optional[Years]) -> bool:
+    """Returns: False if directory is a partition of release year outside of years, True otherwise."""
+
+    match = _PARTITION_REGEX.match(dirname)
+    return years is None or match is None or years[0] <= int(match.group(1)) <= years[1]
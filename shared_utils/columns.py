@@ -67,6 +67,10 @@ SPOTIFY_TRACKS_PROCESSED_COLS = [
 ]
 """Column names in output spotify processed tracks file."""
 
+# STORAGE ---------------------------------------------------------------------
+YEAR = 'year'
+"""Release year used as partition key of stored stage outputs."""
+
 # FEATURE SELECTION -----------------------------------------------------------
 
 RATING_CLASS = 'rating_class'
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass
+from typing import Optional
+
+import shared_utils.columns as c
+
+from shared_utils.utils import MIN_TEMPO, MAX_TEMPO, MAX_DURATION_MS, MIN_TIME_SIGNATURE, MAX_DANCEABILITY, \
+    MAX_ENERGY, MAX_KEY, MIN_LOUDNESS, VALID_MODES, MAX_SPEECHINESS, MAX_ACOUSTICNESS, MAX_INSTRUMENTALNESS, \
+    MAX_LIVENESS, MAX_VALENCE, MIN_DURATION_MS, MAX_TIME_SIGNATURE, MEDIAN_TIME_SIGNATURE
+
+CLAMP = 'clamp'
+DROP = 'drop'
+
+
+@dataclass(frozen=True)
+class FeatureRule:
+    """
+    Single validation rule for one feature column.
+
+    Clamp rules replace values outside of [lower, upper] with the bound (or with
+    `fill_lower`/`fill_upper` if given). Drop rules mark rows with values outside
+    of the bounds (or not in `allowed`) to be removed.
+
+    Attributes:
+        name: Unique name of the rule, used as a key in reported metrics.
+        column: Name of the validated column.
+        action: CLAMP or DROP.
+        lower: Lower bound of valid values.
+        upper: Upper bound of valid values.
+        inclusive: Which bounds are inclusive - 'both', 'neither', 'left' or 'right' (as in pd.Series.between).
+        allowed: Set of allowed values, checked instead of bounds if given.
+        fill_lower: Value to set for values below lower bound in clamp rule.
+        fill_upper: Value to set for values above upper bound in clamp rule.
+    """
+
+    name: str
+    column: str
+    action: str
+    lower: float = -np.inf
+    upper: float = np.inf
+    inclusive: str = 'both'
+    allowed: Optional[tuple] = None
+    fill_lower: Optional[float] = None
+    fill_upper: Optional[float] = None
+
+    def valid_mask(self, values: np.ndarray) -> np.ndarray:
+        """Returns: Boolean mask of values that satisfy the rule bounds."""
+
+        if self.allowed is not None:
+            return np.isin(values, self.allowed)
+
+        lower_ok = values >= self.lower if self.inclusive in ('both', 'left') else values > self.lower
+        upper_ok = values <= self.upper if self.inclusive in ('both', 'right') else values < self.upper
+        return lower_ok & upper_ok
+
+
+SPOTIFY_FEATURE_RULES: list[FeatureRule] = [
+    # Clamp rules - applied before drop rules.
+    FeatureRule('tempo_clamp', c.TEMPO, CLAMP, lower=MIN_TEMPO, upper=MAX_TEMPO),
+    FeatureRule('duration_ms_clamp', c.DURATION_MS, CLAMP, upper=MAX_DURATION_MS),
+    FeatureRule('time_signature_fill', c.TIME_SIGNATURE, CLAMP, lower=MIN_TIME_SIGNATURE,
+                fill_lower=MEDIAN_TIME_SIGNATURE),
+
+    # Drop rules.
+    FeatureRule('danceability_range', c.DANCEABILITY, DROP, 0, MAX_DANCEABILITY, inclusive='neither'),
+    FeatureRule('energy_range', c.ENERGY, DROP, 0, MAX_ENERGY),
+    FeatureRule('key_range', c.KEY, DROP, 0, MAX_KEY),
+    FeatureRule('loudness_range', c.LOUDNESS, DROP, MIN_LOUDNESS, 0, inclusive='left'),
+    FeatureRule('mode_valid', c.MODE, DROP, allowed=tuple(VALID_MODES)),
+    FeatureRule('speechiness_range', c.SPEECHINESS, DROP, 0, MAX_SPEECHINESS, inclusive='neither'),
+    FeatureRule('acousticness_range', c.ACOUSTICNESS, DROP, 0, MAX_ACOUSTICNESS),
+    FeatureRule('instrumentalness_range', c.INSTRUMENTALNESS, DROP, 0, MAX_INSTRUMENTALNESS),
+    FeatureRule('liveness_range', c.LIVENESS, DROP, 0, MAX_LIVENESS),
+    FeatureRule('valence_range', c.VALENCE, DROP, 0, MAX_VALENCE),
+    FeatureRule('duration_ms_min', c.DURATION_MS, DROP, lower=MIN_DURATION_MS),
+    FeatureRule('time_signature_range', c.TIME_SIGNATURE, DROP, MIN_TIME_SIGNATURE, MAX_TIME_SIGNATURE),
+]
+"""Clamp and drop rules for raw Spotify audio features."""
+
+
+def validate_features(
+        values: np.ndarray,
+        columns: list[str],
+        rules: list[FeatureRule] = SPOTIFY_FEATURE_RULES
+) -> tuple[np.ndarray, np.ndarray, dict[str, int]]:
+    """
+    Apply clamp and drop rules to the feature matrix in one pass over its columns.
+    It can be used both for whole datasets and single albums at inference time.
+
+    Args:
+        values: 2-D matrix of raw features with columns ordered as in `columns`.
+        columns: Column names of the matrix.
+        rules: Rules to apply. Clamp rules are applied before drop rules.
+
+    Returns:
+        Tuple of clamped copy of the matrix, boolean mask of valid rows and
+        number of rows rejected by each drop rule (rules are evaluated independently,
+        so a single row may be counted by many rules).
+    """
+
+    values = np.array(values, dtype=np.float64, copy=True, ndmin=2)
+    col_idx = {col: i for i, col in enumerate(columns)}
+    assert all(rule.column in col_idx for rule in rules), 'Input is missing feature columns.'
+
+    for rule in rules:
+        if rule.action != CLAMP:
+            continue
+        col = values[:, col_idx[rule.column]]
+        fill_lower = rule.lower if rule.fill_lower is None else rule.fill_lower
+        fill_upper = rule.upper if rule.fill_upper is None else rule.fill_upper
+        col[col < rule.lower] = fill_lower
+        col[col > rule.upper] = fill_upper
+
+    keep = np.ones(len(values), dtype=bool)
+    drop_counts: dict[str, int] = {}
+    for rule in rules:
+        if rule.action != DROP:
+            continue
+        valid = rule.valid_mask(values[:, col_idx[rule.column]])
+        drop_counts[rule.name] = int(len(valid) - np.count_nonzero(valid))
+        keep &= valid
+
+    return values, keep, drop_counts
+
+
+def apply_feature_rules(
+        df: pd.DataFrame,
+        rules: list[FeatureRule] = SPOTIFY_FEATURE_RULES
+) -> tuple[pd.DataFrame, dict[str, int]]:
+    """
+    Apply clamp and drop rules to the dataframe with a single row selection at the end.
+
+    Args:
+        df: The input dataframe with Spotify track features.
+        rules: Rules to apply.
+
+    Returns:
+        Tuple of copy of input dataframe with clamped values and removed invalid rows,
+        and metrics with number of rows rejected by each drop rule and in total.
+    """
+
+    columns = list(dict.fromkeys(rule.column for rule in rules))
+    values, keep, metrics = validate_features(df[columns].to_numpy(dtype=np.float64, na_value=np.nan), columns, rules)
+
+    result = df.loc[keep].copy(deep=False)
+    for rule_column in {rule.column for rule in rules if rule.action == CLAMP}:
+        i = columns.index(rule_column)
+        result[rule_column] = values[keep, i].astype(df[rule_column].dtype, copy=False)
+
+    metrics['total_dropped'] = int(len(keep) - np.count_nonzero(keep))
+    return result, metrics
@@ -0,0 +1,161 @@
+import json
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+import shared_utils.columns as c
+
+from shared_utils.utils import MAX_KEY, MIN_LOUDNESS, MAX_SPEECHINESS, MIN_TEMPO, MAX_TEMPO, MIN_DURATION_MS, \
+    MAX_DURATION_MS, MEDIAN_TIME_SIGNATURE
+
+Bounds = dict[str, tuple[float, float]]
+
+SPOTIFY_FEATURE_BOUNDS: Bounds = {
+    c.KEY: (0, MAX_KEY),
+    c.LOUDNESS: (MIN_LOUDNESS, 0),
+    c.SPEECHINESS: (0, MAX_SPEECHINESS),
+    c.TEMPO: (MIN_TEMPO, MAX_TEMPO),
+    c.DURATION_MS: (MIN_DURATION_MS, MAX_DURATION_MS),
+}
+"""Bounds of raw features scaled to [0, 1]. Other features are already in this range."""
+
+SPOTIFY_DB_FEATURES = [c.LOUDNESS]
+"""Features in decibels, converted to linear scale before scaling."""
+
+SPOTIFY_INDICATOR_FEATURES = {c.TIME_SIGNATURE: MEDIAN_TIME_SIGNATURE}
+"""Features replaced with indicator of being equal to given value."""
+
+
+@dataclass
+class SpotifyFeatureTransformer:
+    """
+    Transformation of raw Spotify track features applied to whole feature matrix at once:
+
+    1. Features in decibels are converted to linear scale (`10 ** (x / 20)`).
+    2. Indicator features are set to 1 if equal to their value, 0 otherwise.
+    3. Every feature is scaled with `x * scale + offset`.
+    4. Values are rounded to `decimals` decimal places.
+
+    The same transformer is saved next to the feature dataset and used to transform new albums at prediction time.
+
+    Attributes:
+        feature_names: Names of transformed features (columns of the matrix).
+        scale: Scale of each feature.
+        offset: Offset of each feature.
+        db_features: Features in decibels.
+        indicator_features: Indicator features with compared values.
+        decimals: Number of decimal places of transformed values.
+    """
+
+    feature_names: list[str]
+    scale: np.ndarray
+    offset: np.ndarray
+    db_features: list[str] = field(default_factory=list)
+    indicator_features: dict[str, float] = field(default_factory=dict)
+    decimals: int = 4
+
+    @classmethod
+    def from_bounds(
+            cls,
+            feature_names: list[str],
+            bounds: Optional[Bounds] = None,
+            db_features: Optional[list[str]] = None,
+            indicator_features: Optional[dict[str, float]] = None,
+            decimals: int = 4
+    ) -> 'SpotifyFeatureTransformer':
+        """
+        Fit transformer scaling features from their bounds to [0, 1].
+
+        Args:
+            feature_names: Names of features in transformed matrix.
+            bounds: Raw bounds of scaled features (bounds of features in decibels are given in decibels).
+                Features without bounds are not scaled. SPOTIFY_FEATURE_BOUNDS if None.
+            db_features: Features in decibels, SPOTIFY_DB_FEATURES if None.
+            indicator_features: Indicator features with compared values, SPOTIFY_INDICATOR_FEATURES if None.
+            decimals: Number of decimal places of transformed values.
+
+        Returns:
+            Fitted transformer.
+        """
+
+        bounds = SPOTIFY_FEATURE_BOUNDS if bounds is None else bounds
+        db_features = SPOTIFY_DB_FEATURES if db_features is None else db_features
+        indicator_features = SPOTIFY_INDICATOR_FEATURES if indicator_features is None else indicator_features
+
+        scale = np.ones(len(feature_names))
+        offset = np.zeros(len(feature_names))
+        for i, name in enumerate(feature_names):
+            if name not in bounds:
+                continue
+            lower, upper = (10 ** (bound / 20) for bound in bounds[name]) if name in db_features else bounds[name]
+            scale[i] = 1 / (upper - lower)
+            offset[i] = -lower / (upper - lower)
+
+        return cls(
+            feature_names=list(feature_names),
+            scale=scale,
+            offset=offset,
+            db_features=[name for name in db_features if name in feature_names],
+            indicator_features={name: v for name, v in indicator_features.items() if name in feature_names},
+            decimals=decimals,
+        )
+
+    def transform(self, values: np.ndarray) -> np.ndarray:
+        """
+        Transform feature matrix.
+
+        Args:
+            values: Raw features of shape (tracks, features) or (features,) with columns ordered as in feature_names.
+
+        Returns:
+            Transformed float32 features of the same shape.
+        """
+
+        x = np.array(values, dtype=np.float64)
+        assert x.shape[-1] == len(self.feature_names), 'Input does not match transformer features.'
+
+        db_idx = self._indices(self.db_features)
+        x[..., db_idx] = 10 ** (x[..., db_idx] / 20)
+        for name, value in self.indicator_features.items():
+            i = self.feature_names.index(name)
+            x[..., i] = x[..., i] == value
+
+        x *= self.scale
+        x += self.offset
+        return np.round(x, self.decimals).astype(np.float32)
+
+    def transform_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Returns: Copy of dataframe with transformed feature columns."""
+
+        df = df.copy()
+        df[self.feature_names] = self.transform(df[self.feature_names].to_numpy(dtype=np.float64))
+        return df
+
+    def save(self, path: str):
+        """Save transformer to JSON file."""
+
+        with open(path, 'w') as json_file:
+            json.dump({
+                'feature_names': self.feature_names,
+                'scale': self.scale.tolist(),
+                'offset': self.offset.tolist(),
+                'db_features': self.db_features,
+                'indicator_features': self.indicator_features,
+                'decimals': self.decimals,
+            }, json_file, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> 'SpotifyFeatureTransformer':
+        """Load transformer saved with save()."""
+
+        with open(path, 'r') as json_file:
+            params = json.load(json_file)
+
+        params['scale'] = np.array(params['scale'])
+        params['offset'] = np.array(params['offset'])
+        return cls(**params)
+
+    def _indices(self, names: list[str]) -> list[int]:
+        return [self.feature_names.index(name) for name in names]
@@ -0,0 +1,72 @@
+import importlib
+import importlib.util
+import sys
+import types
+
+from typing import Any
+
+
+class LazyRegistry:
+    """
+    Registry of objects (e.g. stage classes) referenced by `'<module>:<attribute>'` paths.
+    Module of an object is imported when the object is requested for the first time,
+    so modules of unused objects and their dependencies are never loaded.
+
+    Examples:
+    ---------
+    >>> registry = LazyRegistry({'RymFetcher': 'data_processing.fetch.rym.rym_data_collection:RymFetcher'})
+    >>> fetcher_class = registry['RymFetcher']  # rymscraper is imported here
+    """
+
+    def __init__(self, paths: dict[str, str]):
+        """
+        Args:
+            paths: Mapping of names to `'<module>:<attribute>'` paths of objects.
+        """
+
+        assert all(path.count(':') == 1 for path in paths.values()), 'Paths must be in <module>:<attribute> format.'
+
+        self.paths = dict(paths)
+        self._loaded: dict[str, Any] = {}
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._loaded:
+            assert name in self.paths, f'Unknown name {name}, expected one of: {list(self.paths)}.'
+            module_name, attribute = self.paths[name].split(':')
+            self._loaded[name] = getattr(importlib.import_module(module_name), attribute)
+        return self._loaded[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.paths
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Import module on first access to its attribute (see importlib.util.LazyLoader). Use it for heavy
+    optional dependencies needed only by some code paths, e.g. plotting libraries in model scripts.
+
+    Examples:
+    ---------
+    >>> plt = lazy_import('matplotlib.pyplot')
+    >>> plt.figure()  # matplotlib.pyplot is executed here
+
+    Args:
+        name: Absolute name of module. Parent packages of submodules are imported immediately.
+
+    Returns:
+        Module, which is executed on first attribute access.
+    """
+
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,330 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is not reported there.
+    resource = None
+
+# Consts
+
+RATE_LIMITED_STATUSES = (429,)
+"""HTTP statuses counted as rate limiting (besides being counted as errors)."""
+
+_current_stage: ContextVar[Optional['StageMetrics']] = ContextVar('current_stage', default=None)
+"""Metrics of stage running in current thread (stages run in threads of StageGraph)."""
+
+
+@dataclass
+class HttpMetrics:
+    """
+    Counters of requests sent to one endpoint.
+
+    Attributes:
+        requests: Number of sent requests (including retries).
+        retries: Number of requests which were retries of failed requests.
+        rate_limited: Number of responses with status from RATE_LIMITED_STATUSES.
+        errors: Number of requests which failed with non 2xx status or without response.
+        statuses: Number of responses of each status ('none' for requests without response).
+    """
+
+    requests: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    errors: int = 0
+    statuses: dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class StageMetrics:
+    """
+    Metrics of one run of a stage. Stages may be nested - rows and requests are counted
+    by the innermost running stage.
+
+    Attributes:
+        stage: Name of stage (names of nested stages are prefixed with name of outer stage).
+        started_at: Unix time of start of stage.
+        wall_s: Duration of stage in seconds.
+        status: 'running', 'ok' or 'failed'.
+        rows_in: Number of input rows processed by stage, None if stage did not report it.
+        rows_out: Number of output rows produced by stage, None if stage did not report it.
+        peak_rss_mb: Peak resident memory of the whole process at the end of stage.
+        http: Request counters by endpoint.
+        counters: Other named counters reported by stage.
+    """
+
+    stage: str
+    started_at: float
+    wall_s: float = 0.
+    status: str = 'running'
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    peak_rss_mb: Optional[float] = None
+    http: dict[str, HttpMetrics] = field(default_factory=dict)
+    counters: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def rows_per_s(self) -> Optional[float]:
+        """Returns: Input rows (or output rows if input is not reported) processed per second."""
+
+        rows = self.rows_in if self.rows_in is not None else self.rows_out
+        if rows is None or self.wall_s <= 0:
+            return None
+        return rows / self.wall_s
+
+    def to_record(self) -> dict:
+        """Returns: JSON serializable record of run report."""
+
+        return {
+            'stage': self.stage,
+            'started_at': round(self.started_at, 3),
+            'status': self.status,
+            'wall_s': round(self.wall_s, 4),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'rows_per_s': round(self.rows_per_s, 2) if self.rows_per_s is not None else None,
+            'peak_rss_mb': self.peak_rss_mb,
+            'http_requests': sum(http.requests for http in self.http.values()),
+            'http_retries': sum(http.retries for http in self.http.values()),
+            'http_rate_limited': sum(http.rate_limited for http in self.http.values()),
+            'http': {endpoint: vars(http) for endpoint, http in sorted(self.http.items())},
+            'counters': dict(sorted(self.counters.items())),
+        }
+
+
+class RunReport:
+    """
+    JSON-lines report of a run - one record per finished stage, with id and parameters of the run,
+    so reports of different runs can be compared (see compare_reports()).
+    """
+
+    def __init__(self, path: str, run_id: str, **params):
+        """
+        Args:
+            path: Path of report file, records are appended to it.
+            run_id: Id of run.
+            params: Parameters of run (JSON serializable), saved in every record.
+        """
+
+        self.path = path
+        self.run_id = run_id
+        self.params = params
+        self._lock = threading.Lock()
+
+    def write(self, record: dict):
+        """Append record to report (thread safe)."""
+
+        line = json.dumps({'run_id': self.run_id, **record, 'params': self.params}, default=str)
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a') as report_file:
+                report_file.write(line + '\n')
+
+
+_report: Optional[RunReport] = None
+
+
+# Functions
+
+def start_run(report_dir: str, name: str, run_id: Optional[str] = None, **params) -> RunReport:
+    """
+    Start writing metrics of finished stages to JSON-lines report `<report_dir>/<name>_<run_id>.jsonl`.
+    Without started run, metrics are only collected (and returned by stage()).
+
+    Examples:
+    ---------
+    >>> start_run(f'{PROJECT_DIR}/data/metrics', 'pipeline', years=[1980, 1990])
+    >>> with stage('PreprocessRym'):
+    ...     add_rows(rows_in=len(df_raw), rows_out=len(df))
+
+    Args:
+        report_dir: Directory of reports.
+        name: Name of the run, e.g. of its entry point.
+        run_id: Id of run, generated from start time if None.
+        params: Parameters of run (JSON serializable), saved in every record.
+
+    Returns:
+        Report of the run.
+    """
+
+    global _report
+    run_id = run_id or new_run_id()
+    _report = RunReport(os.path.join(report_dir, f'{name}_{run_id}.jsonl'), run_id, **params)
+    return _report
+
+
+def new_run_id() -> str:
+    """Returns: Unique id of run, starting with its start time (so reports sort by time)."""
+
+    return f'{time.strftime("%Y%m%d-%H%M%S")}-{os.urandom(3).hex()}'
+
+
+def current_report() -> Optional[RunReport]:
+    """Returns: Report of started run, None if no run was started."""
+
+    return _report
+
+
+@contextmanager
+def stage(name: str) -> Iterator[StageMetrics]:
+    """
+    Context manager measuring wall time and peak memory of stage, and collecting rows and requests
+    reported in its block. Metrics are written to report of started run when the block exits.
+
+    Args:
+        name: Name of stage.
+
+    Returns:
+        Iterator with metrics of the stage.
+    """
+
+    parent = _current_stage.get()
+    metrics = StageMetrics(f'{parent.stage}/{name}' if parent is not None else name, time.time())
+    token = _current_stage.set(metrics)
+    start = time.perf_counter()
+    try:
+        yield metrics
+        metrics.status = 'ok'
+    except BaseException:
+        metrics.status = 'failed'
+        raise
+    finally:
+        metrics.wall_s = time.perf_counter() - start
+        metrics.peak_rss_mb = peak_rss_mb()
+        _current_stage.reset(token)
+        if _report is not None:
+            _report.write(metrics.to_record())
+
+
+def current_stage() -> Optional[StageMetrics]:
+    """Returns: Metrics of stage running in current thread, None if no stage is running."""
+
+    return _current_stage.get()
+
+
+def add_rows(rows_in: int = 0, rows_out: int = 0):
+    """
+    Add input and output rows to running stage (no-op outside of stage). May be called
+    many times, e.g. once per chunk.
+    """
+
+    metrics = _current_stage.get()
+    if metrics is None:
+        return
+    if rows_in:
+        metrics.rows_in = (metrics.rows_in or 0) + int(rows_in)
+    if rows_out:
+        metrics.rows_out = (metrics.rows_out or 0) + int(rows_out)
+
+
+def record_request(endpoint: str, status: Optional[int], attempt: int = 1):
+    """
+    Count request sent by running stage (no-op outside of stage).
+
+    Args:
+        endpoint: Name of endpoint, e.g. 'spotify/search'.
+        status: HTTP status of response, None if request failed without response.
+        attempt: Number of attempt of the request, attempts after the first one are counted as retries.
+    """
+
+    metrics = _current_stage.get()
+    if metrics is None:
+        return
+
+    http = metrics.http.setdefault(endpoint, HttpMetrics())
+    http.requests += 1
+    http.retries += attempt > 1
+    http.rate_limited += status in RATE_LIMITED_STATUSES
+    http.errors += status is None or not 200 <= status < 300
+    status_key = str(status) if status is not None else 'none'
+    http.statuses[status_key] = http.statuses.get(status_key, 0) + 1
+
+
+def count(name: str, n: int = 1):
+    """Add n to named counter of running stage (no-op outside of stage)."""
+
+    metrics = _current_stage.get()
+    if metrics is not None:
+        metrics.counters[name] = metrics.counters.get(name, 0) + n
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Returns: Peak resident memory of the process in MB, None if it is not available on the platform."""
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes on Linux.
+    return round(peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+
+def load_report(path: str) -> list[dict]:
+    """Returns: Records of JSON-lines report."""
+
+    with open(path, 'r') as report_file:
+        return [json.loads(line) for line in report_file if line.strip()]
+
+
+def compare_reports(baseline: list[dict], current: list[dict]) -> list[dict]:
+    """
+    Compare metrics of stages in two reports. If a stage was run many times in report,
+    its last run is compared.
+
+    Args:
+        baseline: Records of baseline report.
+        current: Records of current report.
+
+    Returns:
+        For each stage present in any report: its wall time, throughput, peak memory and counters in both
+        reports, and speedup (baseline wall time / current wall time).
+    """
+
+    baseline_stages = {record['stage']: record for record in baseline if 'stage' in record}
+    current_stages = {record['stage']: record for record in current if 'stage' in record}
+
+    rows = []
+    for name in list(dict.fromkeys([*baseline_stages, *current_stages])):
+        old, new = baseline_stages.get(name, {}), current_stages.get(name, {})
+        old_wall, new_wall = old.get('wall_s'), new.get('wall_s')
+        rows.append({
+            'stage': name,
+            'baseline_wall_s': old_wall,
+            'current_wall_s': new_wall,
+            'speedup': round(old_wall / new_wall, 2) if old_wall and new_wall else None,
+            'baseline_rows_per_s': old.get('rows_per_s'),
+            'current_rows_per_s': new.get('rows_per_s'),
+            'baseline_peak_rss_mb': old.get('peak_rss_mb'),
+            'current_peak_rss_mb': new.get('peak_rss_mb'),
+            'baseline_counters': old.get('counters') or None,
+            'current_counters': new.get('counters') or None,
+        })
+    return rows
+
+
+def main(args: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description='Compare stage metrics of two run reports.')
+    parser.add_argument('baseline', help='Path of baseline JSON-lines report.')
+    parser.add_argument('current', help='Path of current JSON-lines report.')
+    args = parser.parse_args(args)
+
+    rows = compare_reports(load_report(args.baseline), load_report(args.current))
+    columns = list(rows[0]) if rows else []
+    print('\t'.join(columns))
+    for row in rows:
+        print('\t'.join('-' if row[col] is None else str(row[col]) for col in columns))
+
+
+# Compare run reports, e.g. `python -m shared_utils.metrics data/metrics/pipeline_a.jsonl data/metrics/pipeline_b.jsonl`
+if __name__ == '__main__':
+    main()
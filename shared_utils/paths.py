@@ -0,0 +1,93 @@
+import os
+
+# Consts
+
+PARQUET = 'parquet'
+CSV = 'csv'
+DEFAULT_FORMAT = PARQUET
+"""Default format of stage outputs."""
+
+Years = tuple[int, int]
+"""Inclusive range of release years."""
+
+
+# Functions
+
+def storage_format(path: str) -> str:
+    """Returns: Format of the dataset at given path - CSV for '.csv' files, PARQUET otherwise."""
+
+    return CSV if path.endswith('.csv') else PARQUET
+
+
+def dataset_path(base_path: str, years: Years, fmt: str = DEFAULT_FORMAT) -> str:
+    """
+    Get path of the stage output in given format.
+
+    Examples:
+    ---------
+    >>> dataset_path('data/processed/rym/rym_charts', (1980, 1990), CSV)
+    'data/processed/rym/rym_charts_1980_1990.csv'
+
+    >>> dataset_path('data/processed/rym/rym_charts', (1980, 1990), PARQUET)
+    'data/processed/rym/rym_charts'
+
+    Args:
+        base_path: Path of output without extension.
+        years: Range of years processed in the stage (encoded in name of CSV file only).
+        fmt: Format of output.
+
+    Returns:
+        Path of CSV file or directory of partitioned dataset.
+    """
+
+    if fmt == CSV:
+        return f'{base_path}_{years[0]}_{years[1]}.csv'
+    return base_path
+
+
+def album_tensor_path(output_path: str) -> str:
+    """
+    Get path of album tensor saved next to the stage output.
+
+    Examples:
+    ---------
+    >>> album_tensor_path('data/feature/spotify_1965_2022.csv')
+    'data/feature/spotify_1965_2022_tensor'
+
+    Returns:
+        Directory of the album tensor.
+    """
+
+    return f'{os.path.splitext(output_path.rstrip(os.sep))[0]}_tensor'
+
+
+def ragged_features_path(output_path: str) -> str:
+    """
+    Get path of ragged features saved next to the stage output.
+
+    Examples:
+    ---------
+    >>> ragged_features_path('data/feature/spotify_1965_2022.csv')
+    'data/feature/spotify_1965_2022_ragged'
+
+    Returns:
+        Directory of the ragged features.
+    """
+
+    return f'{os.path.splitext(output_path.rstrip(os.sep))[0]}_ragged'
+
+
+def transformer_path(output_path: str) -> str:
+    """
+    Get path of transformer saved next to the feature dataset.
+
+    Examples:
+    ---------
+    >>> transformer_path('data/feature/spotify_1965_2022.csv')
+    'data/feature/spotify_1965_2022_transformer.json'
+
+    Returns:
+        Path of JSON file with the transformer.
+    """
+
+    return f'{os.path.splitext(output_path.rstrip(os.sep))[0]}_transformer.json'
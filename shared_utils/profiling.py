@@ -0,0 +1,272 @@
+import argparse
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from shared_utils.utils import create_logger
+
+# Consts
+
+DETERMINISTIC = 'cprofile'
+SAMPLING = 'sample'
+PROFILE_MODES = [DETERMINISTIC, SAMPLING]
+"""Modes of profiling - cProfile of every call, or sampling of stacks in fixed intervals (wall-clock time)."""
+
+DEFAULT_INTERVAL = 0.005
+"""Interval between samples of stacks in seconds (sampling mode)."""
+
+DEFAULT_TOP = 20
+"""Number of functions in summary of each stage."""
+
+
+@dataclass
+class HotFunction:
+    """
+    Attributes:
+        name: Function with its file and line.
+        self_s: Time spent in function itself (estimated from samples in sampling mode).
+        total_s: Time spent in function including functions it called.
+        calls: Number of calls, None in sampling mode.
+    """
+
+    name: str
+    self_s: float
+    total_s: float
+    calls: Optional[int] = None
+
+
+class StackSampler(threading.Thread):
+    """
+    Thread sampling stack of another thread in fixed intervals. Unlike cProfile, overhead does not grow
+    with number of calls, and time spent waiting (e.g. for HTTP responses) is visible.
+
+    Attributes:
+        stacks: Number of samples of each stack, collapsed into 'outer;...;inner' string.
+    """
+
+    def __init__(self, thread_id: int, interval: float = DEFAULT_INTERVAL):
+        """
+        Args:
+            thread_id: Identifier of sampled thread.
+            interval: Interval between samples in seconds.
+        """
+
+        super().__init__(name=f'StackSampler-{thread_id}', daemon=True)
+        self.stacks: Counter[str] = Counter()
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self.stacks[_collapse_stack(frame)] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def hot_functions(self, top: int = DEFAULT_TOP) -> list[HotFunction]:
+        """Returns: Functions with most samples on top of stack, with time estimated from number of samples."""
+
+        self_samples: Counter[str] = Counter()
+        total_samples: Counter[str] = Counter()
+        for stack, samples in self.stacks.items():
+            functions = stack.split(';')
+            self_samples[functions[-1]] += samples
+            for function in set(functions):
+                total_samples[function] += samples
+
+        return [
+            HotFunction(name, samples * self._interval, total_samples[name] * self._interval)
+            for name, samples in self_samples.most_common(top)
+        ]
+
+    def save(self, path: str):
+        """Save stacks in collapsed format ('<stack> <samples>' lines), e.g. for flamegraph.pl or speedscope."""
+
+        with open(path, 'w') as stacks_file:
+            for stack, samples in self.stacks.most_common():
+                stacks_file.write(f'{stack} {samples}\n')
+
+
+class Profiler:
+    """
+    Profiler of pipeline stages. Each stage is profiled separately and saved to output directory:
+    `<stage>.pstats` (cProfile stats, e.g. for snakeviz or flameprof) in deterministic mode,
+    `<stage>.collapsed` (collapsed stacks for flamegraph.pl or speedscope) in sampling mode,
+    and summary of top functions of all stages in `summary.txt`.
+
+    Examples:
+    ---------
+    >>> profiler = Profiler(f'{PROJECT_DIR}/data/profiles/pipeline', SAMPLING)
+    >>> with profiler.stage('PreprocessRym'):
+    ...     RymDataProcessor(rym_path, rym_processed_path).process()
+    """
+
+    def __init__(
+            self,
+            output_dir: str,
+            mode: str = DETERMINISTIC,
+            interval: float = DEFAULT_INTERVAL,
+            top: int = DEFAULT_TOP
+    ):
+        """
+        Args:
+            output_dir: Output directory of profiles.
+            mode: Mode of profiling, one of PROFILE_MODES.
+            interval: Interval between samples in seconds (sampling mode).
+            top: Number of functions in summary of each stage.
+        """
+
+        assert mode in PROFILE_MODES, f'Unknown profiling mode {mode}, expected one of: {PROFILE_MODES}.'
+
+        self.output_dir = output_dir
+        self.mode = mode
+        self._interval = interval
+        self._top = top
+        self._lock = threading.Lock()
+        self._logger = create_logger('Profiler')
+        os.makedirs(output_dir, exist_ok=True)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Context manager profiling its block as stage with given name (in the thread running the block).
+        """
+
+        if self.mode == DETERMINISTIC:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                path = self._stage_path(name, 'pstats')
+                profile.dump_stats(path)
+                self._save_summary(name, path, _pstats_hot_functions(pstats.Stats(profile), self._top))
+        else:
+            sampler = StackSampler(threading.get_ident(), self._interval)
+            sampler.start()
+            try:
+                yield
+            finally:
+                sampler.stop()
+                path = self._stage_path(name, 'collapsed')
+                sampler.save(path)
+                self._save_summary(name, path, sampler.hot_functions(self._top))
+
+    def _stage_path(self, name: str, extension: str) -> str:
+        filename = re.sub(r'[^\w.-]', '_', name)
+        return os.path.join(self.output_dir, f'{filename}.{extension}')
+
+    def _save_summary(self, name: str, path: str, functions: list[HotFunction]):
+        """Append top functions of stage to summary file and log them."""
+
+        lines = [f'{name} ({self.mode}, saved to {path}):']
+        lines.append(f'{"self [s]":>10} {"total [s]":>10} {"calls":>10}  function')
+        for function in functions:
+            calls = function.calls if function.calls is not None else '-'
+            lines.append(f'{function.self_s:>10.3f} {function.total_s:>10.3f} {calls:>10}  {function.name}')
+        summary = '\n'.join(lines)
+
+        with self._lock:
+            with open(os.path.join(self.output_dir, 'summary.txt'), 'a') as summary_file:
+                summary_file.write(summary + '\n\n')
+        self._logger.info(summary)
+
+
+_profiler: Optional[Profiler] = None
+
+
+# Functions
+
+def start_profiling(
+        output_dir: str,
+        mode: str = DETERMINISTIC,
+        interval: float = DEFAULT_INTERVAL,
+        top: int = DEFAULT_TOP
+) -> Profiler:
+    """
+    Profile every block run with stage() from now on (see Profiler). Without started profiling,
+    stage() does nothing, so profiling has no overhead unless it is turned on.
+
+    Returns:
+        Started profiler.
+    """
+
+    global _profiler
+    _profiler = Profiler(output_dir, mode, interval, top)
+    return _profiler
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Context manager profiling its block as stage with given name, if profiling was started."""
+
+    if _profiler is None:
+        yield
+        return
+
+    with _profiler.stage(name):
+        yield
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser, output_dir: str):
+    """
+    Add --profile, --profile-dir and --profile-top arguments of entry point (see start_profiling_from_args()).
+
+    Args:
+        parser: Parser of entry point arguments.
+        output_dir: Default parent directory of profiles.
+    """
+
+    parser.add_argument('--profile', nargs='?', choices=PROFILE_MODES, const=DETERMINISTIC, default=None,
+                        help=f'Profile each stage with cProfile ({DETERMINISTIC}, default) or stack sampling '
+                             f'({SAMPLING}).')
+    parser.add_argument('--profile-dir', default=output_dir, help='Parent directory of profiles.')
+    parser.add_argument('--profile-top', type=int, default=DEFAULT_TOP,
+                        help='Number of functions in summary of each stage.')
+
+
+def start_profiling_from_args(args: argparse.Namespace, run_name: str) -> Optional[Profiler]:
+    """
+    Start profiling to `<profile_dir>/<run_name>` if it was turned on with --profile (see add_profile_arguments()).
+
+    Returns:
+        Started profiler, None if profiling is off.
+    """
+
+    if args.profile is None:
+        return None
+    return start_profiling(os.path.join(args.profile_dir, run_name), args.profile, top=args.profile_top)
+
+
+def _pstats_hot_functions(stats: pstats.Stats, top: int) -> list[HotFunction]:
+    """Returns: Functions with the longest own time in cProfile stats."""
+
+    functions = [
+        HotFunction(pstats.func_std_string(func), own_time, total_time, calls)
+        for func, (_, calls, own_time, total_time, _) in stats.stats.items()
+    ]
+    return sorted(functions, key=lambda function: function.self_s, reverse=True)[:top]
+
+
+def _collapse_stack(frame) -> str:
+    """Returns: Stack of given frame as 'outer;...;inner' string of functions with their file and line."""
+
+    functions = []
+    while frame is not None:
+        code = frame.f_code
+        functions.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(functions))
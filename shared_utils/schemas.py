@@ -0,0 +1,178 @@
+import pandas as pd
+
+from typing import Iterator, Optional, Union
+from pandas.io.parsers import TextFileReader
+
+import shared_utils.columns as c
+
+# Dtypes
+ID_DTYPE = 'string[pyarrow]'
+"""Spotify and Genius identifiers (22-character strings)."""
+TEXT_DTYPE = 'string[pyarrow]'
+FEATURE_DTYPE = 'float32'
+RATING_DTYPE = 'float64'
+"""Dtype of RYM ratings, which are compared with edges of rating classes - in float32 a rating equal to an edge
+would fall below it."""
+CATEGORY_DTYPE = 'int8'
+GENRE_DTYPE = 'int8'
+"""Dtype of one-hot encoded genre columns."""
+
+_INT_DTYPES = {'int8': 'Int8', 'int16': 'Int16', 'int32': 'Int32', 'int64': 'Int64'}
+"""Numpy integer dtypes mapped to nullable pandas dtypes used when column contains missing values."""
+
+Schema = dict[str, str]
+
+# RYM -------------------------------------------------------------------------
+RYM_RAW_SCHEMA: Schema = {
+    c.ARTIST: TEXT_DTYPE,
+    c.ALBUM: TEXT_DTYPE,
+    c.DATE: TEXT_DTYPE,
+    c.RATING: RATING_DTYPE,
+    c.RATING_NUMBER: TEXT_DTYPE,
+    c.GENRES: TEXT_DTYPE,
+}
+"""Dtypes of fetched rym charts (c.RYM_COLS)."""
+
+RYM_PROCESSED_SCHEMA: Schema = {
+    **RYM_RAW_SCHEMA,
+    c.RATING_NUMBER: 'int32',
+}
+"""Dtypes of processed rym charts."""
+
+# SPOTIFY ---------------------------------------------------------------------
+SPOTIFY_SEARCH_SCHEMA: Schema = {
+    c.ALBUM: TEXT_DTYPE,
+    c.ARTIST: TEXT_DTYPE,
+    c.ALBUM_ID: ID_DTYPE,
+    c.SPOTIFY_ALBUM: TEXT_DTYPE,
+    c.SPOTIFY_ARTIST: TEXT_DTYPE,
+    c.PREC_MATCH: FEATURE_DTYPE,
+}
+"""Dtypes of spotify search file (c.SPOTIFY_SEARCH_COLS). Precision match is empty until album is searched."""
+
+SPOTIFY_TRACKS_IDS_SCHEMA: Schema = {
+    c.ALBUM_ID: ID_DTYPE,
+    c.SONG_ID: ID_DTYPE,
+    c.SONG_NAME: TEXT_DTYPE,
+    c.SONG_NUMBER: 'int16',
+    c.SONG_ARTISTS_NUMBER: 'int8',
+}
+"""Dtypes of spotify track ids file (c.SPOTIFY_TRACKS_IDS_COLS)."""
+
+SPOTIFY_RAW_FEATURES_SCHEMA: Schema = {
+    c.SONG_ID: ID_DTYPE,
+    **{col: FEATURE_DTYPE for col in c.SPOTIFY_RAW_FEATURES},
+    c.KEY: CATEGORY_DTYPE,
+    c.MODE: CATEGORY_DTYPE,
+    c.TIME_SIGNATURE: CATEGORY_DTYPE,
+    c.DURATION_MS: 'int32',
+}
+"""Dtypes of fetched spotify track features (c.SPOTIFY_RAW_FEATURES with song id)."""
+
+SPOTIFY_ALBUM_PROCESSED_SCHEMA: Schema = {
+    **SPOTIFY_SEARCH_SCHEMA,
+    c.NUM_TRACKS: 'int16',
+    c.NUM_FEATURES: 'int16',
+}
+"""Dtypes of processed spotify albums (c.SPOTIFY_ALBUM_PROCESSED_COLS)."""
+
+SPOTIFY_TRACKS_PROCESSED_SCHEMA: Schema = {
+    **SPOTIFY_RAW_FEATURES_SCHEMA,
+    **SPOTIFY_TRACKS_IDS_SCHEMA,
+}
+"""Dtypes of processed spotify tracks (c.SPOTIFY_TRACKS_PROCESSED_COLS)."""
+
+# FEATURE SELECTION -----------------------------------------------------------
+SPOTIFY_FEATURE_SCHEMA: Schema = {
+    c.ALBUM_ID: ID_DTYPE,
+    c.SONG_NUMBER: 'int16',
+    **{col: FEATURE_DTYPE for col in c.SPOTIFY_CORE_FEATURES},
+    c.MODE: CATEGORY_DTYPE,
+}
+"""Dtypes of transformed spotify features."""
+
+RYM_FEATURE_SCHEMA: Schema = {
+    c.ALBUM_ID: ID_DTYPE,
+    c.DECADE_CLASS: FEATURE_DTYPE,
+    c.RATING: CATEGORY_DTYPE,
+}
+"""Dtypes of transformed rym features. Genre columns are one-hot encoded with GENRE_DTYPE."""
+
+GENIUS_STATS_SCHEMA: Schema = {
+    c.ALBUM_ID: ID_DTYPE,
+    c.SPOTIFY_ALBUM: TEXT_DTYPE,
+    c.SPOTIFY_ARTIST: TEXT_DTYPE,
+    'number_of_fetched_lyrics': 'int16',
+}
+"""Dtypes of genius stats file."""
+
+
+# Functions
+
+def apply_schema(df: pd.DataFrame, schema: Schema, default_dtype: Optional[str] = None) -> pd.DataFrame:
+    """
+    Cast dataframe columns to dtypes declared in schema. Integer columns with missing
+    values are cast to nullable pandas dtypes instead.
+
+    Args:
+        df: Dataframe to cast.
+        schema: Mapping of column names to dtypes.
+        default_dtype: Dtype for columns missing in schema. Columns are left as they are if None.
+
+    Returns:
+        Dataframe with cast columns (input is returned if no column needs casting).
+    """
+
+    dtypes = {}
+    for col in df.columns:
+        dtype = schema.get(col, default_dtype)
+        if dtype is None or df[col].dtype == pd.api.types.pandas_dtype(dtype):
+            continue
+        if dtype in _INT_DTYPES and df[col].isna().any():
+            dtype = _INT_DTYPES[dtype]
+        dtypes[col] = dtype
+
+    return df.astype(dtypes) if dtypes else df
+
+
+def read_csv(
+        filepath: str,
+        schema: Schema,
+        default_dtype: Optional[str] = None,
+        **kwargs
+) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """
+    Read CSV file with dtypes declared in schema. Integer columns are parsed as floats
+    first, so files with missing values or integers written as floats are read as well.
+
+    Args:
+        filepath: Path to CSV file.
+        schema: Mapping of column names to dtypes.
+        default_dtype: Dtype for columns missing in schema.
+        **kwargs: Additional arguments of pd.read_csv. If chunksize is given, iterator of chunks is returned.
+
+    Returns:
+        Read dataframe or iterator of dataframe chunks.
+    """
+
+    parse_dtypes = {col: 'float64' if dtype in _INT_DTYPES else dtype for col, dtype in schema.items()}
+    result = pd.read_csv(filepath, dtype=parse_dtypes, **kwargs)
+
+    if isinstance(result, TextFileReader):
+        return (apply_schema(chunk, schema, default_dtype) for chunk in result)
+    return apply_schema(result, schema, default_dtype)
+
+
+def to_csv(df: pd.DataFrame, filepath: str, schema: Schema, default_dtype: Optional[str] = None, **kwargs):
+    """
+    Cast dataframe to dtypes declared in schema and save it to CSV file without index.
+
+    Args:
+        df: Dataframe to save.
+        filepath: Path to output CSV file.
+        schema: Mapping of column names to dtypes.
+        default_dtype: Dtype for columns missing in schema.
+        **kwargs: Additional arguments of pd.DataFrame.to_csv (e.g. mode or header).
+    """
+
+    apply_schema(df, schema, default_dtype).to_csv(filepath, index=False, **kwargs)
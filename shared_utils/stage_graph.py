@@ -0,0 +1,246 @@
+import json
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+from shared_utils import metrics, profiling
+from shared_utils.utils import create_logger
+
+STAMP_SUFFIX = '.stamp.json'
+"""Suffix of file saved next to each output of stage with parameters it was made with (see Stage.params)."""
+
+
+@dataclass
+class Stage:
+    """
+    Step of pipeline with declared inputs and outputs. Stage depends on stages which produce its inputs.
+
+    Attributes:
+        name: Unique name of stage.
+        run: Function running the stage.
+        inputs: Paths of files or datasets read by the stage.
+        outputs: Paths of files or datasets written by the stage.
+        params: Parameters of the stage not encoded in paths of its outputs (e.g. range of years of
+            a dataset), outputs made with other parameters are stale. Must be JSON serializable.
+    """
+
+    name: str
+    run: Callable[[], None]
+    inputs: list[str] = field(default_factory=list)
+    outputs: list[str] = field(default_factory=list)
+    params: dict = field(default_factory=dict)
+
+
+class StageGraph:
+    """
+    Graph of pipeline stages, connected by their inputs and outputs. Stages are run in dependency order,
+    independent stages concurrently, and stages with outputs newer than their inputs and made with the same
+    parameters are skipped.
+
+    Examples:
+    ---------
+    >>> graph = StageGraph([
+    ...     Stage('Preprocess', preprocess, inputs=['raw.csv'], outputs=['processed']),
+    ...     Stage('Finalize', finalize, inputs=['processed'], outputs=['final']),
+    ... ])
+    >>> graph.run(['Finalize'], workers=2)
+    """
+
+    def __init__(self, stages: list[Stage]):
+        """
+        Args:
+            stages: Stages of the pipeline.
+        """
+
+        self._logger = create_logger('StageGraph')
+        self.stages = {stage.name: stage for stage in stages}
+        assert len(self.stages) == len(stages), 'Stage names must be unique.'
+
+        producers = {output: stage.name for stage in stages for output in stage.outputs}
+        self._dependencies = {
+            stage.name: sorted({producers[path] for path in stage.inputs if path in producers} - {stage.name})
+            for stage in stages
+        }
+        self._order = self._topological_order()
+
+    def dependencies(self, name: str) -> list[str]:
+        """Returns: Names of stages producing inputs of given stage."""
+
+        return self._dependencies[name]
+
+    def upstream(self, names: Iterable[str]) -> list[str]:
+        """Returns: Given stages and all stages they depend on, in order of execution."""
+
+        selected = set()
+        to_visit = list(names)
+        while to_visit:
+            name = to_visit.pop()
+            assert name in self.stages, f'Unknown stage {name}, expected one of: {list(self.stages)}.'
+            if name not in selected:
+                selected.add(name)
+                to_visit.extend(self._dependencies[name])
+
+        return [name for name in self._order if name in selected]
+
+    def is_stale(self, name: str) -> bool:
+        """
+        Returns: True if any output of stage is missing, made with other parameters or older than any of its inputs.
+        """
+
+        stage = self.stages[name]
+        if not all(os.path.exists(path) for path in stage.outputs):
+            return True
+        if stage.params and any(_read_stamp(path) != _normalize(stage.params) for path in stage.outputs):
+            return True
+        if not all(os.path.exists(path) for path in stage.inputs):
+            # Stage is run, so it reports its missing inputs itself.
+            return True
+        if not stage.inputs:
+            return False
+
+        return max(map(_modification_time, stage.inputs)) > min(map(_modification_time, stage.outputs))
+
+    def plan(
+            self,
+            targets: Optional[Iterable[str]] = None,
+            force: bool = False,
+            with_upstream: bool = True
+    ) -> list[str]:
+        """
+        Get stages which would be run - stale stages and stages depending on them.
+
+        Args:
+            targets: Stages to run, all if None.
+            force: Run targets even if they are not stale.
+            with_upstream: Also run stale stages which targets depend on.
+
+        Returns:
+            Names of stages to run in order of execution.
+        """
+
+        targets = list(self.stages) if targets is None else list(targets)
+        selected = self.upstream(targets) if with_upstream else [name for name in self._order if name in targets]
+
+        planned: list[str] = []
+        for name in selected:
+            forced = force and name in targets
+            if forced or self.is_stale(name) or any(dep in planned for dep in self._dependencies[name]):
+                planned.append(name)
+        return planned
+
+    def run(
+            self,
+            targets: Optional[Iterable[str]] = None,
+            force: bool = False,
+            with_upstream: bool = True,
+            workers: int = 1
+    ) -> list[str]:
+        """
+        Run stages in dependency order. Stage is started as soon as stages it depends on are finished,
+        up to `workers` stages at once. Staleness of each stage is checked right before it starts.
+        After a failure no new stages are started and the error is raised once running stages finish.
+        Each run stage is measured with metrics.stage() and profiled with profiling.stage() (both do
+        nothing more than timing unless a run report or profiling was started).
+
+        Args:
+            targets: Stages to run, all if None.
+            force: Run targets even if they are not stale.
+            with_upstream: Also run stale stages which targets depend on.
+            workers: Maximum number of concurrently running stages.
+
+        Returns:
+            Names of stages which were run.
+        """
+
+        targets = list(self.stages) if targets is None else list(targets)
+        selected = self.upstream(targets) if with_upstream else [name for name in self._order if name in targets]
+        pending = {name: set(self._dependencies[name]) & set(selected) for name in selected}
+        finished: set[str] = set()
+        executed: list[str] = []
+        running: dict[Future, str] = {}
+        error: Optional[BaseException] = None
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while pending or running:
+                for name in [name for name, deps in pending.items() if deps <= finished]:
+                    del pending[name]
+                    if (force and name in targets) or self.is_stale(name):
+                        running[executor.submit(self._run_stage, name)] = name
+                    else:
+                        self._logger.info(f'{name}: up to date, skipped.')
+                        finished.add(name)
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                        pending.clear()
+                        continue
+                    finished.add(name)
+                    executed.append(name)
+
+        if error is not None:
+            raise error
+        return executed
+
+    def _run_stage(self, name: str):
+        self._logger.info(f'{name}: started.')
+        start = time.perf_counter()
+        try:
+            with metrics.stage(name), profiling.stage(name):
+                self.stages[name].run()
+        except BaseException as e:
+            self._logger.error(f'{name}: failed with {e!r}.')
+            raise
+
+        if self.stages[name].params:
+            for path in self.stages[name].outputs:
+                with open(f'{path}{STAMP_SUFFIX}', 'w') as json_file:
+                    json.dump({'stage': name, 'params': self.stages[name].params}, json_file)
+        self._logger.info(f'{name}: finished in {time.perf_counter() - start:.2f}s.')
+
+    def _topological_order(self) -> list[str]:
+        """Returns: Names of stages ordered so every stage comes after stages it depends on."""
+
+        order: list[str] = []
+        remaining = {name: set(deps) for name, deps in self._dependencies.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if deps <= set(order)]
+            assert ready, f'Stages have cyclic dependencies: {sorted(remaining)}.'
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+        return order
+
+
+def _modification_time(path: str) -> float:
+    """Returns: Modification time of file, or latest modification time of files in directory."""
+
+    if os.path.isfile(path):
+        return os.path.getmtime(path)
+
+    mtimes = [os.path.getmtime(os.path.join(root, filename)) for root, _, files in os.walk(path) for filename in files]
+    return max(mtimes, default=os.path.getmtime(path))
+
+
+def _read_stamp(path: str) -> Optional[dict]:
+    """Returns: Parameters output was made with, None if it has no stamp."""
+
+    stamp_path = f'{path}{STAMP_SUFFIX}'
+    if not os.path.exists(stamp_path):
+        return None
+    with open(stamp_path, 'r') as json_file:
+        return json.load(json_file)['params']
+
+
+def _normalize(params: dict) -> dict:
+    """Returns: Parameters as read back from JSON (e.g. tuples as lists)."""
+
+    return json.loads(json.dumps(params))
@@ -0,0 +1,326 @@
+import operator
+import os
+import re
+import shutil
+import pandas as pd
+
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional
+
+import shared_utils.columns as c
+
+from shared_utils import schemas
+from shared_utils.paths import PARQUET, CSV, DEFAULT_FORMAT, Years, storage_format, dataset_path
+
+# Consts
+
+UNKNOWN_YEAR = 0
+"""Partition for records without known release year."""
+
+Filters = list[tuple]
+"""Filters in pyarrow format - list of (column, operator, value) tuples joined with AND."""
+
+_PARTITION_REGEX = re.compile(rf'^{c.YEAR}=(-?\d+)$')
+_OPERATORS = {
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda col, values: col.isin(values),
+    'not in': lambda col, values: ~col.isin(values),
+}
+
+
+class FrameStorage(ABC):
+    """
+    Abstract representation of storage for dataframes saved between pipeline stages.
+    Records are stored in dataset partitioned by release year (c.YEAR). The partition key is
+    not stored as a column, so frames are read back with the same columns they were written with.
+    """
+
+    @abstractmethod
+    def write(self, df: pd.DataFrame, path: str, years: pd.Series, append: bool = False):
+        """
+        Write dataframe to dataset at given path.
+
+        Args:
+            df: Dataframe to write (already cast to its schema).
+            path: Path of the dataset.
+            years: Release year of each row of df (aligned with df).
+            append: If false, partitions of the written years are replaced, otherwise new rows are appended.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def read(
+            self,
+            path: str,
+            schema: schemas.Schema,
+            columns: Optional[list[str]] = None,
+            filters: Optional[Filters] = None,
+            years: Optional[Years] = None
+    ) -> pd.DataFrame:
+        """
+        Read dataframe from dataset at given path.
+
+        Args:
+            path: Path of the dataset.
+            schema: Mapping of column names to dtypes used when parsing text formats.
+            columns: Columns to read, all if None.
+            filters: Row filters.
+            years: Range of release years to read, all if None.
+
+        Returns:
+            Read dataframe.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove(self, path: str, years: Optional[list[int]] = None):
+        """Remove partitions of given years (or whole dataset if None) at given path."""
+        raise NotImplementedError
+
+
+class ParquetStorage(FrameStorage):
+    """
+    Storage of year-partitioned parquet datasets (hive layout: `<path>/year=<year>/part-<n>.parquet`).
+    Column projection and filters are pushed down to pyarrow, and partitions outside
+    of requested years are not read at all.
+    """
+
+    def write(self, df: pd.DataFrame, path: str, years: pd.Series, append: bool = False):
+        years = years.to_numpy()
+        for year in pd.unique(years):
+            partition_dir = self._partition_dir(path, year)
+            if not append and os.path.exists(partition_dir):
+                shutil.rmtree(partition_dir)
+            os.makedirs(partition_dir, exist_ok=True)
+
+            part = len(os.listdir(partition_dir))
+            df[years == year].to_parquet(os.path.join(partition_dir, f'part-{part}.parquet'), index=False)
+
+    def read(
+            self,
+            path: str,
+            schema: schemas.Schema,
+            columns: Optional[list[str]] = None,
+            filters: Optional[Filters] = None,
+            years: Optional[Years] = None
+    ) -> pd.DataFrame:
+        filters = list(filters or [])
+        if years is not None:
+            filters += [(c.YEAR, '>=', years[0]), (c.YEAR, '<=', years[1])]
+
+        df = pd.read_parquet(path, engine='pyarrow', columns=columns, filters=filters or None)
+        return df.drop(columns=[c.YEAR]) if columns is None and c.YEAR in df.columns else df
+
+    def remove(self, path: str, years: Optional[list[int]] = None):
+        if years is None:
+            shutil.rmtree(path, ignore_errors=True)
+            return
+        for year in years:
+            shutil.rmtree(self._partition_dir(path, year), ignore_errors=True)
+
+    @staticmethod
+    def _partition_dir(path: str, year: int) -> str:
+        return os.path.join(path, f'{c.YEAR}={int(year)}')
+
+
+class CsvStorage(FrameStorage):
+    """
+    Storage of a single CSV file, kept for compatibility with previous pipeline outputs.
+    The file holds one range of years (usually encoded in its name), so years are not stored.
+    """
+
+    def write(self, df: pd.DataFrame, path: str, years: pd.Series, append: bool = False):
+        is_file_new = not append or not os.path.exists(path)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        df.to_csv(path, index=False, mode='w' if is_file_new else 'a', header=is_file_new)
+
+    def read(
+            self,
+            path: str,
+            schema: schemas.Schema,
+            columns: Optional[list[str]] = None,
+            filters: Optional[Filters] = None,
+            years: Optional[Years] = None
+    ) -> pd.DataFrame:
+        filter_cols = [col for col, _, _ in filters or [] if columns is not None and col not in columns]
+        df = schemas.read_csv(path, schema, usecols=columns + filter_cols if columns is not None else None)
+
+        for col, op, value in filters or []:
+            df = df[_OPERATORS[op](df[col], value)]
+        return df.drop(columns=filter_cols)
+
+    def remove(self, path: str, years: Optional[list[int]] = None):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+STORAGES: dict[str, FrameStorage] = {
+    PARQUET: ParquetStorage(),
+    CSV: CsvStorage(),
+}
+"""Available storages by format."""
+
+
+# Functions
+
+def release_years(df: pd.DataFrame) -> pd.Series:
+    """
+    Get release year of each album from dataframe with c.ALBUM_ID and c.DATE columns
+    (e.g. rym data merged with spotify search results).
+
+    Returns:
+        Series with release years indexed by album id.
+    """
+
+    df = df.dropna(subset=[c.ALBUM_ID]).drop_duplicates(subset=[c.ALBUM_ID])
+    return pd.Series(pd.to_datetime(df[c.DATE]).dt.year.to_numpy(), index=df[c.ALBUM_ID].to_numpy(), name=c.YEAR)
+
+
+def load_release_years(rym_processed_path: str, spotify_search_path: str, years: Optional[Years] = None) -> pd.Series:
+    """
+    Load release year of each album found in Spotify.
+
+    Args:
+        rym_processed_path: Path of processed rym data.
+        spotify_search_path: Path of spotify search results (raw or processed).
+        years: Range of release years to load.
+
+    Returns:
+        Series with release years indexed by album id.
+    """
+
+    df_rym = read_frame(rym_processed_path, schemas.RYM_PROCESSED_SCHEMA, columns=[c.ARTIST, c.ALBUM, c.DATE],
+                        years=years)
+    df_search = read_frame(spotify_search_path, schemas.SPOTIFY_SEARCH_SCHEMA, columns=[c.ARTIST, c.ALBUM, c.ALBUM_ID])
+    return release_years(df_rym.merge(df_search, on=[c.ARTIST, c.ALBUM]))
+
+
+def write_frame(
+        df: pd.DataFrame,
+        path: str,
+        schema: schemas.Schema,
+        years: Optional[pd.Series] = None,
+        default_dtype: Optional[str] = None,
+        append: bool = False
+):
+    """
+    Cast dataframe to its schema and write it to the dataset at given path. Release year of
+    each row is taken from c.DATE column if present, otherwise from `years` by c.ALBUM_ID.
+
+    Args:
+        df: Dataframe to write.
+        path: Path of dataset - '.csv' file or directory of parquet dataset.
+        schema: Mapping of column names to dtypes.
+        years: Release years indexed by album id (see release_years()).
+        default_dtype: Dtype for columns missing in schema.
+        append: If false, written partitions are replaced, otherwise rows are appended.
+    """
+
+    df = schemas.apply_schema(df, schema, default_dtype)
+    STORAGES[storage_format(path)].write(df, path, _row_years(df, years), append)
+
+
+def read_frame(
+        path: str,
+        schema: schemas.Schema,
+        default_dtype: Optional[str] = None,
+        columns: Optional[list[str]] = None,
+        filters: Optional[Filters] = None,
+        years: Optional[Years] = None
+) -> pd.DataFrame:
+    """
+    Read dataframe from the dataset at given path and cast it to its schema.
+
+    Args:
+        path: Path of dataset - '.csv' file or directory of parquet dataset.
+        schema: Mapping of column names to dtypes.
+        default_dtype: Dtype for columns missing in schema.
+        columns: Columns to read, all if None.
+        filters: Row filters as list of (column, operator, value) tuples.
+        years: Range of release years to read. Ignored for CSV files, which hold a single range.
+
+    Returns:
+        Read dataframe.
+    """
+
+    df = STORAGES[storage_format(path)].read(path, schema, columns, filters, years)
+    return schemas.apply_schema(df, schema, default_dtype)
+
+
+def iter_frames(
+        path: str,
+        schema: schemas.Schema,
+        columns: Optional[list[str]] = None,
+        years: Optional[Years] = None,
+        chunk_size: int = 100000
+) -> Iterator[pd.DataFrame]:
+    """
+    Read dataset at given path part by part - parquet datasets partition by partition,
+    CSV files in chunks of chunk_size rows - so it is never loaded into memory at once.
+
+    Args:
+        path: Path of dataset - '.csv' file or directory of parquet dataset.
+        schema: Mapping of column names to dtypes.
+        columns: Columns to read, all if None.
+        years: Range of release years to read. Ignored for CSV files.
+        chunk_size: Number of rows in CSV chunks.
+
+    Returns:
+        Iterator of dataframes.
+    """
+
+    if storage_format(path) == CSV:
+        yield from schemas.read_csv(path, schema, usecols=columns, chunksize=chunk_size)
+        return
+
+    for year in list_years(path):
+        if years is None or years[0] <= year <= years[1]:
+            yield read_frame(ParquetStorage._partition_dir(path, year), schema, columns=columns)
+
+
+def remove_frame(path: str, years: Optional[list[int]] = None):
+    """Remove partitions of given release years (whole dataset if None) from dataset at given path."""
+
+    STORAGES[storage_format(path)].remove(path, years)
+
+
+def list_years(path: str) -> list[int]:
+    """Returns: Sorted release years stored in the parquet dataset at given path."""
+
+    if storage_format(path) != PARQUET or not os.path.exists(path):
+        return []
+
+    matches = [_PARTITION_REGEX.match(name) for name in os.listdir(path)]
+    return sorted(int(match.group(1)) for match in matches if match)
+
+
+def export_csv(
+        path: str,
+        csv_path: str,
+        schema: schemas.Schema,
+        default_dtype: Optional[str] = None,
+        years: Optional[Years] = None
+):
+    """Export given range of release years from dataset at path to a single CSV file."""
+
+    df = read_frame(path, schema, default_dtype, years=years)
+    write_frame(df, csv_path, schema, default_dtype=default_dtype)
+
+
+def _row_years(df: pd.DataFrame, years: Optional[pd.Series]) -> pd.Series:
+    """Returns: Release year of each row of dataframe (UNKNOWN_YEAR if it cannot be determined)."""
+
+    if c.DATE in df.columns:
+        row_years = pd.to_datetime(df[c.DATE]).dt.year
+    elif years is not None and c.ALBUM_ID in df.columns:
+        row_years = df[c.ALBUM_ID].map(years)
+    else:
+        row_years = pd.Series(UNKNOWN_YEAR, index=df.index)
+
+    return row_years.fillna(UNKNOWN_YEAR).astype(int)
@@ -0,0 +1,340 @@
+import json
+import math
+import numpy as np
+import pandas as pd
+
+from collections import Counter
+from typing import Iterable, Optional
+
+
+class RunningMoments:
+    """
+    Mean, variance, minimum and maximum of columns updated batch by batch (Welford/Chan algorithm).
+    Moments computed on separate chunks or partitions can be merged.
+
+    Attributes:
+        count: Number of not null values of each column.
+        mean: Mean of each column.
+        m2: Sum of squared differences from the mean of each column.
+        min: Minimum of each column.
+        max: Maximum of each column.
+    """
+
+    def __init__(self, n_columns: int):
+        self.count = np.zeros(n_columns, dtype=np.int64)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.min = np.full(n_columns, np.inf)
+        self.max = np.full(n_columns, -np.inf)
+
+    @property
+    def var(self) -> np.ndarray:
+        """Returns: Sample variance of each column (NaN for less than 2 values)."""
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+
+    @property
+    def std(self) -> np.ndarray:
+        """Returns: Sample standard deviation of each column."""
+
+        return np.sqrt(self.var)
+
+    def update(self, values: np.ndarray):
+        """
+        Update moments with batch of values of shape (rows, columns). Null values are skipped.
+        """
+
+        values = np.asarray(values, dtype=np.float64).reshape(len(values), -1)
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, np.nansum(values, axis=0) / np.maximum(count, 1), 0.)
+            m2 = np.nansum((values - mean) ** 2, axis=0)
+
+        batch = RunningMoments(values.shape[1])
+        batch.count, batch.mean, batch.m2 = count, mean, m2
+        batch.min = np.where(count > 0, np.nanmin(np.where(valid, values, np.inf), axis=0), np.inf)
+        batch.max = np.where(count > 0, np.nanmax(np.where(valid, values, -np.inf), axis=0), -np.inf)
+        self.merge(batch)
+
+    def merge(self, other: 'RunningMoments'):
+        """Merge moments of other columns values into these ones."""
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = np.where(count > 0, other.count / np.maximum(count, 1), 0.)
+        self.mean = self.mean + delta * ratio
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * ratio
+        self.count = count
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count.tolist(),
+            'mean': self.mean.tolist(),
+            'm2': self.m2.tolist(),
+            'min': self.min.tolist(),
+            'max': self.max.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RunningMoments':
+        moments = cls(len(data['count']))
+        moments.count = np.array(data['count'], dtype=np.int64)
+        for key in ['mean', 'm2', 'min', 'max']:
+            setattr(moments, key, np.array(data[key], dtype=np.float64))
+        return moments
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative error guarantee (DDSketch). Values are counted in
+    logarithmically sized buckets, so every estimated quantile is within `relative_accuracy`
+    of the true value, and memory depends on the range of values, not their number.
+
+    Attributes:
+        relative_accuracy: Maximum relative error of estimated quantiles.
+        count: Number of added values.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.001):
+        assert 0 < relative_accuracy < 1, 'Relative accuracy must be in (0, 1).'
+
+        self.relative_accuracy = relative_accuracy
+        self.count = 0
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._positive: Counter = Counter()
+        self._negative: Counter = Counter()
+        self._zero_count = 0
+
+    def update(self, values: np.ndarray):
+        """Add values to the sketch. Null values are skipped."""
+
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self._zero_count += int(np.count_nonzero(values == 0))
+        self._add_to_store(self._positive, values[values > 0])
+        self._add_to_store(self._negative, -values[values < 0])
+
+    def merge(self, other: 'QuantileSketch'):
+        """Merge other sketch with the same relative accuracy into this one."""
+
+        assert math.isclose(self.relative_accuracy, other.relative_accuracy), 'Sketches accuracies do not match.'
+
+        self.count += other.count
+        self._zero_count += other._zero_count
+        self._positive.update(other._positive)
+        self._negative.update(other._negative)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate quantile of added values.
+
+        Args:
+            q: Quantile in [0, 1].
+
+        Returns:
+            Estimated quantile, NaN if sketch is empty.
+        """
+
+        assert 0 <= q <= 1, 'Quantile must be in [0, 1].'
+        if self.count == 0:
+            return math.nan
+
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self._negative, reverse=True):
+            seen += self._negative[index]
+            if seen > rank:
+                return -self._bucket_value(index)
+
+        seen += self._zero_count
+        if seen > rank:
+            return 0.
+
+        for index in sorted(self._positive):
+            seen += self._positive[index]
+            if seen > rank:
+                return self._bucket_value(index)
+        return self._bucket_value(max(self._positive))
+
+    def quantiles(self, qs: Iterable[float]) -> list[float]:
+        """Returns: Estimated quantiles for each q in qs."""
+
+        return [self.quantile(q) for q in qs]
+
+    def to_dict(self) -> dict:
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'count': self.count,
+            'zero_count': self._zero_count,
+            'positive': {str(k): v for k, v in self._positive.items()},
+            'negative': {str(k): v for k, v in self._negative.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'QuantileSketch':
+        sketch = cls(data['relative_accuracy'])
+        sketch.count = data['count']
+        sketch._zero_count = data['zero_count']
+        sketch._positive = Counter({int(k): v for k, v in data['positive'].items()})
+        sketch._negative = Counter({int(k): v for k, v in data['negative'].items()})
+        return sketch
+
+    def _add_to_store(self, store: Counter, values: np.ndarray):
+        if not len(values):
+            return
+        indices, counts = np.unique(np.ceil(np.log(values) / self._log_gamma).astype(np.int64), return_counts=True)
+        store.update(dict(zip(indices.tolist(), counts.tolist())))
+
+    def _bucket_value(self, index: int) -> float:
+        # Value in the middle of bucket (gamma^(i-1), gamma^i] in terms of relative error.
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+
+class FrameStats:
+    """
+    Streaming statistics (moments and quantile sketch) of selected dataframe columns.
+    Statistics can be updated chunk by chunk, merged between partitions and saved to JSON.
+
+    Attributes:
+        columns: Names of columns with statistics.
+        moments: Moments of all columns.
+        sketches: Quantile sketch of each column.
+    """
+
+    def __init__(self, columns: list[str], relative_accuracy: float = 0.001):
+        self.columns = list(columns)
+        self.moments = RunningMoments(len(columns))
+        self.sketches = {col: QuantileSketch(relative_accuracy) for col in columns}
+
+    def update(self, df: pd.DataFrame):
+        """Update statistics with chunk of dataframe containing the columns."""
+
+        values = df[self.columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        self.moments.update(values)
+        for i, col in enumerate(self.columns):
+            self.sketches[col].update(values[:, i])
+
+    def merge(self, other: 'FrameStats'):
+        """Merge statistics of other chunk or partition with the same columns."""
+
+        assert self.columns == other.columns, 'Statistics columns do not match.'
+
+        self.moments.merge(other.moments)
+        for col in self.columns:
+            self.sketches[col].merge(other.sketches[col])
+
+    def quantiles(self, col: str, qs: Iterable[float]) -> list[float]:
+        """Returns: Estimated quantiles of column."""
+
+        return self.sketches[col].quantiles(qs)
+
+    def summary(self) -> pd.DataFrame:
+        """Returns: Dataframe with count, mean, std, min, median and max of each column."""
+
+        return pd.DataFrame({
+            'count': self.moments.count,
+            'mean': self.moments.mean,
+            'std': self.moments.std,
+            'min': self.moments.min,
+            'median': [self.sketches[col].quantile(0.5) for col in self.columns],
+            'max': self.moments.max,
+        }, index=self.columns)
+
+    def save(self, path: str):
+        """Save statistics to JSON file."""
+
+        with open(path, 'w') as json_file:
+            json.dump({
+                'columns': self.columns,
+                'moments': self.moments.to_dict(),
+                'sketches': {col: sketch.to_dict() for col, sketch in self.sketches.items()},
+            }, json_file)
+
+    @classmethod
+    def load(cls, path: str) -> 'FrameStats':
+        """Load statistics saved with save()."""
+
+        with open(path, 'r') as json_file:
+            data = json.load(json_file)
+
+        stats = cls(data['columns'])
+        stats.moments = RunningMoments.from_dict(data['moments'])
+        stats.sketches = {col: QuantileSketch.from_dict(sketch) for col, sketch in data['sketches'].items()}
+        return stats
+
+
+def compute_stats(
+        frames: Iterable[pd.DataFrame],
+        columns: list[str],
+        relative_accuracy: float = 0.001
+) -> FrameStats:
+    """
+    Compute statistics of columns in one pass over chunks or partitions of a dataset.
+
+    Args:
+        frames: Iterable of dataframe chunks (e.g. storage.iter_frames()).
+        columns: Columns to compute statistics for.
+        relative_accuracy: Relative accuracy of quantile sketches.
+
+    Returns:
+        Statistics of all chunks.
+    """
+
+    stats = FrameStats(columns, relative_accuracy)
+    for df in frames:
+        stats.update(df)
+    return stats
+
+
+def quantile_bounds(
+        stats: FrameStats,
+        columns: Optional[list[str]] = None,
+        lower_q: float = 0.001,
+        upper_q: float = 0.999
+) -> dict[str, tuple[float, float]]:
+    """
+    Get bounds of columns from their quantiles, e.g. to scale features robustly to outliers.
+
+    Args:
+        stats: Statistics of columns.
+        columns: Columns to get bounds for, all columns of stats if None.
+        lower_q: Quantile of lower bound.
+        upper_q: Quantile of upper bound.
+
+    Returns:
+        Mapping of column names to (lower, upper) bounds.
+    """
+
+    columns = stats.columns if columns is None else columns
+    return {col: tuple(stats.quantiles(col, [lower_q, upper_q])) for col in columns}
+
+
+def equal_frequency_bins(sketch: QuantileSketch, n_bins: int, decimals: Optional[int] = 2) -> list[float]:
+    """
+    Get inner edges of bins with (approximately) equal number of values.
+
+    Examples:
+    ---------
+    >>> sketch = QuantileSketch()
+    >>> sketch.update(np.arange(1, 101))
+    >>> equal_frequency_bins(sketch, 4, decimals=0)
+    [25.0, 50.0, 75.0]
+
+    Args:
+        sketch: Sketch of values.
+        n_bins: Number of bins.
+        decimals: Number of decimal places of edges, not rounded if None.
+
+    Returns:
+        Sorted list of n_bins - 1 bin edges.
+    """
+
+    edges = sketch.quantiles(i / n_bins for i in range(1, n_bins))
+    return [round(edge, decimals) if decimals is not None else edge for edge in edges]
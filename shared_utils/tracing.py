@@ -0,0 +1,254 @@
+import threading
+import time
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+from shared_utils.metrics import RunReport
+from shared_utils.utils import create_logger
+
+# Consts
+
+REQUEST = 'request'
+DECODE = 'decode'
+PARSE = 'parse'
+"""Phases of outbound call - sending request and reading response, decoding JSON, parsing it into data models."""
+
+SUB_BUCKET_BITS = 4
+"""Each power of two of latency (in microseconds) is split into 2^SUB_BUCKET_BITS buckets (max error ~6%)."""
+
+PERCENTILES = [50, 90, 99, 99.9]
+"""Percentiles of latency saved in run report."""
+
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of latencies (HDR histogram style) - buckets are exact up to 2 * 2^SUB_BUCKET_BITS
+    microseconds, and then each power of two is split into 2^SUB_BUCKET_BITS equal buckets. Memory does not
+    grow with number of values, relative error of percentiles is bounded, and histograms can be merged.
+
+    Examples:
+    ---------
+    >>> histogram = LatencyHistogram()
+    >>> for latency_s in [0.010, 0.012, 0.011, 0.250]:
+    ...     histogram.record(latency_s)
+    >>> round(histogram.percentile(50) * 1000)
+    11
+    >>> round(histogram.max * 1000)
+    250
+    """
+
+    def __init__(self):
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.
+        self.min = float('inf')
+        self.max = 0.
+
+    def record(self, latency_s: float):
+        micros = max(int(latency_s * 1e6), 0)
+        index = _bucket_index(micros)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += latency_s
+        self.min = min(self.min, latency_s)
+        self.max = max(self.max, latency_s)
+
+    def merge(self, other: 'LatencyHistogram'):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.
+
+    def percentile(self, q: float) -> float:
+        """
+        Returns: Latency in seconds below which q percent of recorded latencies are (middle of bucket,
+            clipped to recorded minimum and maximum), 0 if nothing was recorded.
+        """
+
+        if not self.count:
+            return 0.
+
+        rank = q / 100 * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                lower, upper = _bucket_bounds(index)
+                return min(max((lower + upper) / 2 / 1e6, self.min), self.max)
+        return self.max
+
+    def to_record(self) -> dict:
+        """Returns: Summary of histogram in milliseconds, with non-empty buckets (lower bound in us: count)."""
+
+        return {
+            'count': self.count,
+            'mean_ms': round(self.mean * 1000, 3),
+            'min_ms': round(self.min * 1000, 3) if self.count else None,
+            'max_ms': round(self.max * 1000, 3),
+            **{f'p{q:g}_ms': round(self.percentile(q) * 1000, 3) for q in PERCENTILES},
+            'buckets': {str(_bucket_bounds(index)[0]): count for index, count in sorted(self.counts.items())},
+        }
+
+
+@dataclass
+class Span:
+    """
+    Single traced phase of outbound call. Fields are filled in by traced code.
+
+    Attributes:
+        endpoint: Name of endpoint, e.g. 'spotify/search'.
+        phase: Phase of call, one of REQUEST, DECODE and PARSE.
+        attempt: Number of attempt of the call (1 for first attempt).
+        status: HTTP status of response, None if unknown or request failed.
+        bytes: Size of response body, None if unknown.
+        latency_s: Duration of the phase in seconds.
+    """
+
+    endpoint: str
+    phase: str = REQUEST
+    attempt: int = 1
+    status: Optional[int] = None
+    bytes: Optional[int] = None
+    latency_s: float = 0.
+
+
+@dataclass
+class EndpointStats:
+    """
+    Aggregated spans of one phase of endpoint.
+
+    Attributes:
+        latency: Histogram of latencies.
+        statuses: Number of spans of each status ('none' for unknown status).
+        retries: Number of spans of attempts after the first one.
+        bytes: Total size of response bodies.
+    """
+
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    statuses: dict[str, int] = field(default_factory=dict)
+    retries: int = 0
+    bytes: int = 0
+
+
+class Tracer:
+    """
+    Collects spans of outbound calls into histograms of latency for each endpoint and phase. Spans are
+    not stored, so memory does not grow with number of calls.
+    """
+
+    def __init__(self):
+        self.stats: dict[tuple[str, str], EndpointStats] = {}
+        self._lock = threading.Lock()
+        self._logger = create_logger('Tracer')
+
+    @contextmanager
+    def span(self, endpoint: str, phase: str = REQUEST, attempt: int = 1) -> Iterator[Span]:
+        """
+        Context manager measuring its block as span of endpoint. Span is recorded also if block raises.
+
+        Args:
+            endpoint: Name of endpoint, e.g. 'spotify/search'.
+            phase: Phase of call, one of REQUEST, DECODE and PARSE.
+            attempt: Number of attempt of the call (1 for first attempt).
+
+        Returns:
+            Iterator with span, to fill in status and size of response.
+        """
+
+        span = Span(endpoint, phase, attempt)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.latency_s = time.perf_counter() - start
+            self.record(span)
+
+    def record(self, span: Span):
+        with self._lock:
+            stats = self.stats.setdefault((span.endpoint, span.phase), EndpointStats())
+            stats.latency.record(span.latency_s)
+            status_key = str(span.status) if span.status is not None else 'none'
+            stats.statuses[status_key] = stats.statuses.get(status_key, 0) + 1
+            stats.retries += span.attempt > 1
+            stats.bytes += span.bytes or 0
+
+    def to_records(self) -> list[dict]:
+        """Returns: One record of run report for each endpoint and phase."""
+
+        with self._lock:
+            return [
+                {
+                    'histogram': 'latency',
+                    'endpoint': endpoint,
+                    'phase': phase,
+                    **stats.latency.to_record(),
+                    'retries': stats.retries,
+                    'bytes': stats.bytes,
+                    'statuses': dict(sorted(stats.statuses.items())),
+                }
+                for (endpoint, phase), stats in sorted(self.stats.items())
+            ]
+
+    def dump(self, report: Optional[RunReport] = None):
+        """Log latency percentiles of each endpoint and phase, and write histograms to run report if given."""
+
+        records = self.to_records()
+        if not records:
+            return
+
+        lines = [f'{"endpoint":<28} {"phase":<8} {"count":>7} {"p50 [ms]":>9} {"p99 [ms]":>9} {"max [ms]":>9}']
+        for record in records:
+            lines.append(f'{record["endpoint"]:<28} {record["phase"]:<8} {record["count"]:>7} '
+                         f'{record["p50_ms"]:>9.1f} {record["p99_ms"]:>9.1f} {record["max_ms"]:>9.1f}')
+            if report is not None:
+                report.write(record)
+        self._logger.info('Latency of outbound calls:\n' + '\n'.join(lines))
+
+
+TRACER = Tracer()
+"""Tracer of outbound calls of this process."""
+
+
+# Functions
+
+def span(endpoint: str, phase: str = REQUEST, attempt: int = 1):
+    """
+    Measure block as span of endpoint with TRACER (see Tracer.span()).
+
+    Examples:
+    ---------
+    >>> with span('spotify/search') as request_span:
+    ...     resp = requests.get(url)
+    ...     request_span.status, request_span.bytes = resp.status_code, len(resp.content)
+    >>> with span('spotify/search', PARSE):
+    ...     model = SearchModel(**resp.json())
+    """
+
+    return TRACER.span(endpoint, phase, attempt)
+
+
+def _bucket_index(micros: int) -> int:
+    if micros < 2 * _SUB_BUCKETS:
+        return micros
+    shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * _SUB_BUCKETS + (micros >> shift) - _SUB_BUCKETS
+
+
+def _bucket_bounds(index: int) -> tuple[int, int]:
+    """Returns: Lower (inclusive) and upper (exclusive) bound of bucket in microseconds."""
+
+    if index < 2 * _SUB_BUCKETS:
+        return index, index + 1
+    shift = index // _SUB_BUCKETS - 1
+    lower = (index % _SUB_BUCKETS + _SUB_BUCKETS) << shift
+    return lower, lower + (1 << shift)
@@ -31,6 +31,13 @@ MIN_TIME_SIGNATURE = 3
 MEDIAN_TIME_SIGNATURE = 4
 MAX_TIME_SIGNATURE = 7
 
+# RYM features consts
+RATING_BINS = [2.77, 3.17, 3.35, 3.52, 3.73]
+"""Edges of rating classes, based on notebook 01_analysis_rym (see streaming_stats.equal_frequency_bins)."""
+
+RATING_DECIMALS = 2
+"""Precision of RYM ratings and of edges of rating classes."""
+
 # Functions
 
 
@@ -0,0 +1,208 @@
+import argparse
+import os
+import sys
+import numpy as np
+
+from typing import Optional
+
+from shared_utils.utils import PROJECT_DIR
+from src.models.saved_model import SavedModel, FEED_FORWARD, build_feed_forward, load_info, load_model
+
+# Consts
+
+EAGER = 'eager'
+TORCHSCRIPT = 'torchscript'
+ONNX = 'onnx'
+ENGINES = [EAGER, TORCHSCRIPT, ONNX]
+"""Engines running FeedForwardNN on CPU - eager PyTorch, frozen TorchScript and ONNX Runtime (onnxruntime
+is an optional dependency, needed only for ONNX)."""
+
+FP32_ATOL = 1e-4
+INT8_ATOL = 0.05
+INT8_MIN_AGREEMENT = 0.95
+"""Parity of exported engine with eager model - maximum absolute difference of class probabilities, and
+for int8 quantized engines also minimum fraction of samples with the same predicted class."""
+
+ONNX_OPSET = 13
+"""ONNX opset of exported models (supported by onnxruntime quantization)."""
+
+
+# Functions
+
+def engine_path(model_dir: str, engine: str, quantized: bool = False) -> str:
+    """Returns: Path of model exported to engine, saved in directory of the model (e.g. `model.int8.onnx`)."""
+
+    assert engine in [TORCHSCRIPT, ONNX], f'Only {TORCHSCRIPT} and {ONNX} engines are exported.'
+    extension = 'torchscript.pt' if engine == TORCHSCRIPT else 'onnx'
+    return os.path.join(model_dir, f'model{".int8" if quantized else ""}.{extension}')
+
+
+def export(model_dir: str, engine: str, quantize: bool = False) -> str:
+    """
+    Export saved FeedForwardNN to engine, optionally with dynamic int8 quantization of linear layers
+    (weights stored as int8, activations quantized on the fly).
+
+    Args:
+        model_dir: Directory of model saved with save_feed_forward().
+        engine: TORCHSCRIPT (traced and frozen module) or ONNX (model with dynamic batch size).
+        quantize: Quantize weights of linear layers to int8.
+
+    Returns:
+        Path of exported model (see engine_path()).
+    """
+
+    import torch
+
+    info = load_info(model_dir)
+    model = build_feed_forward(model_dir, info)
+    example = torch.zeros(1, len(info.feature_names))
+    path = engine_path(model_dir, engine, quantize)
+
+    if engine == TORCHSCRIPT:
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        with torch.inference_mode():
+            module = torch.jit.freeze(torch.jit.trace(model, example))
+        torch.jit.save(module, path)
+        return path
+
+    # Quantization of ONNX Runtime works on exported float model.
+    fp32_path = engine_path(model_dir, ONNX)
+    torch.onnx.export(model, example, fp32_path, input_names=['features'], output_names=['logits'],
+                      dynamic_axes={'features': {0: 'batch'}, 'logits': {0: 'batch'}}, opset_version=ONNX_OPSET)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+    return path
+
+
+def load_cpu_model(
+        model_dir: str,
+        engine: str = EAGER,
+        quantized: bool = False,
+        num_threads: Optional[int] = None
+) -> SavedModel:
+    """
+    Load saved model for prediction on CPU with engine it was exported to.
+
+    Examples:
+    ---------
+    >>> export(model_dir, ONNX, quantize=True)
+    >>> model = load_cpu_model(model_dir, ONNX, quantized=True, num_threads=2)
+    >>> model.predict(features)
+
+    Args:
+        model_dir: Directory of saved model, with model exported by export() for TORCHSCRIPT and ONNX.
+        engine: One of ENGINES, other than EAGER only for FeedForwardNN.
+        quantized: Load int8 quantized model (eager model is quantized on load).
+        num_threads: Number of threads of one prediction, default of engine if None. PyTorch threads are set
+            for the whole process (torch.set_num_threads()), ONNX Runtime threads for the loaded session.
+
+    Returns:
+        Loaded model.
+    """
+
+    assert engine in ENGINES, f'Unknown engine {engine}, expected one of: {ENGINES}.'
+
+    info = load_info(model_dir)
+    if engine == EAGER and not quantized:
+        if num_threads is not None and info.model_type == FEED_FORWARD:
+            import torch
+
+            torch.set_num_threads(num_threads)
+        return load_model(model_dir)
+
+    assert info.model_type == FEED_FORWARD, f'Only {FEED_FORWARD} models can run on {engine} engine or quantized.'
+
+    if engine == ONNX:
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        session = ort.InferenceSession(engine_path(model_dir, ONNX, quantized), options,
+                                       providers=['CPUExecutionProvider'])
+        return SavedModel(info, lambda features: session.run(None, {'features': features})[0])
+
+    import torch
+
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    if engine == TORCHSCRIPT:
+        module = torch.jit.load(engine_path(model_dir, TORCHSCRIPT, quantized), map_location='cpu')
+    else:
+        module = torch.ao.quantization.quantize_dynamic(
+            build_feed_forward(model_dir, info), {torch.nn.Linear}, dtype=torch.qint8)
+
+    def predict_logits(features: np.ndarray) -> np.ndarray:
+        with torch.inference_mode():
+            return module(torch.from_numpy(np.require(features, requirements='W'))).numpy()
+
+    return SavedModel(info, predict_logits)
+
+
+def check_parity(reference: SavedModel, model: SavedModel, features: np.ndarray, quantized: bool = False) -> dict:
+    """
+    Compare predictions of model with predictions of reference (eager) model.
+
+    Args:
+        reference: Eager model.
+        model: Exported or quantized model.
+        features: Features to predict.
+        quantized: Model is int8 quantized, so it is checked with INT8_ATOL and INT8_MIN_AGREEMENT.
+
+    Returns:
+        Maximum absolute difference of probabilities, fraction of samples with the same predicted class
+        and whether they are within tolerances ('passed').
+    """
+
+    expected = reference.predict_proba(features)
+    actual = model.predict_proba(features)
+    max_abs_diff = float(np.abs(expected - actual).max())
+    agreement = float((expected.argmax(axis=1) == actual.argmax(axis=1)).mean())
+
+    if quantized:
+        passed = max_abs_diff <= INT8_ATOL and agreement >= INT8_MIN_AGREEMENT
+    else:
+        passed = max_abs_diff <= FP32_ATOL and agreement == 1.
+    return {'max_abs_diff': max_abs_diff, 'class_agreement': agreement, 'passed': passed}
+
+
+def main(args: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(
+        description='Export saved FeedForwardNN to TorchScript and ONNX (optionally int8 quantized) and check '
+                    'parity of exported models with eager model. Fails if any of them is out of tolerance.')
+    parser.add_argument('--model', default=f'{PROJECT_DIR}/data/models/ff', help='Directory of saved model.')
+    parser.add_argument('--engines', nargs='+', default=[TORCHSCRIPT, ONNX], choices=[TORCHSCRIPT, ONNX],
+                        help='Engines to export to.')
+    parser.add_argument('--quantize', action='store_true', help='Export also int8 quantized models.')
+    parser.add_argument('--dataset', default=None,
+                        help='Final dataset to check parity on, data/final/<variant of model> if not given.')
+    parser.add_argument('--samples', type=int, default=10_000, help='Number of samples to check parity on.')
+    args = parser.parse_args(args)
+
+    from data_processing.postprocessing.feature_matrix import load_feature_matrix
+
+    info = load_info(args.model)
+    dataset = load_feature_matrix(args.dataset or f'{PROJECT_DIR}/data/final/{info.variant}')
+    features = np.asarray(dataset.features[:args.samples], dtype=np.float32)
+    reference = load_model(args.model)
+
+    failed = False
+    for engine in args.engines:
+        for quantized in [False, True] if args.quantize else [False]:
+            path = export(args.model, engine, quantized)
+            parity = check_parity(reference, load_cpu_model(args.model, engine, quantized), features, quantized)
+            failed |= not parity['passed']
+            print(f'{path}: max abs diff {parity["max_abs_diff"]:.2e}, class agreement '
+                  f'{parity["class_agreement"]:.4f}{"" if parity["passed"] else " - OUT OF TOLERANCE"}')
+    sys.exit(1 if failed else 0)
+
+
+# Export model, e.g. `python -m src.models.cpu_inference --model data/models/ff --quantize`
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+import torch.nn as nn
+
+
+# Define a custom neural network model
+class FeedForwardNN(nn.Module):
+    def __init__(self, input_size, hidden_sizes, num_classes):
+        super(FeedForwardNN, self).__init__()
+        self.input_size = input_size
+        self.hidden_sizes = hidden_sizes
+
+        # Create hidden layers
+        _input_size = input_size
+        self.hidden_layers = nn.ModuleList()
+        for hidden_size in hidden_sizes:
+            self.hidden_layers.append(nn.Linear(_input_size, hidden_size))
+            # self.hidden_layers.append(nn.LeakyReLU())
+            # self.hidden_layers.append(nn.Dropout(p=0.1))
+            _input_size = hidden_size
+
+        # Output layer
+        self.output_layer = nn.Linear(_input_size, num_classes)
+
+    def forward(self, x):
+        for layer in self.hidden_layers:
+            x = layer(x)
+        x = self.output_layer(x)
+        return x
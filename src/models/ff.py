@@ -1,106 +1,74 @@
-import json
+import argparse
+
 import numpy as np
-import pandas as pd
-import xgboost as xgb
-import matplotlib.pyplot as plt
-import seaborn as sns
 import torch
 import torch.nn as nn
 import torch.optim as optim
-import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, confusion_matrix
-from torch.utils.data import DataLoader, TensorDataset
 
-import shared_utils.columns as c
-from data_processing.feature.rym_feature_selection import RymFeatureSelection
-from data_processing.feature.spotify_feature_selection import SpotifyFeatureSelection
-from data_processing.postprocessing.finalize_data_processing import FinalizeDataProcessor
+from data_processing.feature_pipeline import FeaturePipeline
+from data_processing.postprocessing.feature_matrix import load_feature_matrix
+from shared_utils import metrics, profiling
+from shared_utils.build_cache import BuildCache
+from shared_utils.lazy_import import lazy_import
+from shared_utils.storage import dataset_path
 from shared_utils.utils import PROJECT_DIR
+from src.models.feed_forward import FeedForwardNN
+from src.models.memmap_dataset import DEFAULT_NUM_WORKERS, DeviceBatcher, create_loader
+from src.models.saved_model import save_feed_forward
+
+# Plotting libraries are imported only when confusion matrix is plotted.
+plt = lazy_import('matplotlib.pyplot')
+sns = lazy_import('seaborn')
+
+# Profile dataset building and training with `--profile [cprofile|sample]`
+parser = argparse.ArgumentParser(description='Train feed forward network on flatten dataset.')
+parser.add_argument('--workers', type=int, default=DEFAULT_NUM_WORKERS,
+                    help='Number of worker processes loading batches, 0 to load them in the main process.')
+profiling.add_profile_arguments(parser, f'{PROJECT_DIR}/data/profiles')
+args = parser.parse_args()
+profiling.start_profiling_from_args(args, f'ff_{metrics.new_run_id()}')
 
 # Prepare data
 START_YEAR = 1965
 END_YEAR = 2022
-PROCESS_DATA = False
+YEARS = (START_YEAR, END_YEAR)
 data_type = "flatten"
 
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 print(device)
 
-if PROCESS_DATA:
-    feature_selector = SpotifyFeatureSelection(
-        spotify_features_processed_path=f'{PROJECT_DIR}/data/processed/spotify/spotify_tracks_feature_{START_YEAR}_{END_YEAR}.csv',
-        spotify_output_path=f'{PROJECT_DIR}/data/feature/spotify_{START_YEAR}_{END_YEAR}.csv'
-    )
-
-    feature_selector.run_and_save()
-
-    feature_selector = RymFeatureSelection(
-        rym_processed_path=f'{PROJECT_DIR}/data/processed/rym/rym_charts_{START_YEAR}_{END_YEAR}.csv',
-        spotify_search_processed_path=f'{PROJECT_DIR}/data/processed/spotify/spotify_search_album_id_{START_YEAR}_{END_YEAR}.csv',
-        rym_rating_output_path=f'{PROJECT_DIR}/data/feature/rym_{START_YEAR}_{END_YEAR}.csv'
-    )
-
-    feature_selector.run_and_save()
-
-    finalizer = FinalizeDataProcessor(
-        rym_rating_path=f'{PROJECT_DIR}/data/feature/rym_{START_YEAR}_{END_YEAR}.csv',
-        spotify_features=f'{PROJECT_DIR}/data/feature/spotify_{START_YEAR}_{END_YEAR}.csv',
-        output_dir=f'{PROJECT_DIR}/data/final/'
-    )
-
-    finalizer.finalize_to_flatten()
-
 # Generate synthetic dataset
 np.random.seed(42)
 torch.manual_seed(42)
 
 
-df = pd.read_parquet(f'{PROJECT_DIR}/data/final/{data_type}/album_rating.parquet')
-with open(f'{PROJECT_DIR}/data/final/{data_type}/album_rating_feature_names.json', 'r') as json_file:
-    feature_names = json.load(json_file)
-
-# Extract the 'feature' column into a NumPy matrix
-X = np.vstack(df[c.FEATURE].values)
-assert type(X[0]) == np.ndarray
+pipeline = FeaturePipeline(
+    rym_processed_path=dataset_path(f'{PROJECT_DIR}/data/processed/rym/rym_charts', YEARS),
+    spotify_search_processed_path=dataset_path(f'{PROJECT_DIR}/data/processed/spotify/spotify_search_album_id', YEARS),
+    spotify_features_processed_path=dataset_path(f'{PROJECT_DIR}/data/processed/spotify/spotify_tracks_feature', YEARS),
+    years=YEARS,
+    build_cache=BuildCache(f'{PROJECT_DIR}/data/cache')
+)
 
-# Extract the 'rating' column into a NumPy array
-y = df[c.RATING].values
-num_classes = len(df[c.RATING].unique())
+# Final dataset is built into cache unless processed data, code or parameters changed, and memory-mapped from there
+with profiling.stage('build_dataset'):
+    dataset_dir = pipeline.build_path(data_type)
+dataset = load_feature_matrix(dataset_dir)
+feature_names = dataset.feature_names
 
-# Split dataset into training and testing sets
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-print(f'train size: {X_train.shape}, test size: {X_test.shape}')
+y = dataset.labels
+num_classes = len(np.unique(y))
 
-
-# Define a custom neural network model
-class FeedForwardNN(nn.Module):
-    def __init__(self, input_size, hidden_sizes, num_classes):
-        super(FeedForwardNN, self).__init__()
-        self.input_size = input_size
-        self.hidden_sizes = hidden_sizes
-
-        # Create hidden layers
-        _input_size = input_size
-        self.hidden_layers = nn.ModuleList()
-        for hidden_size in hidden_sizes:
-            self.hidden_layers.append(nn.Linear(_input_size, hidden_size))
-            # self.hidden_layers.append(nn.LeakyReLU())
-            # self.hidden_layers.append(nn.Dropout(p=0.1))
-            _input_size = hidden_size
-
-        # Output layer
-        self.output_layer = nn.Linear(_input_size, num_classes)
-
-    def forward(self, x):
-        for layer in self.hidden_layers:
-            x = layer(x)
-        x = self.output_layer(x)
-        return x
+# Split indices of samples into training and testing sets, samples are read from disk batch by batch
+train_indices, test_indices = (np.sort(indices) for indices in
+                               train_test_split(np.arange(len(y)), test_size=0.2, random_state=42))
+print(f'train size: {(len(train_indices), len(feature_names))}, test size: {(len(test_indices), len(feature_names))}')
 
 
 # Define hyperparameters
-input_size = X_train.shape[1]
+input_size = len(feature_names)
 hidden_sizes = [256, 128, 64, 32]
 learning_rate = 0.001
 num_epochs = 100
@@ -114,48 +82,37 @@ model = model.to(dtype=torch.float32)
 criterion = nn.CrossEntropyLoss()
 optimizer = optim.Adam(model.parameters(), lr=learning_rate)
 
-# Convert NumPy arrays to PyTorch tensors
-X_train_tensor = torch.Tensor(X_train)
-y_train_tensor = torch.LongTensor(y_train)
-# Move the training and testing data to the device
-
-X_train_tensor = X_train_tensor.to(device)
-y_train_tensor = y_train_tensor.to(device)
-
-# Create DataLoader for batch training
-train_dataset = TensorDataset(X_train_tensor, y_train_tensor)
-train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
+# Create loader of batches shuffled by blocks, assembled by worker processes
+train_loader = create_loader(dataset_dir, train_indices, batch_size, num_workers=args.workers, seed=42)
+# Pinned buffers of batches moved to GPU are allocated once and reused in all epochs
+train_batches = DeviceBatcher(train_loader, device)
 
 # Training loop
-for epoch in range(num_epochs):
-    for batch_X, batch_y in train_loader:
-        batch_X = batch_X.to(device)
-        batch_y = batch_y.to(device)
-
-        # Forward pass
-        outputs = model(batch_X)
-        loss = criterion(outputs, batch_y)
-
-        # Backpropagation and optimization
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
-
-    # Print loss at each epoch (optional)
-    print(f'Epoch [{epoch + 1}/{num_epochs}], Loss: {loss.item()}')
-
-# Testing the model
-X_test_tensor = torch.Tensor(X_test)
-X_test_tensor = X_test_tensor.to(device)
+with profiling.stage('train'):
+    for epoch in range(num_epochs):
+        for batch_X, batch_y in train_batches:
+            # Forward pass
+            outputs = model(batch_X)
+            loss = criterion(outputs, batch_y)
+
+            # Backpropagation and optimization
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+        # Print loss at each epoch (optional)
+        print(f'Epoch [{epoch + 1}/{num_epochs}], Loss: {loss.item()}')
+
+# Save the model for prediction service (src/models/prediction_service.py)
+save_feed_forward(f'{PROJECT_DIR}/data/models/ff', model, data_type, feature_names, num_classes)
+
+# Testing the model, batches of test loader follow sorted test indices
+test_loader = create_loader(dataset_dir, test_indices, batch_size, shuffle=False, num_workers=0)
+y_test = y[test_indices]
 with torch.no_grad():
-    outputs = model(X_test_tensor)
-    _, y_pred = torch.max(outputs, 1)
-
-# Move y_pred to CPU to convert it to a NumPy array
-y_pred = y_pred.cpu().numpy()
-
-# Move y_test to CPU to convert it to a NumPy array
-# y_test = y_test.cpu().numpy()
+    # Move y_pred to CPU to convert it to a NumPy array
+    y_pred = np.concatenate([torch.max(model(batch_X), 1)[1].cpu().numpy()
+                             for batch_X, _ in DeviceBatcher(test_loader, device)])
 
 # Evaluate the model
 accuracy = accuracy_score(y_test, y_pred)
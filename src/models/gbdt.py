@@ -1,64 +1,53 @@
-import json
-import random
+import argparse
 
 import numpy as np
-import pandas as pd
 import xgboost as xgb
-import matplotlib.pyplot as plt
-import seaborn as sns
 
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, confusion_matrix
 
-import shared_utils.columns as c
-from data_processing.feature.rym_feature_selection import RymFeatureSelection
-from data_processing.feature.spotify_feature_selection import SpotifyFeatureSelection
-from data_processing.postprocessing.finalize_data_processing import FinalizeDataProcessor
+from data_processing.feature_pipeline import FeaturePipeline
+from data_processing.postprocessing.finalize_data_processing import AGG_FLATTEN
+from shared_utils import metrics, profiling
+from shared_utils.build_cache import BuildCache
+from shared_utils.lazy_import import lazy_import
+from shared_utils.storage import dataset_path
 from shared_utils.utils import PROJECT_DIR
+from src.models.saved_model import save_xgboost
+
+# Plotting libraries are imported only when confusion matrix is plotted.
+plt = lazy_import('matplotlib.pyplot')
+sns = lazy_import('seaborn')
+
+# Profile dataset building and training with `--profile [cprofile|sample]`
+parser = argparse.ArgumentParser(description='Train XGBoost classifier on aggregated dataset.')
+profiling.add_profile_arguments(parser, f'{PROJECT_DIR}/data/profiles')
+profiling.start_profiling_from_args(parser.parse_args(), f'gbdt_{metrics.new_run_id()}')
 
 # Prepare data
 START_YEAR = 1965
 END_YEAR = 2022
-PROCESS_DATA = 0
-
-if PROCESS_DATA:
-    feature_selector = SpotifyFeatureSelection(
-        spotify_features_processed_path=f'{PROJECT_DIR}/data/processed/spotify/spotify_tracks_feature_{START_YEAR}_{END_YEAR}.csv',
-        spotify_output_path=f'{PROJECT_DIR}/data/feature/spotify_{START_YEAR}_{END_YEAR}.csv'
-    )
-
-    feature_selector.run_and_save()
-
-    feature_selector = RymFeatureSelection(
-        rym_processed_path=f'{PROJECT_DIR}/data/processed/rym/rym_charts_{START_YEAR}_{END_YEAR}.csv',
-        spotify_search_processed_path=f'{PROJECT_DIR}/data/processed/spotify/spotify_search_album_id_{START_YEAR}_{END_YEAR}.csv',
-        rym_rating_output_path=f'{PROJECT_DIR}/data/feature/rym_{START_YEAR}_{END_YEAR}.csv'
-    )
-
-    feature_selector.run_and_save()
-
-    finalizer = FinalizeDataProcessor(
-        rym_rating_path=f'{PROJECT_DIR}/data/feature/rym_{START_YEAR}_{END_YEAR}.csv',
-        spotify_features=f'{PROJECT_DIR}/data/feature/spotify_{START_YEAR}_{END_YEAR}.csv',
-        output_dir=f'{PROJECT_DIR}/data/final/'
-    )
-
-    finalizer.finalize_to_flatten()
+YEARS = (START_YEAR, END_YEAR)
 
 # Generate synthetic dataset
 np.random.seed(42)
 
-df = pd.read_parquet(f'{PROJECT_DIR}/data/final/agg_flatten/album_rating.parquet')
-with open(f'{PROJECT_DIR}/data/final/agg_flatten/album_rating_feature_names.json', 'r') as json_file:
-    feature_names = json.load(json_file)
+pipeline = FeaturePipeline(
+    rym_processed_path=dataset_path(f'{PROJECT_DIR}/data/processed/rym/rym_charts', YEARS),
+    spotify_search_processed_path=dataset_path(f'{PROJECT_DIR}/data/processed/spotify/spotify_search_album_id', YEARS),
+    spotify_features_processed_path=dataset_path(f'{PROJECT_DIR}/data/processed/spotify/spotify_tracks_feature', YEARS),
+    years=YEARS,
+    build_cache=BuildCache(f'{PROJECT_DIR}/data/cache')
+)
 
-# Extract the 'feature' column into a NumPy matrix
-X = np.vstack(df[c.FEATURE].values)
-assert type(X[0]) == np.ndarray
+# Final dataset is loaded from cache unless processed data, code or parameters changed
+with profiling.stage('build_dataset'):
+    dataset = pipeline.build(AGG_FLATTEN)
+feature_names = dataset.feature_names
 
-# Extract the 'rating' column into a NumPy array
-y = df[c.RATING].values
-num_classes = len(df[c.RATING].unique())
+X = dataset.features
+y = dataset.labels
+num_classes = len(np.unique(y))
 
 # Split dataset into training and testing sets
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -83,13 +72,16 @@ params = {
 
 # Train the XGBoost model
 num_round = 200  # Number of boosting rounds
-bst = xgb.train(params, dtrain, num_round)
+with profiling.stage('train'):
+    bst = xgb.train(params, dtrain, num_round)
+
+# Save the model for prediction service (src/models/prediction_service.py)
+save_xgboost(f'{PROJECT_DIR}/data/models/gbdt', bst, AGG_FLATTEN, feature_names, num_classes)
 
-# Make predictions on the test set
-y_pred = bst.predict(dtest)
+# Make predictions on the test set (softmax objective predicts classes)
+y_pred = bst.predict(dtest).astype(int)
 
 # Evaluate the model
-y_pred = [random.randint(3, 4) for _ in y_test]
 accuracy = accuracy_score(y_test, y_pred)
 print("Accuracy:", accuracy)
 
@@ -0,0 +1,232 @@
+import multiprocessing
+import os
+import numpy as np
+import torch
+
+from typing import Iterator, Optional
+
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+from data_processing.postprocessing.feature_matrix import load_feature_matrix
+
+# Consts
+
+DEFAULT_BLOCK_SIZE = 256
+DEFAULT_SHUFFLE_BLOCKS = 64
+"""Shuffling of samples by blocks - order of blocks of DEFAULT_BLOCK_SIZE consecutive samples is shuffled,
+then samples of each DEFAULT_SHUFFLE_BLOCKS blocks are shuffled together and split into batches. Each batch
+is read from a few contiguous ranges of the file instead of random rows."""
+
+DEFAULT_NUM_WORKERS = min(4, os.cpu_count() or 1) if 'fork' in multiprocessing.get_all_start_methods() else 0
+"""Worker processes assembling batches. They are forked, as model scripts are not safe to import again by
+spawned workers, so batches are assembled in the main process where fork is not available."""
+
+DEFAULT_PREFETCH_BATCHES = 2
+"""Batches assembled in advance by each worker."""
+
+
+class MemmapFeatureDataset(Dataset):
+    """
+    Final dataset memory-mapped from .npy files saved with FeatureMatrix.save(), indexed by arrays of
+    sample indices, so each item is a whole batch. Only rows of requested batches are read from disk,
+    so the dataset may be larger than memory.
+
+    Files are opened lazily in each process using the dataset (and not pickled), so worker
+    processes share pages of the files through page cache.
+
+    Examples:
+    ---------
+    >>> dataset = MemmapFeatureDataset(pipeline.build_path(FLATTEN))
+    >>> features, labels = dataset[np.arange(128)]
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Directory of final dataset saved as .npy files.
+        """
+
+        self.path = path
+        self._features: Optional[np.ndarray] = None
+        self._labels: Optional[np.ndarray] = None
+        self.num_samples, self.num_features = self._open()[0].shape
+
+    def __len__(self) -> int:
+        return self.num_samples
+
+    def __getitem__(self, indices: np.ndarray) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        Args:
+            indices: Sorted indices of samples of batch (sorted indices are read sequentially).
+
+        Returns:
+            Float32 features of shape (batch, features) and int64 labels of shape (batch,).
+        """
+
+        features, labels = self._open()
+        batch_features = torch.empty((len(indices), self.num_features), dtype=torch.float32)
+        np.take(features, indices, axis=0, out=batch_features.numpy())
+        return batch_features, torch.from_numpy(labels[indices].astype(np.int64))
+
+    def __getstate__(self) -> dict:
+        return {**self.__dict__, '_features': None, '_labels': None}
+
+    def _open(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._features is None:
+            dataset = load_feature_matrix(self.path, mmap_mode='r')
+            assert isinstance(dataset.features, np.memmap), f'Dataset in {self.path} is not saved as .npy files.'
+            self._features, self._labels = dataset.features, dataset.labels
+        return self._features, self._labels
+
+
+class BlockShuffleSampler(Sampler):
+    """
+    Sampler of batches of sample indices, shuffled by blocks of consecutive samples (see DEFAULT_BLOCK_SIZE)
+    and differently in each epoch. Indices within each batch are sorted.
+
+    Examples:
+    ---------
+    >>> sampler = BlockShuffleSampler(train_indices, batch_size=1024, seed=42)
+    >>> [len(batch) for batch in sampler]
+    [1024, 1024, ..., 312]
+    """
+
+    def __init__(
+            self,
+            indices: np.ndarray,
+            batch_size: int,
+            shuffle: bool = True,
+            block_size: int = DEFAULT_BLOCK_SIZE,
+            shuffle_blocks: int = DEFAULT_SHUFFLE_BLOCKS,
+            seed: Optional[int] = None
+    ):
+        """
+        Args:
+            indices: Indices of samples to sample from (e.g. of training split).
+            batch_size: Number of samples of each batch (but the last one).
+            shuffle: Shuffle samples, otherwise batches follow sorted indices.
+            block_size: Number of consecutive samples (of given indices) shuffled together as a block.
+            shuffle_blocks: Number of blocks whose samples are shuffled together.
+            seed: Seed of shuffling, sequence of epochs is the same for the same seed.
+        """
+
+        self.indices = np.sort(np.asarray(indices, dtype=np.int64))
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.block_size = block_size
+        self.shuffle_blocks = shuffle_blocks
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return -(-len(self.indices) // self.batch_size)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        order = self._epoch_order() if self.shuffle else self.indices
+        for start in range(0, len(order), self.batch_size):
+            yield np.sort(order[start:start + self.batch_size])
+
+    def _epoch_order(self) -> np.ndarray:
+        """Returns: Indices shuffled by blocks - shuffled blocks, with samples shuffled within windows of blocks."""
+
+        blocks = np.arange(0, len(self.indices), self.block_size)
+        self._rng.shuffle(blocks)
+        order = np.concatenate([self.indices[start:start + self.block_size] for start in blocks])
+
+        window = self.block_size * self.shuffle_blocks
+        for start in range(0, len(order), window):
+            self._rng.shuffle(order[start:start + window])
+        return order
+
+
+class DeviceBatcher:
+    """
+    Iterable of batches of loader moved to device, iterated once per epoch. Batches for CUDA are copied
+    to pinned buffers, which are allocated on the first batch and reused in turns in all epochs, and
+    transferred asynchronously (DataLoader with pin_memory=True would allocate pinned memory for each batch).
+
+    Examples:
+    ---------
+    >>> batches = DeviceBatcher(create_loader(path, train_indices, batch_size=1024, seed=42), device)
+    >>> for epoch in range(num_epochs):
+    ...     for features, labels in batches:
+    ...         loss = criterion(model(features), labels)
+    """
+
+    def __init__(self, loader: DataLoader, device: torch.device, num_buffers: int = 2):
+        """
+        Args:
+            loader: Loader of batches of features and labels on CPU (see create_loader()).
+            device: Device of model.
+            num_buffers: Number of pinned buffers, a buffer is reused after its previous transfer completes.
+        """
+
+        self.loader = loader
+        self.device = torch.device(device)
+        self.num_buffers = num_buffers
+        self._buffers: list[tuple[torch.Tensor, torch.Tensor, torch.cuda.Event]] = []
+
+    def __len__(self) -> int:
+        return len(self.loader)
+
+    def __iter__(self) -> Iterator[tuple[torch.Tensor, torch.Tensor]]:
+        if self.device.type != 'cuda':
+            yield from self.loader
+            return
+
+        for step, (features, labels) in enumerate(self.loader):
+            slot = step % self.num_buffers
+            if slot == len(self._buffers) or len(self._buffers[slot][1]) < len(labels):
+                # Buffers fit full batches, they are reallocated only if a smaller last batch came first.
+                self._buffers[slot:slot + 1] = [(torch.empty(features.shape, dtype=features.dtype, pin_memory=True),
+                                                 torch.empty(labels.shape, dtype=labels.dtype, pin_memory=True),
+                                                 torch.cuda.Event())]
+            pinned_features, pinned_labels, copied = self._buffers[slot]
+            copied.synchronize()
+
+            size = len(labels)
+            pinned_features[:size].copy_(features)
+            pinned_labels[:size].copy_(labels)
+            batch = (pinned_features[:size].to(self.device, non_blocking=True),
+                     pinned_labels[:size].to(self.device, non_blocking=True))
+            copied.record()
+            yield batch
+
+
+# Functions
+
+def create_loader(
+        path: str,
+        indices: np.ndarray,
+        batch_size: int,
+        shuffle: bool = True,
+        num_workers: int = DEFAULT_NUM_WORKERS,
+        seed: Optional[int] = None
+) -> DataLoader:
+    """
+    Create loader of batches of memory-mapped final dataset, assembled by worker processes.
+
+    Examples:
+    ---------
+    >>> loader = create_loader(pipeline.build_path(FLATTEN), train_indices, batch_size=1024, seed=42)
+    >>> batches = DeviceBatcher(loader, device)
+
+    Args:
+        path: Directory of final dataset saved as .npy files.
+        indices: Indices of samples to load (e.g. of training split).
+        batch_size: Number of samples of each batch.
+        shuffle: Shuffle samples by blocks in each epoch (see BlockShuffleSampler).
+        num_workers: Number of worker processes, batches are assembled in the main process if 0.
+        seed: Seed of shuffling.
+
+    Returns:
+        Loader of batches of features and labels on CPU (see DeviceBatcher).
+    """
+
+    sampler = BlockShuffleSampler(indices, batch_size, shuffle, seed=seed)
+    if num_workers == 0:
+        return DataLoader(MemmapFeatureDataset(path), sampler=sampler, batch_size=None)
+
+    # Workers are kept between epochs, sampler runs in the main process and sends them indices of batches.
+    return DataLoader(MemmapFeatureDataset(path), sampler=sampler, batch_size=None, num_workers=num_workers,
+                      prefetch_factor=DEFAULT_PREFETCH_BATCHES, persistent_workers=True,
+                      multiprocessing_context='fork')
@@ -0,0 +1,422 @@
+import argparse
+import json
+import queue
+import threading
+import time
+import numpy as np
+
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Sequence
+
+from data_processing.postprocessing.feature_store import FeatureStore
+from data_processing.postprocessing.finalize_data_processing import FEATURE_STORE, VARIANT_GROUPS
+from shared_utils.tracing import LatencyHistogram
+from shared_utils.utils import PROJECT_DIR, create_logger
+from src.models.cpu_inference import EAGER, ENGINES, load_cpu_model
+from src.models.saved_model import SavedModel
+
+# Consts
+
+DEFAULT_MAX_BATCH_SIZE = 256
+"""Maximum number of samples predicted in one batch."""
+
+DEFAULT_MAX_WAIT_S = 0.
+"""Latency budget of batching - time a request may wait in queue for other requests to join its batch. With 0,
+requests queued while previous batch is predicted are still batched together, which is the fastest for models
+predicting in microseconds on CPU (see benchmarks/serving_benchmarks.py)."""
+
+_STOP = object()
+
+
+@dataclass
+class Prediction:
+    """
+    Prediction of one request.
+
+    Attributes:
+        classes: Predicted rating class of each sample of shape (samples,).
+        probabilities: Probabilities of rating classes of shape (samples, classes).
+    """
+
+    classes: np.ndarray
+    probabilities: np.ndarray
+
+
+@dataclass
+class _Request:
+    features: Optional[np.ndarray]
+    album_ids: Optional[list[str]]
+    rows: int
+    submitted_at: float
+    future: Future = field(default_factory=Future)
+
+
+class ServiceStats:
+    """
+    Latencies and throughput of PredictionService. Latency of a request is time from its submission
+    to its result, queue wait is time from submission to start of its batch.
+    """
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.queue_wait = LatencyHistogram()
+        self.batch_time = LatencyHistogram()
+        self.requests = 0
+        self.failed = 0
+        self.rows = 0
+        self.batches = 0
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record_batch(self, requests: list[_Request], started_at: float, finished_at: float, failed: int):
+        with self._lock:
+            for request in requests:
+                self.latency.record(finished_at - request.submitted_at)
+                self.queue_wait.record(started_at - request.submitted_at)
+            self.batch_time.record(finished_at - started_at)
+            self.requests += len(requests)
+            self.failed += failed
+            self.rows += sum(request.rows for request in requests)
+            self.batches += 1
+
+    def to_record(self) -> dict:
+        """Returns: JSON serializable summary - counts, throughput, mean batch size and latency percentiles."""
+
+        with self._lock:
+            elapsed_s = time.perf_counter() - self.started_at
+            return {
+                'requests': self.requests,
+                'failed': self.failed,
+                'rows': self.rows,
+                'batches': self.batches,
+                'mean_batch_rows': round(self.rows / self.batches, 2) if self.batches else None,
+                'requests_per_s': round(self.requests / elapsed_s, 2),
+                'rows_per_s': round(self.rows / elapsed_s, 2),
+                'latency': _summary(self.latency),
+                'queue_wait': _summary(self.queue_wait),
+                'batch_time': _summary(self.batch_time),
+            }
+
+
+class PredictionService:
+    """
+    Predicts rating classes with saved model, coalescing concurrent requests into micro-batches.
+    A worker thread takes the first waiting request, then waits at most max_wait_s from its submission
+    for more requests, until the batch has max_batch_size samples. Features of requested albums are read
+    from feature store with one multi-get per batch.
+
+    Examples:
+    ---------
+    >>> with PredictionService(load_model(model_dir), FeatureStore(feature_store_path)) as service:
+    ...     service.predict_albums(['3Ubwe5Tys8ZuTmtIKF7u2B']).classes
+    ...     service.predict(features).probabilities
+    array([3])
+    """
+
+    def __init__(
+            self,
+            model: SavedModel,
+            feature_store: Optional[FeatureStore] = None,
+            max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+            max_wait_s: float = DEFAULT_MAX_WAIT_S
+    ):
+        """
+        Args:
+            model: Model to predict with.
+            feature_store: Store of album features, required to predict by album ids.
+            max_batch_size: Maximum number of samples in one batch (a larger request is one batch).
+            max_wait_s: Latency budget of batching, 0 to predict waiting requests without waiting for more.
+        """
+
+        self.model = model
+        self.feature_store = feature_store
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_s
+        self.stats = ServiceStats()
+        self.groups = VARIANT_GROUPS.get(model.info.variant, [])
+
+        if feature_store is not None:
+            assert self.groups, f'Feature store has no features of {model.info.variant} variant.'
+            store_names = [name for group in self.groups for name in feature_store.feature_names[group]]
+            assert store_names == model.info.feature_names, 'Features of model differ from features in feature store.'
+
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._logger = create_logger('PredictionService')
+
+    def start(self) -> 'PredictionService':
+        self._thread = threading.Thread(target=self._run, name='PredictionService', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop worker after requests submitted so far are predicted."""
+
+        self._queue.put(_STOP)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'PredictionService':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def submit(self, features: Optional[np.ndarray] = None, album_ids: Optional[Sequence[str]] = None) -> Future:
+        """
+        Queue request for prediction of either feature vectors or albums in feature store.
+
+        Args:
+            features: Features of shape (samples, model features) or a single vector.
+            album_ids: Ids of albums in feature store.
+
+        Returns:
+            Future with Prediction of the request. For unknown albums its exception is KeyError.
+
+        Raises:
+            ValueError: If not exactly one of features and album ids is given, or they are invalid.
+        """
+
+        if (features is None) == (album_ids is None):
+            raise ValueError('Either features or album ids have to be given.')
+        if features is not None:
+            features = np.asarray(features, dtype=np.float32)
+            features = features[None] if features.ndim == 1 else features
+            if features.ndim != 2 or features.shape[1] != len(self.model.info.feature_names):
+                raise ValueError(f'Invalid shape of features {features.shape}, '
+                                 f'expected (samples, {len(self.model.info.feature_names)}).')
+            request = _Request(features, None, len(features), time.perf_counter())
+        else:
+            if self.feature_store is None:
+                raise ValueError('Service has no feature store to read features of albums from.')
+            # A string is a sequence too, it would be looked up as albums of its characters.
+            if isinstance(album_ids, np.ndarray):
+                album_ids = album_ids.tolist()
+            if isinstance(album_ids, (str, bytes)) or not isinstance(album_ids, Sequence) \
+                    or not all(isinstance(album_id, str) for album_id in album_ids):
+                raise ValueError('Album ids have to be a list of strings.')
+            album_ids = list(album_ids)
+            request = _Request(None, album_ids, len(album_ids), time.perf_counter())
+
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, features: np.ndarray, timeout: Optional[float] = None) -> Prediction:
+        """Returns: Prediction of feature vectors, waits for its batch (see submit())."""
+
+        return self.submit(features=features).result(timeout)
+
+    def predict_albums(self, album_ids: Sequence[str], timeout: Optional[float] = None) -> Prediction:
+        """Returns: Prediction of albums in feature store, waits for its batch (see submit())."""
+
+        return self.submit(album_ids=album_ids).result(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            request = self._queue.get()
+            if request is _STOP:
+                break
+
+            batch, rows = [request], request.rows
+            deadline = request.submitted_at + self.max_wait_s
+            while rows < self.max_batch_size:
+                try:
+                    request = self._queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if request is _STOP:
+                    stopping = True
+                    break
+                batch.append(request)
+                rows += request.rows
+
+            self._predict_batch(batch)
+
+    def _predict_batch(self, batch: list[_Request]):
+        started_at = time.perf_counter()
+        failed = 0
+        try:
+            album_requests = [request for request in batch if request.album_ids is not None]
+            if album_requests:
+                stored = self.feature_store.multi_get(
+                    [album_id for request in album_requests for album_id in request.album_ids], self.groups)
+                features = np.hstack([stored.vectors[group] for group in self.groups])
+                offset = 0
+                for request in album_requests:
+                    found = stored.found[offset:offset + request.rows]
+                    if found.all():
+                        request.features = features[offset:offset + request.rows]
+                    else:
+                        missing = [album_id for album_id, is_found in zip(request.album_ids, found) if not is_found]
+                        request.future.set_exception(KeyError(f'Albums not in feature store: {missing}'))
+                        failed += 1
+                    offset += request.rows
+
+            ready = [request for request in batch if request.features is not None]
+            if ready:
+                probabilities = self.model.predict_proba(np.vstack([request.features for request in ready]))
+                offset = 0
+                for request in ready:
+                    request_probabilities = probabilities[offset:offset + request.rows]
+                    request.future.set_result(Prediction(request_probabilities.argmax(axis=1), request_probabilities))
+                    offset += request.rows
+        except Exception as e:
+            self._logger.exception('Batch prediction failed.')
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+                    failed += 1
+
+        self.stats.record_batch(batch, started_at, time.perf_counter(), failed)
+
+
+class PredictionServer:
+    """
+    HTTP interface of PredictionService. Each connection is handled in its own thread, so concurrent
+    requests are batched together by the service.
+
+    Endpoints:
+        POST /predict: Body `{"album_ids": [...]}` or `{"features": [[...], ...]}`, responds with
+            `{"classes": [...], "probabilities": [[...], ...]}`, 404 for unknown albums, 400 for invalid body.
+        GET /stats: Summary of service stats (see ServiceStats.to_record()).
+        GET /health: Model type and variant.
+    """
+
+    def __init__(self, service: PredictionService, host: str = '127.0.0.1', port: int = 0):
+        """
+        Args:
+            service: Started prediction service.
+            host: Host to listen on.
+            port: Port to listen on, any free port if 0.
+        """
+
+        self.service = service
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.prediction_server = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'PredictionServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='PredictionServer', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Handle requests in current thread until interrupted."""
+
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            self._httpd.server_close()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'PredictionServer':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, method: str, path: str, body: bytes) -> tuple[int, dict]:
+        """
+        Returns: Status and JSON serializable body of response to request.
+        """
+
+        if method == 'GET' and path == '/health':
+            info = self.service.model.info
+            return 200, {'model_type': info.model_type, 'variant': info.variant}
+        if method == 'GET' and path == '/stats':
+            return 200, self.service.stats.to_record()
+        if method != 'POST' or path != '/predict':
+            return 404, {'error': f'Unknown endpoint {method} {path}'}
+
+        try:
+            request = json.loads(body)
+            future = self.service.submit(features=request.get('features'), album_ids=request.get('album_ids'))
+        except (ValueError, TypeError, AttributeError) as e:
+            return 400, {'error': str(e)}
+
+        try:
+            prediction = future.result()
+        except KeyError as e:
+            return 404, {'error': e.args[0]}
+        return 200, {'classes': prediction.classes.tolist(), 'probabilities': prediction.probabilities.tolist()}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, with Nagle's algorithm the body waits for ACK of headers.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._respond('GET', b'')
+
+    def do_POST(self):
+        self._respond('POST', self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+    def _respond(self, method: str, body: bytes):
+        status, response = self.server.prediction_server.handle(method, self.path, body)
+        content = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        # Requests are summarized in service stats instead of logging each of them.
+        pass
+
+
+# Functions
+
+def _summary(histogram: LatencyHistogram) -> dict:
+    return {
+        'p50_ms': round(histogram.percentile(50) * 1000, 3),
+        'p99_ms': round(histogram.percentile(99) * 1000, 3),
+        'max_ms': round(histogram.max * 1000, 3),
+    }
+
+
+def main(args: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description='Serve predictions of saved rating model over HTTP.')
+    parser.add_argument('--model', default=f'{PROJECT_DIR}/data/models/gbdt', help='Directory of saved model.')
+    parser.add_argument('--feature-store', default=f'{PROJECT_DIR}/data/final/{FEATURE_STORE}',
+                        help='Feature store to read features of requested albums from.')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to listen on.')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on.')
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help='Maximum number of samples in one batch.')
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_S * 1000,
+                        help='Time a request may wait for other requests to join its batch.')
+    parser.add_argument('--engine', default=EAGER, choices=ENGINES,
+                        help='Engine of FeedForwardNN exported with src.models.cpu_inference.')
+    parser.add_argument('--int8', action='store_true', help='Serve int8 quantized FeedForwardNN.')
+    parser.add_argument('--threads', type=int, default=None, help='Number of threads of one prediction.')
+    args = parser.parse_args(args)
+
+    model = load_cpu_model(args.model, args.engine, args.int8, args.threads)
+    with FeatureStore(args.feature_store) as feature_store, \
+            PredictionService(model, feature_store, args.max_batch_size, args.max_wait_ms / 1000) as service:
+        server = PredictionServer(service, args.host, args.port)
+        print(f'Serving {model.info.model_type} model ({model.info.variant}) at {server.url}.')
+        server.serve_forever()
+        print(json.dumps(service.stats.to_record(), indent=2))
+
+
+# Serve model, e.g. `python -m src.models.prediction_service --model data/models/gbdt --port 8080`
+if __name__ == '__main__':
+    main()
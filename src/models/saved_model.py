@@ -0,0 +1,171 @@
+import json
+import os
+import numpy as np
+
+from dataclasses import dataclass, asdict, field
+from typing import Callable
+
+XGBOOST = 'xgboost'
+FEED_FORWARD = 'feed_forward'
+MODEL_TYPES = [XGBOOST, FEED_FORWARD]
+"""Types of saved models - XGBoost booster (gbdt.py) and FeedForwardNN weights (ff.py)."""
+
+_INFO_FILE = 'model.json'
+_BOOSTER_FILE = 'booster.json'
+_WEIGHTS_FILE = 'weights.pt'
+
+
+@dataclass
+class ModelInfo:
+    """
+    Description of saved model, saved next to it as JSON.
+
+    Attributes:
+        model_type: Type of model, one of MODEL_TYPES.
+        variant: Variant of final dataset the model was trained on (e.g. 'agg_flatten').
+        feature_names: Names of input features, in order of dataset columns.
+        num_classes: Number of rating classes.
+        params: Parameters needed to rebuild the model (e.g. hidden sizes of FeedForwardNN).
+    """
+
+    model_type: str
+    variant: str
+    feature_names: list[str]
+    num_classes: int
+    params: dict = field(default_factory=dict)
+
+
+class SavedModel:
+    """
+    Trained rating model loaded with load_model(). xgboost and torch are imported only when
+    a model of their type is loaded.
+
+    Examples:
+    ---------
+    >>> model = load_model(f'{PROJECT_DIR}/data/models/gbdt')
+    >>> model.predict(load_feature_matrix(f'{PROJECT_DIR}/data/final/{model.info.variant}').features)
+    array([3, 4, 4, ..., 2, 3, 3])
+    """
+
+    def __init__(self, info: ModelInfo, predict_logits: Callable[[np.ndarray], np.ndarray]):
+        """
+        Args:
+            info: Description of the model.
+            predict_logits: Function returning unnormalized scores of classes, of shape (samples, classes),
+                for float32 features of shape (samples, features).
+        """
+
+        self.info = info
+        self._predict_logits = predict_logits
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """Returns: Probabilities of rating classes of shape (samples, classes)."""
+
+        assert features.ndim == 2 and features.shape[1] == len(self.info.feature_names), \
+            f'Invalid shape of features {features.shape}, expected (samples, {len(self.info.feature_names)}).'
+
+        logits = np.asarray(self._predict_logits(np.ascontiguousarray(features, dtype=np.float32)), dtype=np.float32)
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """Returns: Rating class of each sample of shape (samples,)."""
+
+        return self.predict_proba(features).argmax(axis=1)
+
+
+# Functions
+
+def save_xgboost(path: str, booster, variant: str, feature_names: list[str], num_classes: int):
+    """
+    Save trained XGBoost booster with its description to directory.
+
+    Args:
+        path: Output directory.
+        booster: Trained xgb.Booster with multi-class objective.
+        variant: Variant of final dataset the model was trained on.
+        feature_names: Names of input features.
+        num_classes: Number of rating classes.
+    """
+
+    os.makedirs(path, exist_ok=True)
+    booster.save_model(os.path.join(path, _BOOSTER_FILE))
+    _save_info(path, ModelInfo(XGBOOST, variant, list(feature_names), int(num_classes)))
+
+
+def save_feed_forward(path: str, model, variant: str, feature_names: list[str], num_classes: int):
+    """
+    Save weights of trained FeedForwardNN with its description to directory.
+
+    Args:
+        path: Output directory.
+        model: Trained FeedForwardNN.
+        variant: Variant of final dataset the model was trained on.
+        feature_names: Names of input features.
+        num_classes: Number of rating classes.
+    """
+
+    import torch
+
+    os.makedirs(path, exist_ok=True)
+    torch.save({name: tensor.cpu() for name, tensor in model.state_dict().items()}, os.path.join(path, _WEIGHTS_FILE))
+    _save_info(path, ModelInfo(FEED_FORWARD, variant, list(feature_names), int(num_classes),
+                               {'hidden_sizes': list(model.hidden_sizes)}))
+
+
+def load_model(path: str) -> SavedModel:
+    """
+    Load model saved with save_xgboost() or save_feed_forward(), for prediction on CPU (see also
+    cpu_inference.load_cpu_model() for exported FeedForwardNN).
+
+    Args:
+        path: Directory of the model.
+
+    Returns:
+        Loaded model.
+    """
+
+    info = load_info(path)
+    if info.model_type == XGBOOST:
+        import xgboost as xgb
+
+        booster = xgb.Booster(model_file=os.path.join(path, _BOOSTER_FILE))
+        # Margins are scores of classes for both softmax and softprob objectives.
+        return SavedModel(info, lambda features: booster.inplace_predict(features, predict_type='margin'))
+
+    import torch
+
+    model = build_feed_forward(path, info)
+
+    def predict_logits(features: np.ndarray) -> np.ndarray:
+        with torch.inference_mode():
+            return model(torch.from_numpy(np.require(features, requirements='W'))).numpy()
+
+    return SavedModel(info, predict_logits)
+
+
+def load_info(path: str) -> ModelInfo:
+    """Returns: Description of model saved in directory."""
+
+    with open(os.path.join(path, _INFO_FILE), 'r') as json_file:
+        info = ModelInfo(**json.load(json_file))
+    assert info.model_type in MODEL_TYPES, f'Unknown model type {info.model_type}, expected one of: {MODEL_TYPES}.'
+    return info
+
+
+def build_feed_forward(path: str, info: ModelInfo):
+    """Returns: FeedForwardNN with weights saved in directory, on CPU in evaluation mode."""
+
+    import torch
+    from src.models.feed_forward import FeedForwardNN
+
+    assert info.model_type == FEED_FORWARD, f'Model in {path} is {info.model_type}, not {FEED_FORWARD}.'
+    model = FeedForwardNN(len(info.feature_names), info.params['hidden_sizes'], info.num_classes)
+    model.load_state_dict(torch.load(os.path.join(path, _WEIGHTS_FILE), map_location='cpu'))
+    return model.eval()
+
+
+def _save_info(path: str, info: ModelInfo):
+    with open(os.path.join(path, _INFO_FILE), 'w') as json_file:
+        json.dump(asdict(info), json_file)